@@ -0,0 +1,141 @@
+"""
+Shared helpers for the bench_* management commands.
+
+Benchmarks never touch the configured database: they run inside a throwaway
+test database that is created (and migrated) on entry and dropped on exit.
+"""
+
+import http.client
+import itertools
+import math
+import os
+import signal
+import statistics
+import subprocess
+import tempfile
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.db import connection, reset_queries
+
+HOST = '127.0.0.1'
+
+
+@contextmanager
+def isolated_database(keepdb=False, on_disk=False):
+    """Create a fresh test database for the duration of a benchmark.
+
+    SQLite test databases live in memory by default; pass on_disk=True when
+    several threads need their own connections to the same database.
+    """
+    old_name = connection.settings_dict['NAME']
+    test_settings = connection.settings_dict.setdefault('TEST', {})
+    old_test_name = test_settings.get('NAME')
+    if on_disk and connection.vendor == 'sqlite' and not old_test_name:
+        test_settings['NAME'] = os.path.join(tempfile.gettempdir(), f'mwaiseni-bench-{os.getpid()}.sqlite3')
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=keepdb)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=keepdb)
+        test_settings['NAME'] = old_test_name
+
+
+def stream_create(model, objs, batch_size=5000):
+    """bulk_create() from any iterable, one batch in memory at a time
+    (bulk_create itself turns its argument into a list first). Returns the
+    number of rows created."""
+    objs = iter(objs)
+    created = 0
+    while batch := list(itertools.islice(objs, batch_size)):
+        model.objects.bulk_create(batch, batch_size=batch_size)
+        created += len(batch)
+    return created
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def summarize(samples):
+    """Timing summary in milliseconds for a list of durations in seconds"""
+    ms = [s * 1000 for s in samples]
+    return {
+        'runs': len(ms),
+        'min_ms': round(min(ms), 3),
+        'p50_ms': round(percentile(ms, 50), 3),
+        'p95_ms': round(percentile(ms, 95), 3),
+        'p99_ms': round(percentile(ms, 99), 3),
+        'mean_ms': round(statistics.fmean(ms), 3),
+    }
+
+
+def measure(fn, repeat=20, warmup=2):
+    """Call fn() repeatedly and return its timing summary"""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+@contextmanager
+def count_queries():
+    """Collect executed SQL; yields a list that is filled in on exit"""
+    captured = []
+    force_debug = connection.force_debug_cursor
+    connection.force_debug_cursor = True
+    reset_queries()
+    try:
+        yield captured
+    finally:
+        captured.extend(connection.queries)
+        connection.force_debug_cursor = force_debug
+
+
+def format_stats(label, stats):
+    """One aligned report line for a timing summary"""
+    return (
+        f"{label:<40} p50 {stats['p50_ms']:>9.3f} ms  p95 {stats['p95_ms']:>9.3f} ms  "
+        f"min {stats['min_ms']:>9.3f} ms  ({stats['runs']} runs)"
+    )
+
+
+@contextmanager
+def serve(command, port, database):
+    """Run a server process (gunicorn, daphne) on `database`, an on-disk SQLite
+    file from isolated_database(on_disk=True), until the block exits"""
+    # Server-Timing carries the query counts loadtest reports
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{database}', DEBUG='False', SERVER_TIMING='True')
+    env.pop('ASYNC_VIEWS', None)
+    env.pop('PROMETHEUS_MULTIPROC_DIR', None)
+    process = subprocess.Popen(command, cwd=settings.BASE_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while True:
+        try:
+            http.client.HTTPConnection(HOST, port, timeout=1).connect()
+            break
+        except OSError:
+            if process.poll() is not None or time.monotonic() > deadline:
+                process.kill()
+                raise CommandError(f'{command[2]} did not start on port {port}')
+            time.sleep(0.1)
+    try:
+        yield process
+    finally:
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
@@ -0,0 +1,122 @@
+"""
+Cache helpers: generation-keyed invalidation and single-flight rebuilds.
+
+Cached payloads are stored under a key that embeds a generation number.
+Invalidating bumps the generation instead of deleting the payload, so a
+rebuild that started before the invalidation can only ever write to the old,
+unreachable key and never resurrects stale data.
+
+single_flight() collapses concurrent misses: the first caller takes a short
+lock with cache.add() (atomic on locmem and Redis) and rebuilds, everyone
+else waits briefly for the result instead of hitting the database too.
+
+The a*-prefixed twins serve async views. They go through the cache's async
+API and wait with asyncio.sleep(), so a caller waiting on another's rebuild
+never blocks the event loop.
+"""
+
+import asyncio
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+_MISSING = object()
+
+# Namespaces shared by the views that fill them and the writers that
+# invalidate them, kept here so neither has to import the other
+FEATURED_CACHE = 'properties:featured'
+
+
+def _generation_key(namespace):
+    return f'{namespace}:generation'
+
+
+def generation(namespace):
+    gen = cache.get(_generation_key(namespace))
+    if gen is None:
+        cache.add(_generation_key(namespace), time.time_ns(), None)
+        gen = cache.get(_generation_key(namespace))
+    return gen
+
+
+def versioned_key(namespace, *parts):
+    return ':'.join([namespace, f'g{generation(namespace)}', *map(str, parts)])
+
+
+def invalidate(namespace):
+    """Make every key built by versioned_key(namespace, ...) unreachable"""
+    try:
+        cache.incr(_generation_key(namespace))
+    except ValueError:
+        cache.set(_generation_key(namespace), time.time_ns(), None)
+
+
+def invalidate_on_commit(namespace):
+    """invalidate() once the current transaction commits, or at once outside one"""
+    transaction.on_commit(lambda: invalidate(namespace))
+
+
+def single_flight(key, build, timeout, lock_timeout=30, wait=5.0, poll=0.02):
+    """Return the cached value for key, rebuilding it at most once at a time"""
+    value = cache.get(key, _MISSING)
+    if value is not _MISSING:
+        return value
+
+    lock_key = f'{key}:lock'
+    if not cache.add(lock_key, 1, lock_timeout):
+        deadline = time.monotonic() + wait
+        while time.monotonic() < deadline:
+            time.sleep(poll)
+            value = cache.get(key, _MISSING)
+            if value is not _MISSING:
+                return value
+            if cache.get(lock_key) is None:
+                break
+        # The builder died or is too slow: serve a fresh answer ourselves
+        return build()
+
+    try:
+        value = build()
+        cache.set(key, value, timeout)
+        return value
+    finally:
+        cache.delete(lock_key)
+
+
+async def ageneration(namespace):
+    gen = await cache.aget(_generation_key(namespace))
+    if gen is None:
+        await cache.aadd(_generation_key(namespace), time.time_ns(), None)
+        gen = await cache.aget(_generation_key(namespace))
+    return gen
+
+
+async def aversioned_key(namespace, *parts):
+    return ':'.join([namespace, f'g{await ageneration(namespace)}', *map(str, parts)])
+
+
+async def asingle_flight(key, build, timeout, lock_timeout=30, wait=5.0, poll=0.02):
+    """single_flight() for async callers; build is a coroutine function"""
+    value = await cache.aget(key, _MISSING)
+    if value is not _MISSING:
+        return value
+
+    lock_key = f'{key}:lock'
+    if not await cache.aadd(lock_key, 1, lock_timeout):
+        deadline = time.monotonic() + wait
+        while time.monotonic() < deadline:
+            await asyncio.sleep(poll)
+            value = await cache.aget(key, _MISSING)
+            if value is not _MISSING:
+                return value
+            if await cache.aget(lock_key) is None:
+                break
+        return await build()
+
+    try:
+        value = await build()
+        await cache.aset(key, value, timeout)
+        return value
+    finally:
+        await cache.adelete(lock_key)
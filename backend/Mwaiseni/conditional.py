@@ -0,0 +1,237 @@
+"""
+HTTP conditional GET (ETag / Last-Modified) for DRF viewsets.
+
+Validators are derived from the rows a response would contain: their ids,
+max(updated_at), the row count, whether another page follows, and the
+request path with its query params. When a client revalidates, the page is
+probed with a narrow (pk, updated_at) query through the same paginator; if
+nothing changed the client gets a 304 without any serialization. A 200
+computes the same validators from the rows it already loaded, so it costs
+no extra query.
+
+Changes to related rows that don't touch updated_at (e.g. a host renaming
+themselves) are not detected; responses still expire through polling.
+
+Actions listed in `row_serializer_classes` read their page as values()
+dicts and serialize it with that RowSerializer (Mwaiseni/row_serializers.py)
+instead of building model instances; the validators read the same dicts.
+
+alist()/aretrieve() are the same flow for async views: rows are fetched
+with the async ORM, everything else is shared with the sync methods.
+"""
+
+import hashlib
+import json
+from urllib.parse import urlencode
+
+from django.core.exceptions import ValidationError
+from django.http import Http404
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+
+def _row_value(row, name):
+    return row[name] if isinstance(row, dict) else getattr(row, name)
+
+
+def _row_id(row):
+    return row['id'] if isinstance(row, dict) else row.pk
+
+
+class ConditionalGetMixin:
+    """Adds ETag/Last-Modified and 304 handling to list, retrieve and
+    any action that returns its rows through conditional_list_response()"""
+
+    validator_field = 'updated_at'
+    # {action: RowSerializer} for list-style actions served from values() rows
+    row_serializer_classes = {}
+
+    # -- validators -------------------------------------------------------
+
+    def get_validators(self, rows, has_more=False, extra=None):
+        request = self.request
+        params = urlencode(sorted(request.query_params.lists()), doseq=True)
+        digest = hashlib.md5(f'{request.path}?{params}|{len(rows)}|{int(has_more)}'.encode())
+        if extra:
+            digest.update(json.dumps(extra, sort_keys=True, default=str).encode())
+        last_modified = None
+        for row in rows:
+            stamp = _row_value(row, self.validator_field)
+            digest.update(f'|{_row_id(row)}:{stamp.isoformat()}'.encode())
+            last_modified = stamp if last_modified is None else max(last_modified, stamp)
+        if last_modified is not None:
+            if timezone.is_naive(last_modified):
+                last_modified = timezone.make_aware(last_modified)
+            last_modified = int(last_modified.timestamp())
+        return digest.hexdigest(), last_modified
+
+    def is_conditional(self):
+        headers = self.request.headers
+        return 'If-None-Match' in headers or 'If-Modified-Since' in headers
+
+    def not_modified(self, etag, last_modified):
+        """HttpResponseNotModified when the client's copy is current, else None"""
+        response = get_conditional_response(self.request, etag=quote_etag(etag), last_modified=last_modified)
+        return response and self.with_validators(response, etag, last_modified)
+
+    def with_validators(self, response, etag, last_modified):
+        response['ETag'] = quote_etag(etag)
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    # -- list-style responses ---------------------------------------------
+
+    def get_row_serializer_class(self):
+        return self.row_serializer_classes.get(self.action)
+
+    def get_row_serializer(self, *args, **kwargs):
+        kwargs.setdefault('context', self.get_serializer_context())
+        return self.get_row_serializer_class()(*args, **kwargs)
+
+    def get_page_queryset(self, queryset):
+        """The queryset a page of rows is read from: values() for a row
+        serializer, also selecting the primary key, validator field,
+        annotations and ordering keys that get_validators() and the
+        paginator read"""
+        if self.get_row_serializer_class() is None:
+            return queryset
+        serializer = self.get_row_serializer()
+        query = queryset.query
+        ordering = [term.lstrip('-') for term in (query.order_by or query.get_meta().ordering)
+                    if isinstance(term, str) and term != '?']
+        pk_name = query.get_meta().pk.name
+        return serializer.values(queryset, pk_name, self.validator_field, *query.annotations, *ordering,
+                                 fields=serializer.selected, expand=serializer.expand)
+
+    def probe_page(self, queryset):
+        """(rows, has_more) for the requested page, reading only pk and the validator field"""
+        narrow = queryset.select_related(None).only('pk', self.validator_field)
+        if self.paginator is None:
+            return list(narrow), False
+        probe = self.paginator.__class__()
+        rows = probe.paginate_queryset(narrow, self.request, view=self)
+        return rows, getattr(probe, 'has_next', False)
+
+    def conditional_list_response(self, queryset, extra=None, version=None):
+        """List response for queryset. `extra` adds top-level keys (e.g. search
+        facets): a dict is folded into the ETag as is; a callable is only
+        called for a 200 and returns (keys, version), a dict the ETag folds in
+        instead, which `version()` returns without building the keys so that
+        a 304 skips them"""
+        if self.is_conditional():
+            rows, has_more = self.probe_page(queryset)
+            tag = version() if callable(extra) else extra
+            response = self.not_modified(*self.get_validators(rows, has_more, tag))
+            if response is not None:
+                return response
+
+        extra, tag = extra() if callable(extra) else (extra, extra)
+        queryset = self.get_page_queryset(queryset)
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            rows = list(queryset)
+            response = self.get_response_for_rows(rows, paginated=False, extra=extra)
+            has_more = False
+        else:
+            rows = page
+            response = self.get_response_for_rows(rows, paginated=True, extra=extra)
+            has_more = getattr(self.paginator, 'has_next', False)
+        return self.with_validators(response, *self.get_validators(rows, has_more, tag))
+
+    def get_response_for_rows(self, rows, paginated, extra=None):
+        if self.get_row_serializer_class() is None:
+            data = self.get_serializer(rows, many=True).data
+        else:
+            data = self.get_row_serializer(rows, many=True).data
+        if paginated:
+            response = self.get_paginated_response(data)
+        else:
+            response = Response({'results': data} if extra else data)
+        if extra:
+            response.data.update(extra)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_list_response(self.filter_queryset(self.get_queryset()))
+
+    # -- detail -----------------------------------------------------------
+
+    def retrieve(self, request, *args, **kwargs):
+        if self.is_conditional():
+            lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+            rows = list(
+                self.filter_queryset(self.get_queryset())
+                .filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+                .select_related(None).only('pk', self.validator_field)[:1]
+            )
+            if rows:
+                response = self.not_modified(*self.get_validators(rows))
+                if response is not None:
+                    return response
+
+        instance = self.get_object()
+        response = Response(self.get_serializer(instance).data)
+        return self.with_validators(response, *self.get_validators([instance]))
+
+    # -- async ------------------------------------------------------------
+
+    async def aprepare_rows(self, rows):
+        """Hook for async views: load whatever get_validators() or serializing
+        `rows` would otherwise query synchronously"""
+
+    async def aprobe_page(self, queryset):
+        narrow = queryset.select_related(None).only('pk', self.validator_field)
+        if self.paginator is None:
+            return [row async for row in narrow], False
+        probe = self.paginator.__class__()
+        rows = await probe.apaginate_queryset(narrow, self.request, view=self)
+        return rows, getattr(probe, 'has_next', False)
+
+    async def aconditional_list_response(self, queryset, extra=None, version=None):
+        """conditional_list_response() with coroutine functions for extra and version"""
+        if self.is_conditional():
+            rows, has_more = await self.aprobe_page(queryset)
+            await self.aprepare_rows(rows)
+            tag = await version() if callable(extra) else extra
+            response = self.not_modified(*self.get_validators(rows, has_more, tag))
+            if response is not None:
+                return response
+
+        extra, tag = await extra() if callable(extra) else (extra, extra)
+        queryset = self.get_page_queryset(queryset)
+        if self.paginator is None:
+            rows, has_more = [row async for row in queryset], False
+        else:
+            rows = await self.paginator.apaginate_queryset(queryset, self.request, view=self)
+            has_more = getattr(self.paginator, 'has_next', False)
+        await self.aprepare_rows(rows)
+        response = self.get_response_for_rows(rows, paginated=self.paginator is not None, extra=extra)
+        return self.with_validators(response, *self.get_validators(rows, has_more, tag))
+
+    async def alist(self, request, *args, **kwargs):
+        return await self.aconditional_list_response(self.filter_queryset(self.get_queryset()))
+
+    async def aretrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            queryset = self.filter_queryset(self.get_queryset()) \
+                .filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        except (TypeError, ValueError, ValidationError):
+            # Same as DRF's get_object_or_404() for a malformed lookup
+            raise Http404
+        if self.is_conditional():
+            rows = [row async for row in queryset.select_related(None).only('pk', self.validator_field)[:1]]
+            if rows:
+                response = self.not_modified(*self.get_validators(rows))
+                if response is not None:
+                    return response
+
+        instance = await queryset.afirst()
+        if instance is None:
+            raise Http404(f'No {queryset.model._meta.object_name} matches the given query.')
+        self.check_object_permissions(self.request, instance)
+        response = Response(self.get_serializer(instance).data)
+        return self.with_validators(response, *self.get_validators([instance]))
@@ -0,0 +1,67 @@
+"""
+DRF JSON renderer and parser on ujson.
+
+Drop-in replacements for rest_framework's JSONRenderer/JSONParser, set in
+REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'] / ['DEFAULT_PARSER_CLASSES'].
+ujson encodes dicts, lists, strings, numbers and Decimal (as a number,
+like DRF's encoder) in C. Anything else, such as UUID, datetime, date or lazy
+translation strings, goes to DRF's JSONEncoder.default, so the output
+matches the stdlib renderer value for value. Serializer fields have
+usually turned those into strings already.
+
+Differences from the stdlib pair: output is always compact (ujson has no
+COMPACT_JSON=False spacing). Whatever ujson can't encode (NaN or Infinity
+under STRICT_JSON, out-of-range numbers) is rendered by the stdlib renderer,
+and with STRICT_JSON a request body containing a bare NaN or Infinity is
+handed to the stdlib parser, which rejects it.
+"""
+
+import codecs
+import io
+
+import ujson
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+_default = JSONEncoder().default
+
+
+class UJSONRenderer(JSONRenderer):
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        try:
+            ret = ujson.dumps(data, ensure_ascii=self.ensure_ascii, escape_forward_slashes=False,
+                              indent=indent or 0, allow_nan=not self.strict, reject_bytes=False,
+                              default=_default)
+        except OverflowError:
+            # NaN or Infinity under STRICT_JSON, or a number ujson can't
+            # encode: the stdlib renderer returns what it would have, or
+            # raises its own ValueError
+            return super().render(data, accepted_media_type, renderer_context)
+        # Keep the output a strict JavaScript subset, as JSONRenderer does
+        if not self.ensure_ascii:
+            ret = ret.replace('\u2028', '\\u2028').replace('\u2029', '\\u2029')
+        return ret.encode()
+
+
+class UJSONParser(JSONParser):
+    renderer_class = UJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        raw = stream.read() if stream is not None else b''
+        if self.strict and (b'NaN' in raw or b'Infinity' in raw):
+            return super().parse(io.BytesIO(raw), media_type, parser_context)
+        try:
+            if codecs.lookup(encoding).name != 'utf-8':
+                raw = raw.decode(encoding)
+            return ujson.loads(raw)
+        except ValueError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
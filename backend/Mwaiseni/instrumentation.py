@@ -0,0 +1,255 @@
+"""
+Per-request performance instrumentation.
+
+RequestMetricsMiddleware records for every request:
+
+    total      wall time through the middleware stack
+    db         SQL time and query count, from an execute_wrapper
+    serialize  time spent producing serializer.data
+    size       response body bytes
+
+and, with settings.SERVER_TIMING on (the default under DEBUG) or for staff,
+returns them as a Server-Timing header, so browser dev tools show them
+next to the network timings. Each request is also added to
+rolling per-route samples (the last SAMPLES_PER_ROUTE requests of every
+"METHOD view-name") kept in process memory; snapshot() turns them into
+percentiles and a latency histogram for the staff endpoint in analytics,
+and the totals go to the Prometheus counters in metrics.py.
+
+The current request's stats live in a ContextVar, which follows the
+request into sync_to_async threads, so async views are measured too. The
+SQL wrapper is attached to every database connection when it opens.
+Serializer time is measured by views that use SerializerTimingMixin: their
+serializer classes get a timed .data, which counts only the outermost call;
+other views report serialize as 0.
+
+Samples are per process: with several workers each one reports its own
+share of the traffic.
+"""
+
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+
+from functools import lru_cache
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from . import metrics
+from .benchmarking import percentile
+
+SAMPLES_PER_ROUTE = 1000
+# Upper bounds in milliseconds of the latency histogram buckets
+HISTOGRAM_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float('inf')]
+METRICS = ['total_ms', 'db_ms', 'queries', 'serialize_ms', 'size']
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestStats:
+    __slots__ = ('queries', 'db_time', 'serialize_time', 'serialize_depth')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serialize_time = 0.0
+        self.serialize_depth = 0
+
+
+# -- collection -----------------------------------------------------------
+
+def record_sql(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.db_time += time.perf_counter() - started
+        stats.queries += 1
+
+
+def attach(connection, **kwargs):
+    if record_sql not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_sql)
+
+
+connection_created.connect(attach, dispatch_uid='Mwaiseni.instrumentation.attach')
+
+
+class TimedData:
+    """Serializer mixin adding the time spent in .data to the request's stats"""
+
+    @property
+    def data(self):
+        stats = _current.get()
+        if stats is None:
+            return super().data
+        stats.serialize_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().data
+        finally:
+            stats.serialize_depth -= 1
+            if not stats.serialize_depth:
+                stats.serialize_time += time.perf_counter() - started
+
+
+@lru_cache(maxsize=None)
+def timed(serializer_class):
+    """serializer_class with TimedData"""
+    namespace = {'__module__': serializer_class.__module__, '__qualname__': serializer_class.__qualname__}
+    return type(serializer_class.__name__, (TimedData, serializer_class), namespace)
+
+
+class SerializerTimingMixin:
+    """View mixin timing the .data of the serializers (and row serializers,
+    see Mwaiseni/conditional.py) the view builds, as the request's serialize
+    metric. List it first, so it sees the serializers the other mixins
+    configure."""
+
+    def get_serializer(self, *args, **kwargs):
+        return self._timed(super().get_serializer(*args, **kwargs))
+
+    def get_row_serializer(self, *args, **kwargs):
+        return self._timed(super().get_row_serializer(*args, **kwargs))
+
+    @staticmethod
+    def _timed(serializer):
+        # Only .data differs, so the instance can take the subclass as is
+        serializer.__class__ = timed(type(serializer))
+        return serializer
+
+
+# -- rolling samples ------------------------------------------------------
+
+class RouteSamples:
+    """Last SAMPLES_PER_ROUTE requests of every route, thread-safe"""
+
+    def __init__(self, size=SAMPLES_PER_ROUTE):
+        self.size = size
+        self._routes = {}
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def add(self, route, sample):
+        with self._lock:
+            if route not in self._routes:
+                self._routes[route] = deque(maxlen=self.size)
+                self._counts[route] = 0
+            self._routes[route].append(sample)
+            self._counts[route] += 1
+
+    def items(self):
+        with self._lock:
+            return [(route, list(samples), self._counts[route]) for route, samples in self._routes.items()]
+
+    def clear(self):
+        with self._lock:
+            self._routes.clear()
+            self._counts.clear()
+
+
+samples = RouteSamples()
+
+
+def _summary(values):
+    return {
+        'p50': round(percentile(values, 50), 3),
+        'p95': round(percentile(values, 95), 3),
+        'p99': round(percentile(values, 99), 3),
+        'max': round(max(values), 3),
+        'mean': round(sum(values) / len(values), 3),
+    }
+
+
+def snapshot():
+    """{route: {requests, window, <metric>: {p50, p95, p99, max, mean}, histogram}},
+    slowest routes (by p95 total time) first"""
+    routes = {}
+    for route, rows, count in samples.items():
+        columns = dict(zip(METRICS, zip(*rows)))
+        histogram = [0] * len(HISTOGRAM_BUCKETS_MS)
+        for total in columns['total_ms']:
+            histogram[next(i for i, bound in enumerate(HISTOGRAM_BUCKETS_MS) if total <= bound)] += 1
+        routes[route] = {
+            'requests': count,
+            'window': len(rows),
+            **{metric: _summary(columns[metric]) for metric in METRICS},
+            'histogram': [{'le_ms': str(bound), 'count': n} for bound, n in zip(HISTOGRAM_BUCKETS_MS, histogram)],
+        }
+    return dict(sorted(routes.items(), key=lambda item: -item[1]['total_ms']['p95']))
+
+
+# -- middleware -----------------------------------------------------------
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return (match.view_name or match.route) if match else '<unresolved>'
+
+
+def route_name(request):
+    return f'{request.method} {view_name(request)}'
+
+
+def show_server_timing(request):
+    # Timings and query counts tell an outsider how a request was handled
+    if settings.SERVER_TIMING:
+        return True
+    user = getattr(request, 'user', None)
+    return bool(user is not None and user.is_staff)
+
+
+class RequestMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        # Connections opened before this module was imported
+        attach(connections['default'])
+        stats, token, started = self.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, stats, started)
+
+    async def __acall__(self, request):
+        stats, token, started = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, stats, started)
+
+    def start(self):
+        stats = RequestStats()
+        return stats, _current.set(stats), time.perf_counter()
+
+    def finish(self, request, response, stats, started):
+        total = (time.perf_counter() - started) * 1000
+        db, serialize = stats.db_time * 1000, stats.serialize_time * 1000
+        size = 0 if response.streaming else len(response.content)
+        if show_server_timing(request):
+            response['Server-Timing'] = ', '.join([
+                f'total;dur={total:.1f}',
+                f'db;dur={db:.1f};desc="{stats.queries} queries"',
+                f'serialize;dur={serialize:.1f}',
+                f'size;desc="{size} bytes"',
+            ])
+        samples.add(route_name(request), (total, db, stats.queries, serialize, size))
+        metrics.observe_request(request.method, view_name(request), response.status_code,
+                                total / 1000, stats.queries, stats.db_time)
+        return response
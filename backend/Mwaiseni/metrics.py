@@ -0,0 +1,166 @@
+"""
+Prometheus metrics, scraped from /metrics.
+
+    django_http_requests_total{method, view, status}
+    django_http_request_duration_seconds{method, view, status}  histogram
+    django_db_connections_total{alias}
+    django_db_queries_total{method, view}                       while serving requests
+    django_db_query_duration_seconds_total{method, view}
+    django_cache_gets_total{cache, result="hit"|"miss"}
+    mwaiseni_bookings_pending, mwaiseni_payments_pending, mwaiseni_payouts_pending
+    mwaiseni_payout_oldest_pending_age_seconds
+
+Request and query metrics are filled in by RequestMetricsMiddleware (see
+instrumentation.py), cache gets by the CACHES backends defined here. The
+hit ratio is a query, not a metric, so it stays correct when summed over
+workers:
+
+    sum by (cache) (rate(django_cache_gets_total{result="hit"}[5m]))
+      / sum by (cache) (rate(django_cache_gets_total[5m]))
+
+The business gauges are read from the database at scrape time, so every
+worker reports the same values.
+
+Under gunicorn, every worker has its own counters. Set
+PROMETHEUS_MULTIPROC_DIR to an empty, writable directory before the
+workers start (gunicorn.conf.py clears it and removes the files of dead
+workers): the counters then live in files there, and whichever worker
+answers the scrape adds up all of them. Without it, metrics are per process,
+which is correct under daphne or runserver.
+
+Scrapes must send "Authorization: Bearer <METRICS_TOKEN>". Without a
+METRICS_TOKEN setting the endpoint answers 404: the gauges expose payment
+and payout backlogs and each scrape runs several COUNT queries.
+"""
+
+import hmac
+import os
+
+from django.conf import settings
+from django.core.cache.backends.locmem import LocMemCache as BaseLocMemCache
+from django.db.backends.signals import connection_created
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+from django.utils import timezone
+from django_redis.cache import RedisCache as BaseRedisCache
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.multiprocess import MultiProcessCollector
+
+REQUEST_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, float('inf'))
+
+requests_total = Counter(
+    'django_http_requests', 'HTTP requests served', ['method', 'view', 'status'],
+)
+request_duration = Histogram(
+    'django_http_request_duration_seconds', 'Time to serve HTTP requests', ['method', 'view', 'status'],
+    buckets=REQUEST_BUCKETS,
+)
+db_connections = Counter(
+    'django_db_connections', 'Database connections opened', ['alias'],
+)
+db_queries = Counter(
+    'django_db_queries', 'SQL queries run while serving HTTP requests', ['method', 'view'],
+)
+db_query_duration = Counter(
+    'django_db_query_duration_seconds', 'Time spent in SQL while serving HTTP requests', ['method', 'view'],
+)
+cache_gets = Counter(
+    'django_cache_gets', 'Cache lookups by result', ['cache', 'result'],
+)
+
+
+def observe_request(method, view, status, seconds, queries, query_seconds):
+    requests_total.labels(method, view, status).inc()
+    request_duration.labels(method, view, status).observe(seconds)
+    if queries:
+        db_queries.labels(method, view).inc(queries)
+        db_query_duration.labels(method, view).inc(query_seconds)
+
+
+def _connection_opened(connection, **kwargs):
+    db_connections.labels(connection.alias).inc()
+
+
+connection_created.connect(_connection_opened, dispatch_uid='Mwaiseni.metrics.connection_opened')
+
+
+# -- caches ---------------------------------------------------------------
+
+_MISSING = object()
+
+
+class CountingCacheMixin:
+    """Counts get() hits and misses in django_cache_gets_total; aget() and
+    the default get_many() go through get() too"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._hits = cache_gets.labels(self.key_prefix or 'default', 'hit')
+        self._misses = cache_gets.labels(self.key_prefix or 'default', 'miss')
+
+    def get(self, key, default=None, version=None, **kwargs):
+        value = super().get(key, _MISSING, version=version, **kwargs)
+        if value is _MISSING:
+            self._misses.inc()
+            return default
+        self._hits.inc()
+        return value
+
+
+class RedisCache(CountingCacheMixin, BaseRedisCache):
+
+    def get_many(self, keys, version=None, **kwargs):
+        # One MGET here; BaseCache.get_many (locmem) goes through get() instead
+        keys = list(keys)
+        found = super().get_many(keys, version=version, **kwargs)
+        self._hits.inc(len(found))
+        self._misses.inc(len(keys) - len(found))
+        return found
+
+
+class LocMemCache(CountingCacheMixin, BaseLocMemCache):
+    pass
+
+
+# -- business gauges ------------------------------------------------------
+
+class BusinessCollector:
+    """Work waiting on people or payment providers, read at scrape time"""
+
+    def collect(self):
+        from users.models import Booking, Payment, Payout
+
+        for name, model in [('bookings', Booking), ('payments', Payment), ('payouts', Payout)]:
+            yield GaugeMetricFamily(
+                f'mwaiseni_{name}_pending', f'{model.__name__}s in status pending',
+                value=model.objects.filter(status='pending').count(),
+            )
+        oldest = (
+            Payout.objects.filter(status='pending').order_by('created_at')
+            .values_list('created_at', flat=True).first()
+        )
+        yield GaugeMetricFamily(
+            'mwaiseni_payout_oldest_pending_age_seconds', 'Age of the oldest pending payout, 0 when there is none',
+            value=(timezone.now() - oldest).total_seconds() if oldest else 0,
+        )
+
+
+def registry():
+    """Everything a scrape returns: this process's (or, under multiprocess
+    mode, every worker's) metrics plus the business gauges"""
+    collected = CollectorRegistry()
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        MultiProcessCollector(collected)
+    else:
+        collected.register(REGISTRY)
+    collected.register(BusinessCollector())
+    return collected
+
+
+def metrics_view(request):
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if not token:
+        raise Http404
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponseForbidden()
+    return HttpResponse(generate_latest(registry()), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,209 @@
+"""
+Keyset (cursor) pagination for Mwaiseni list endpoints.
+
+DRF's CursorPagination only keys on the first ordering field and skips ties
+with an OFFSET, which degrades on columns such as price_per_night where many
+rows share a value. KeysetPagination keys on the full ordering plus the
+primary key, e.g. (-created_at, -id) or (price_per_night, id), so page 500
+is answered with the same index seek as page 1. It never runs COUNT(*).
+
+The ordering comes from the queryset itself (OrderingFilter, the view's
+`ordering` or the model's Meta.ordering), so whatever the client may sort by
+through ordering_fields is also what the cursor encodes. Ordering keys are
+expected to be non-null.
+
+It is not the project default: a view opts in with
+pagination_class = KeysetPagination, which turns its list response from a
+plain array into {next, previous, results}.
+"""
+
+import base64
+import datetime
+import decimal
+import json
+import uuid
+from collections import OrderedDict
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from django.utils.encoding import force_str
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def _encode_value(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, (decimal.Decimal, uuid.UUID)):
+        return str(value)
+    return value
+
+
+def _row_value(row, name):
+    return row[name] if isinstance(row, dict) else getattr(row, name)
+
+
+class KeysetPagination(BasePagination):
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.finish_page(list(self.page_queryset(queryset, request, view)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset() for async views, fetching the page with the async ORM"""
+        return self.finish_page([row async for row in self.page_queryset(queryset, request, view)])
+
+    def page_queryset(self, queryset, request, view=None):
+        """The sliced queryset for the requested page, plus one row to detect a next page"""
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.keys = self.get_keys(queryset, view)
+
+        self.cursor = self.decode_cursor(request)
+        self.reverse = bool(self.cursor and self.cursor.get('r'))
+        self.offset = 0
+        if self.cursor and self.keys:
+            try:
+                queryset = queryset.filter(self.seek(self.cursor['k'], self.reverse))
+            except (TypeError, ValueError, ValidationError):
+                # e.g. a cursor minted under a different ?ordering=
+                raise NotFound(self.invalid_cursor_message)
+        elif self.cursor:
+            self.offset = self.cursor['o']
+
+        ordering = [self.order_term(name, desc != self.reverse) for name, desc in self.keys] or None
+        if ordering:
+            queryset = queryset.order_by(*ordering)
+
+        # One extra row tells us whether there is another page, without a COUNT
+        return queryset[self.offset:self.offset + self.page_size + 1]
+
+    def finish_page(self, rows):
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if self.reverse:
+            rows.reverse()
+
+        self.page = rows
+        self.has_next = has_more if not self.reverse else True
+        self.has_previous = (has_more if self.reverse else self.cursor is not None)
+        return rows
+
+    # -- ordering ---------------------------------------------------------
+
+    def get_keys(self, queryset, view):
+        """[(name, descending), ...] ending in the primary key, or [] when the
+        ordering uses something we can't filter on (e.g. extra() selects)"""
+        query = queryset.query
+        ordering = list(query.order_by) or list(query.get_meta().ordering) or ['-pk']
+        pk_name = queryset.model._meta.pk.name
+        keys = []
+        for term in ordering:
+            if not isinstance(term, str) or '__' in term:
+                return []
+            name = term.lstrip('-')
+            name = pk_name if name == 'pk' else name
+            if name not in query.annotations:
+                try:
+                    queryset.model._meta.get_field(name)
+                except FieldDoesNotExist:
+                    return []
+            keys.append((name, term.startswith('-')))
+            if name == pk_name:
+                break
+        else:
+            keys.append((pk_name, keys[-1][1] if keys else True))
+        return keys
+
+    def order_term(self, name, descending):
+        return f'-{name}' if descending else name
+
+    def seek(self, values, reverse):
+        """Rows strictly after (or before, when paging back) the cursor tuple"""
+        if len(values) != len(self.keys):
+            raise NotFound(self.invalid_cursor_message)
+        condition = Q()
+        for i, (name, desc) in enumerate(self.keys):
+            op = 'lt' if desc != reverse else 'gt'
+            ties = {self.keys[j][0]: values[j] for j in range(i)}
+            condition |= Q(**ties, **{f'{name}__{op}': values[i]})
+        # A sargable bound on the leading key lets the database seek the index
+        first, desc = self.keys[0]
+        bound = 'lte' if desc != reverse else 'gte'
+        return Q(**{f'{first}__{bound}': values[0]}) & condition
+
+    # -- cursors ----------------------------------------------------------
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            if self.keys:
+                assert isinstance(cursor['k'], list)
+            else:
+                cursor['o'] = max(0, int(cursor['o']))
+        except (TypeError, ValueError, KeyError, AssertionError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
+
+    def encode_cursor(self, row, reverse, offset=None):
+        if self.keys:
+            cursor = {'k': [_encode_value(_row_value(row, name)) for name, _ in self.keys]}
+        else:
+            cursor = {'o': offset}
+        if reverse:
+            cursor['r'] = 1
+        encoded = base64.urlsafe_b64encode(json.dumps(cursor, separators=(',', ':')).encode('utf-8'))
+        return replace_query_param(self.base_url, self.cursor_query_param, force_str(encoded))
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False, offset=self.offset + len(self.page))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.keys:
+            if self.offset - self.page_size <= 0:
+                return remove_query_param(self.base_url, self.cursor_query_param)
+            return self.encode_cursor(None, reverse=False, offset=self.offset - self.page_size)
+        if not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    # -- response ---------------------------------------------------------
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
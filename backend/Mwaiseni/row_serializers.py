@@ -0,0 +1,192 @@
+"""
+Read-only serializers over values() rows.
+
+A ModelSerializer builds a model instance per row and then sends every field
+through get_attribute() and to_representation(). For read-heavy list
+endpoints RowSerializer produces the same output from plain values() dicts:
+it takes the field list of an existing serializer class, works out the
+column behind each field once per class, and binds one extractor per field,
+so a row becomes a dict in a single loop. Common field types (strings,
+integers, booleans, UUIDs, choices, decimals) get a precompiled extractor;
+anything else calls the field's own to_representation().
+
+Subclasses set `serializer_class` and supply whatever a column can't:
+
+    annotations   {field name: SQL expression}, selected under that name
+    get_<field>   replaces a SerializerMethodField; called with the row dict,
+                  which holds the columns listed for the field in the
+                  serializer's Meta.field_columns
+
+Nested serializers over a foreign key are read from `<fk>__<field>` columns
+in the same query. values() fetches the columns:
+
+    rows = PropertyListRowSerializer.values(queryset, 'updated_at')
+    data = PropertyListRowSerializer(rows, many=True, context=context).data
+
+Both take the fields= / expand= selection of Mwaiseni/sparse_fields.py and
+then read, annotate and join only what the selected fields need.
+"""
+
+import decimal
+from functools import lru_cache
+
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework import fields as drf_fields, serializers
+from rest_framework.settings import api_settings
+
+
+def _identity(value):
+    return value
+
+
+def _choice(field):
+    get = field.choice_strings_to_values.get
+    return lambda value: get(str(value), value)
+
+
+def _decimal(field):
+    """DecimalField.to_representation with the quantizing context built once"""
+    coerce_to_string = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+    if field.decimal_places is None or field.localize or field.normalize_output or not coerce_to_string:
+        return field.to_representation
+    context = decimal.getcontext().copy()
+    if field.max_digits is not None:
+        context.prec = field.max_digits
+    quantum = decimal.Decimal('.1') ** field.decimal_places
+    rounding = field.rounding
+
+    def to_representation(value):
+        if not isinstance(value, decimal.Decimal):
+            return field.to_representation(value)
+        return f'{value.quantize(quantum, rounding=rounding, context=context):f}'
+    return to_representation
+
+
+# Fields whose to_representation() is a plain conversion of the column value
+CONVERTERS = {
+    drf_fields.CharField: str,
+    drf_fields.EmailField: str,
+    drf_fields.SlugField: str,
+    drf_fields.URLField: str,
+    drf_fields.IntegerField: int,
+    drf_fields.FloatField: float,
+    drf_fields.BooleanField: bool,
+    drf_fields.ReadOnlyField: _identity,
+}
+
+
+def _extractor(field):
+    converter = CONVERTERS.get(type(field))
+    if converter is not None:
+        return converter
+    if type(field) is drf_fields.UUIDField and field.uuid_format == 'hex_verbose':
+        return str
+    if type(field) is drf_fields.ChoiceField:
+        return _choice(field)
+    if type(field) is drf_fields.DecimalField:
+        return _decimal(field)
+    if type(field) is serializers.PrimaryKeyRelatedField and field.pk_field is None:
+        # values('<fk>') is already the related primary key
+        return _identity
+    return field.to_representation
+
+
+def _compile(serializer, prefix, annotations):
+    """[(name, column, extractor)] for the serializer's readable fields. column
+    is None where the extractor takes the whole row: nested serializers, and
+    method fields, whose extractor is still the method name"""
+    plan = []
+    for field in serializer._readable_fields:
+        name = field.field_name
+        if not prefix and name in annotations:
+            plan.append((name, name, _identity))
+        elif isinstance(field, serializers.SerializerMethodField) and not prefix:
+            plan.append((name, None, field.method_name))
+        elif isinstance(field, serializers.ModelSerializer):
+            nested = prefix + '__'.join(field.source_attrs) + '__'
+            pk_column = nested + field.Meta.model._meta.pk.name
+            plan.append((name, None, _nested(pk_column, _compile(field, nested, annotations))))
+        elif isinstance(field, (serializers.BaseSerializer, serializers.SerializerMethodField)) \
+                or field.source == '*':
+            raise ImproperlyConfigured(f'RowSerializer cannot read {prefix}{name} ({type(field).__name__})')
+        else:
+            plan.append((name, prefix + '__'.join(field.source_attrs), _extractor(field)))
+    return plan
+
+
+def _represent(row, plan):
+    ret = {}
+    for name, column, extract in plan:
+        if column is None:
+            ret[name] = extract(row)
+        else:
+            value = row[column]
+            ret[name] = None if value is None else extract(value)
+    return ret
+
+
+def _nested(pk_column, plan):
+    def extract(row):
+        return None if row[pk_column] is None else _represent(row, plan)
+    extract.pk_column = pk_column
+    extract.plan = plan
+    return extract
+
+
+def _columns(plan, field_columns):
+    for name, column, extract in plan:
+        if column is not None:
+            yield column
+        elif callable(extract):
+            yield extract.pk_column
+            yield from _columns(extract.plan, {})
+        else:
+            yield from field_columns.get(name, ())
+
+
+@lru_cache(maxsize=256)
+def _plan(cls, fields, expand):
+    selection = {key: names for key, names in (('fields', fields), ('expand', expand)) if names is not None}
+    return _compile(cls.serializer_class(**selection), '', cls.annotations)
+
+
+class RowSerializer(serializers.BaseSerializer):
+    """Output of `serializer_class` for values() rows; read-only"""
+
+    serializer_class = None
+    annotations = {}
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        self.selected = fields
+        self.expand = expand
+        super().__init__(*args, **kwargs)
+
+    @classmethod
+    def plan(cls, fields=None, expand=None):
+        """Compiled once per class and selection"""
+        return _plan(cls, None if fields is None else frozenset(fields), None if expand is None else frozenset(expand))
+
+    @classmethod
+    def values(cls, queryset, *names, fields=None, expand=None):
+        """queryset as dicts holding every column the selected fields read, plus `names`"""
+        plan = cls.plan(fields, expand)
+        field_columns = getattr(cls.serializer_class.Meta, 'field_columns', {})
+        columns = dict.fromkeys([*_columns(plan, field_columns), *names])
+        annotations = {name: expression for name, expression in cls.annotations.items() if name in columns}
+        return queryset.annotate(**annotations).values(*columns)
+
+    def bound_plan(self):
+        if getattr(self, '_bound_plan', None) is None:
+            plan = []
+            for name, column, extract in self.plan(self.selected, self.expand):
+                if isinstance(extract, str):
+                    method = getattr(self, extract, None)
+                    if method is None:
+                        raise ImproperlyConfigured(f'{type(self).__name__} needs {extract}(row) for {name}')
+                    extract = method
+                plan.append((name, column, extract))
+            self._bound_plan = plan
+        return self._bound_plan
+
+    def to_representation(self, row):
+        return _represent(row, self.bound_plan())
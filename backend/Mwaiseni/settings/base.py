@@ -12,7 +12,16 @@ SECRET_KEY = os.getenv('SECRET_KEY', 'django-insecure-Mwaiseni-key')
 DEBUG = os.getenv('DEBUG', 'True') == 'True'
 ALLOWED_HOSTS = os.getenv('ALLOWED_HOSTS', 'localhost,127.0.0.1,*').split(',')
 
+# Serve the read-heavy property endpoints with async views (set by asgi.py)
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'False') == 'True'
+# Server-Timing header on every response; staff always get it
+SERVER_TIMING = os.getenv('SERVER_TIMING', str(DEBUG)) == 'True'
+# Bearer token Prometheus must send to /metrics; /metrics is a 404 when empty
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
 INSTALLED_APPS = [
+    # Must precede staticfiles: runserver then serves ASGI, WebSockets included
+    "daphne",
     "django.contrib.admin",
     "django.contrib.auth",
     "django.contrib.contenttypes",
@@ -23,15 +32,20 @@ INSTALLED_APPS = [
     "rest_framework",
     "rest_framework.authtoken",
     "corsheaders",
+    "channels",
     "api",
     "properties",
     "users",
     "bookings",
+    "messaging",
 ]
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
-    "whitenoise.middleware.WhiteNoiseMiddleware",
+    # WhiteNoise, async-capable so ASGI requests stay off worker threads
+    "Mwaiseni.static_files.StaticFilesMiddleware",
+    # After WhiteNoise, so static files are not measured
+    "Mwaiseni.instrumentation.RequestMetricsMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -42,6 +56,7 @@ MIDDLEWARE = [
 ]
 
 ROOT_URLCONF = "Mwaiseni.urls"
+ASGI_APPLICATION = "Mwaiseni.asgi.application"
 
 TEMPLATES = [
     {
@@ -62,7 +77,10 @@ TEMPLATES = [
 # Database configuration
 if os.getenv('DATABASE_URL'):
     DATABASES = {
-        'default': dj_database_url.config(conn_max_age=600, ssl_require=True)
+        'default': dj_database_url.config(
+            conn_max_age=600,
+            ssl_require=not os.getenv('DATABASE_URL').startswith('sqlite'),
+        )
     }
 else:
     DATABASES = {
@@ -72,6 +90,43 @@ else:
         }
     }
 
+# Cache: Redis in production (REDIS_URL), per-process memory otherwise
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            # django_redis's RedisCache, counting hits and misses (see metrics.py)
+            'BACKEND': 'Mwaiseni.metrics.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+            'KEY_PREFIX': 'mwaiseni',
+            'OPTIONS': {
+                'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+                # A cache outage should degrade to database reads, not 500s
+                'IGNORE_EXCEPTIONS': True,
+            },
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'Mwaiseni.metrics.LocMemCache',
+            'LOCATION': 'mwaiseni',
+        }
+    }
+
+# Channel layer for WebSocket fan-out: Redis across processes in production,
+# in-process memory (tests, single-process dev) otherwise
+if os.getenv('REDIS_URL'):
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {'hosts': [os.getenv('REDIS_URL')]},
+        }
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'},
+    }
+
 # Static and Media Files
 STATIC_URL = "static/"
 STATIC_ROOT = BASE_DIR / "staticfiles"
@@ -91,10 +146,24 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        # TokenAuthentication with the lookup cached (users/authentication.py)
+        'users.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
+    # rest_framework's JSONRenderer/JSONParser on ujson (Mwaiseni/fastjson.py)
+    'DEFAULT_RENDERER_CLASSES': [
+        'Mwaiseni.fastjson.UJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'Mwaiseni.fastjson.UJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    # No DEFAULT_PAGINATION_CLASS: list endpoints that page set
+    # pagination_class = KeysetPagination (Mwaiseni/pagination.py) and answer
+    # {next, previous, results}; the others still return plain lists
 }
\ No newline at end of file
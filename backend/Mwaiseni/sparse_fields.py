@@ -0,0 +1,174 @@
+"""
+Sparse fieldsets for read endpoints: ?fields= and ?expand=.
+
+    GET /api/properties/?fields=id,title,price_per_night,average_rating
+    GET /api/properties/12/?fields=title,host&expand=
+
+?fields= keeps only the named top-level fields of the response.
+?expand= names the nested relations to render in full; nested relations
+left out are rendered as their primary key. Without ?expand= every nested
+relation is expanded, so a request with neither parameter gets the response
+it always got. Unknown names are a 400.
+
+The query follows the selection. SparseFieldsMixin defers every column no
+selected field reads (.only()) and joins only the relations that are
+rendered (select_related()). Row serializers (Mwaiseni/row_serializers.py)
+select the same columns with values(). A SerializerMethodField's columns
+are declared in the serializer's Meta.field_columns; a selection with an
+undeclared method field leaves the columns alone.
+
+    class PropertySerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
+        class Meta:
+            field_columns = {'stay_quote': ['max_guests', 'price_per_night', ...]}
+
+    class PropertyViewSet(SparseFieldsMixin, ConditionalGetMixin, viewsets.ModelViewSet):
+        ...
+
+Selections only apply to GET and HEAD; writes validate and answer with the
+full serializer.
+"""
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+
+SAFE_METHODS = ('GET', 'HEAD')
+
+
+def expandable_fields(serializer):
+    """Names of the nested model serializers among serializer's readable fields"""
+    return [field.field_name for field in serializer._readable_fields
+            if isinstance(field, serializers.ModelSerializer)]
+
+
+def _concrete(model, name):
+    try:
+        return model._meta.get_field(name).concrete
+    except FieldDoesNotExist:
+        return False
+
+
+def read_columns(serializer):
+    """.only() names for the columns serializer's readable fields read, or
+    None when a field reads something we can't name"""
+    model = serializer.Meta.model
+    declared = getattr(serializer.Meta, 'field_columns', {})
+    columns = []
+    for field in serializer._readable_fields:
+        if isinstance(field, serializers.SerializerMethodField):
+            if field.field_name not in declared:
+                return None
+            columns.extend(declared[field.field_name])
+        elif isinstance(field, serializers.ModelSerializer):
+            nested = read_columns(field)
+            if nested is None:
+                return None
+            relation = '__'.join(field.source_attrs)
+            columns.extend([relation, *(f'{relation}__{column}' for column in nested)])
+        elif isinstance(field, serializers.BaseSerializer) or len(field.source_attrs) != 1 \
+                or not _concrete(model, field.source_attrs[0]):
+            return None
+        else:
+            columns.append(field.source_attrs[0])
+    return columns
+
+
+class SparseFieldsSerializerMixin:
+    """ModelSerializer taking fields= (names to keep) and expand= (nested
+    relations to keep nested); None, the default, keeps everything"""
+
+    def __init__(self, *args, **kwargs):
+        selected = kwargs.pop('fields', None)
+        expand = kwargs.pop('expand', None)
+        super().__init__(*args, **kwargs)
+        if selected is not None:
+            for name in set(self.fields) - set(selected):
+                self.fields.pop(name)
+        if expand is not None:
+            for name in expandable_fields(self):
+                if name not in expand:
+                    field = self.fields[name]
+                    source = {} if field.source == name else {'source': field.source}
+                    self.fields[name] = serializers.PrimaryKeyRelatedField(read_only=True, **source)
+
+
+class SparseFieldsMixin:
+    """?fields= and ?expand= for a viewset whose serializers use
+    SparseFieldsSerializerMixin"""
+
+    fields_query_param = 'fields'
+    expand_query_param = 'expand'
+
+    def get_field_selection(self):
+        """{'fields': names, 'expand': names} for the parameters the request
+        gave, validated against the action's serializer; {} for writes"""
+        if getattr(self, '_field_selection', None) is None:
+            self._field_selection = self.parse_field_selection()
+        return self._field_selection
+
+    def parse_field_selection(self):
+        if self.request.method not in SAFE_METHODS:
+            return {}
+        params = self.request.query_params
+        serializer = self.get_serializer_class()()
+        selection = {}
+        for param, key, allowed in (
+            (self.fields_query_param, 'fields', [f.field_name for f in serializer._readable_fields]),
+            (self.expand_query_param, 'expand', expandable_fields(serializer)),
+        ):
+            if param not in params:
+                continue
+            names = [name.strip() for name in params[param].split(',') if name.strip()]
+            unknown = [name for name in names if name not in allowed]
+            if unknown:
+                raise ValidationError({param: f"Unknown {key} {', '.join(unknown)}; expected any of {', '.join(allowed)}"})
+            if key == 'fields' and not names:
+                raise ValidationError({param: 'Expected a comma-separated list of fields'})
+            selection[key] = frozenset(names)
+        return selection
+
+    def selects(self, name):
+        """Whether the response includes the top-level field `name`"""
+        selected = self.get_field_selection().get('fields')
+        return selected is None or name in selected
+
+    def field_selection_key(self):
+        """Cache key parts that tell selections apart; [] for the full response"""
+        return [f"{key}={','.join(sorted(names))}" for key, names in sorted(self.get_field_selection().items())]
+
+    def get_serializer(self, *args, **kwargs):
+        for key, names in self.get_field_selection().items():
+            kwargs.setdefault(key, names)
+        return super().get_serializer(*args, **kwargs)
+
+    def get_row_serializer(self, *args, **kwargs):
+        for key, names in self.get_field_selection().items():
+            kwargs.setdefault(key, names)
+        return super().get_row_serializer(*args, **kwargs)
+
+    def filter_queryset(self, queryset):
+        return self.narrow_queryset(super().filter_queryset(queryset))
+
+    def narrow_queryset(self, queryset):
+        """queryset reading only what the selected fields need, plus the
+        primary key, the ordering keys and any conditional GET validator"""
+        selection = self.get_field_selection()
+        if not selection:
+            return queryset
+        columns = read_columns(self.get_serializer())
+        if columns is None:
+            return queryset
+        query = queryset.query
+        ordering = [term.lstrip('-') for term in (query.order_by or query.get_meta().ordering)
+                    if isinstance(term, str) and term != '?' and '__' not in term]
+        validator = getattr(self, 'validator_field', None)
+        joins = {column.rsplit('__', 1)[0] for column in columns if '__' in column}
+        # Annotations (e.g. distance_km) and extra() selects (e.g. search_rank)
+        # aren't columns; only() keeps them anyway
+        required = ['pk', *(name for name in (validator, *ordering)
+                            if name and _concrete(query.model, name))]
+        queryset = queryset.select_related(None)
+        if joins:
+            # select_related() without names would follow every foreign key
+            queryset = queryset.select_related(*sorted(joins))
+        return queryset.only(*dict.fromkeys([*required, *columns]))
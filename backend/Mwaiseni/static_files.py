@@ -0,0 +1,37 @@
+"""
+WhiteNoise for both WSGI and ASGI.
+
+whitenoise.middleware.WhiteNoiseMiddleware is sync-only. Under ASGI, Django
+adapts it with async_to_sync and runs the chain below it in a thread, so
+every request, static or not, holds a worker thread until it is answered.
+StaticFilesMiddleware is the same middleware, marked async-capable: finding
+the file is a dict lookup, so other requests pass straight on to the next
+coroutine, and only a static file hit goes to a thread to open the file.
+"""
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, **kwargs):
+        super().__init__(get_response, **kwargs)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve)(static_file, request)
+        return await self.get_response(request)
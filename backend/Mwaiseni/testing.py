@@ -0,0 +1,26 @@
+"""
+Test helpers shared by the app test suites.
+"""
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+
+class QueryBudgetTestCase(APITestCase):
+    """APITestCase with per-endpoint SQL query budgets.
+
+    A budget is the most queries a request may run. Budgets are independent
+    of page size, so an N+1 regression fails no matter how many rows exist.
+    """
+
+    def assertQueryBudget(self, budget, url, method='get', status_code=200, **kwargs):
+        with CaptureQueriesContext(connection) as context:
+            response = getattr(self.client, method)(url, **kwargs)
+        self.assertEqual(response.status_code, status_code, getattr(response, 'data', response))
+        queries = [q['sql'] for q in context.captured_queries]
+        self.assertLessEqual(
+            len(queries), budget,
+            f'{method.upper()} {url} ran {len(queries)} queries (budget {budget}):\n' + '\n'.join(queries),
+        )
+        return response
@@ -1,5 +1,6 @@
 from django.contrib import admin
 from . import views
+from .metrics import metrics_view
 from django.urls import path, re_path, include
 from django.views.generic import TemplateView
 from django.conf import settings
@@ -11,6 +12,9 @@ urlpatterns = [
     # Admin - MUST come first
     path('admin/', admin.site.urls),
     
+    # Prometheus scrape target
+    path('metrics', metrics_view, name='metrics'),
+
     # API routes
     path('api/', include('api.urls')),
     
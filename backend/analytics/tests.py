@@ -1,3 +1,145 @@
-from django.test import TestCase
+import re
+from datetime import date, timedelta
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from prometheus_client import REGISTRY
+from rest_framework.test import APIClient
+
+from Mwaiseni import instrumentation
+from properties.tests import make_property
+from users.models import Booking, Payment, Payout, User
+
+
+class RequestMetricsTests(TestCase):
+
+    def setUp(self):
+        instrumentation.samples.clear()
+        self.client = APIClient()
+        self.staff = User.objects.create_user(email='staff@mwaiseni.test', password=None, is_staff=True)
+
+    def timing(self, response):
+        return dict(
+            (name, params) for name, params in
+            (metric.strip().split(';', 1) for metric in response['Server-Timing'].split(','))
+        )
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse('property-list'))
+        self.assertEqual(response.status_code, 200)
+        timing = self.timing(response)
+        self.assertEqual(set(timing), {'total', 'db', 'serialize', 'size'})
+        queries = int(re.search(r'desc="(\d+) queries"', timing['db']).group(1))
+        self.assertGreater(queries, 0)
+        self.assertEqual(timing['size'], f'desc="{len(response.content)} bytes"')
+
+    def test_serializer_time_is_counted(self):
+        make_property(self.staff)
+        self.client.get(reverse('property-list'))
+        self.assertGreater(instrumentation.snapshot()['GET property-list']['serialize_ms']['max'], 0)
+
+    @override_settings(SERVER_TIMING=False)
+    def test_server_timing_only_for_staff(self):
+        self.assertNotIn('Server-Timing', self.client.get(reverse('property-list')))
+        self.client.force_authenticate(self.staff)
+        self.assertIn('Server-Timing', self.client.get(reverse('property-list')))
+        # Samples are kept either way
+        self.assertEqual(instrumentation.snapshot()['GET property-list']['requests'], 2)
+
+    def test_counts_only_this_requests_queries(self):
+        self.client.force_authenticate(self.staff)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('user-detail', args=[self.staff.pk]))
+        self.assertIn('desc="1 queries"', response['Server-Timing'])
+
+    def test_staff_only(self):
+        url = reverse('request-metrics')
+        self.assertIn(self.client.get(url).status_code, (401, 403))
+        self.client.force_authenticate(User.objects.create_user(email='guest@mwaiseni.test', password=None))
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_per_route_histograms(self):
+        for _ in range(3):
+            self.client.get(reverse('property-list'))
+        self.client.force_authenticate(self.staff)
+        routes = self.client.get(reverse('request-metrics')).data['routes']
+        route = routes['GET property-list']
+        self.assertEqual(route['requests'], 3)
+        self.assertEqual(route['window'], 3)
+        self.assertEqual(sum(bucket['count'] for bucket in route['histogram']), 3)
+        self.assertGreater(route['queries']['max'], 0)
+        self.assertLessEqual(route['total_ms']['p50'], route['total_ms']['max'])
+
+        self.assertEqual(self.client.delete(reverse('request-metrics')).status_code, 204)
+        # Only the DELETE itself, recorded after the clear
+        self.assertEqual(list(instrumentation.snapshot()), ['DELETE request-metrics'])
+
+    def test_window_is_bounded(self):
+        recent = instrumentation.RouteSamples(size=2)
+        for total in (1, 2, 3):
+            recent.add('GET x', (total, 0, 0, 0, 0))
+        [(route, rows, count)] = recent.items()
+        self.assertEqual((route, [row[0] for row in rows], count), ('GET x', [2, 3], 3))
+
+
+@override_settings(METRICS_TOKEN='scrape-secret')
+class PrometheusMetricsTests(TestCase):
+
+    def scrape(self, authorization='Bearer scrape-secret'):
+        response = self.client.get(reverse('metrics'), headers={'authorization': authorization})
+        self.assertEqual(response.status_code, 200)
+        return {
+            line.rsplit(' ', 1)[0]: float(line.rsplit(' ', 1)[1])
+            for line in response.content.decode().splitlines() if line and not line.startswith('#')
+        }
+
+    def test_request_counters(self):
+        self.client.get(reverse('property-list'))
+        self.client.get(reverse('property-list'))
+        samples = self.scrape()
+        labels = 'method="GET",status="200",view="property-list"'
+        self.assertGreaterEqual(samples[f'django_http_requests_total{{{labels}}}'], 2)
+        self.assertGreaterEqual(samples[f'django_http_request_duration_seconds_count{{{labels}}}'], 2)
+        self.assertGreaterEqual(samples['django_db_queries_total{method="GET",view="property-list"}'], 2)
+
+    def test_cache_hits_and_misses(self):
+        def count(result):
+            return REGISTRY.get_sample_value('django_cache_gets_total',
+                                             {'cache': 'default', 'result': result}) or 0
+
+        hits, misses = count('hit'), count('miss')
+        cache.delete('metrics-test')
+        self.assertIsNone(cache.get('metrics-test'))
+        cache.set('metrics-test', 0)
+        self.assertEqual(cache.get('metrics-test'), 0)
+        self.assertEqual(cache.get_many(['metrics-test', 'metrics-absent']), {'metrics-test': 0})
+        self.assertEqual((count('hit') - hits, count('miss') - misses), (2, 2))
+
+    def test_business_gauges(self):
+        host = User.objects.create_user(email='host@mwaiseni.test', password=None)
+        booking = Booking.objects.create(property=make_property(host), guest=host, check_in=date.today(),
+                                         check_out=date.today() + timedelta(days=1), total_price=850)
+        Booking.objects.create(property=booking.property, guest=host, check_in=date.today(),
+                               check_out=date.today() + timedelta(days=1), total_price=850, status='confirmed')
+        Payment.objects.create(booking=booking, amount=850, payment_method='card', transaction_id='tx-1')
+        payout = Payout.objects.create(user=host, amount=850, payment_details={})
+        Payout.objects.filter(pk=payout.pk).update(created_at=timezone.now() - timedelta(hours=2))
+
+        samples = self.scrape()
+        self.assertEqual(samples['mwaiseni_bookings_pending'], 1)
+        self.assertEqual(samples['mwaiseni_payments_pending'], 1)
+        self.assertEqual(samples['mwaiseni_payouts_pending'], 1)
+        self.assertGreaterEqual(samples['mwaiseni_payout_oldest_pending_age_seconds'], 2 * 3600)
+
+    def test_token(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        self.assertEqual(self.client.get(reverse('metrics'), headers={'authorization': 'Bearer wrong'}).status_code,
+                         403)
+        self.assertIn('mwaiseni_bookings_pending', self.scrape())
+
+    @override_settings(METRICS_TOKEN='')
+    def test_closed_without_a_token(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, 404)
@@ -6,5 +6,6 @@ router = DefaultRouter()
 # router.register(r'analytics', views.AnalyticsViewSet)
 
 urlpatterns = [
+    path('requests/', views.RequestMetricsView.as_view(), name='request-metrics'),
     path('', include(router.urls)),
 ]
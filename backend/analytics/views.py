@@ -1,3 +1,22 @@
-from django.shortcuts import render
+from rest_framework import status
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-# Create your views here.
+from Mwaiseni import instrumentation
+
+
+class RequestMetricsView(APIView):
+    """Rolling per-route request timings of this process (staff only)"""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response({
+            'samples_per_route': instrumentation.samples.size,
+            'histogram_buckets_ms': [str(bound) for bound in instrumentation.HISTOGRAM_BUCKETS_MS],
+            'routes': instrumentation.snapshot(),
+        })
+
+    def delete(self, request):
+        instrumentation.samples.clear()
+        return Response(status=status.HTTP_204_NO_CONTENT)
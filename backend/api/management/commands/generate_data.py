@@ -0,0 +1,385 @@
+"""
+Production-scale synthetic data in the configured database.
+
+    python manage.py generate_data --properties 10000 --days 365 --bookings 100000
+
+Generates users (guests and hosts), properties with room types, nightly
+Availability, bookings with their payments, reviews of completed stays, and
+guest-host conversations with messages. Cities, property types, prices and
+occupancy follow rough Zambian distributions: Lusaka carries the most
+listings, Livingstone the lodges and the highest rates, weekends and the
+December holidays fill up and cost more, guests pay mostly by mobile money.
+
+Everything is drawn from one random generator seeded with --seed (primary
+keys of users included), so the same options give the same data. Rows are
+streamed into the database with bulk_create in batches of --batch-size, and
+bookings are generated batch by batch together with their payments, reviews
+and conversations, so memory stays bounded however many rows are asked for;
+only the ids of users, properties and room types are held. Availability is
+drawn independently of the generated bookings.
+
+Timestamps are back-dated, which auto_now/auto_now_add would overwrite, so
+those fields are switched off while the rows are written. bulk_create sends
+no signals: rating aggregates and unread counters are rebuilt at the end.
+"""
+
+import bisect
+import itertools
+import random
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from messaging import unread
+from Mwaiseni.benchmarking import stream_create
+from properties import geo, ratings
+from properties.management.inventory import CITY_CENTRES
+from properties.models import Property
+from users.models import Availability, Booking, Conversation, Message, Payment, Review, RoomType, User
+
+# Share of listings per city
+CITY_WEIGHTS = {
+    'lusaka': 38, 'livingstone': 16, 'ndola': 10, 'kitwe': 10, 'solwezi': 7,
+    'mazabuka': 5, 'chipata': 5, 'kabwe': 5, 'mongu': 4,
+}
+# Typical nightly rate of a mid-range listing, ZMW
+CITY_MEDIAN_PRICE = {
+    'lusaka': 900, 'livingstone': 1400, 'ndola': 700, 'kitwe': 700, 'solwezi': 850,
+    'mazabuka': 500, 'chipata': 550, 'kabwe': 500, 'mongu': 450,
+}
+# Base occupancy per city; weekends and holidays add to it
+CITY_OCCUPANCY = {
+    'lusaka': 0.55, 'livingstone': 0.6, 'ndola': 0.45, 'kitwe': 0.45, 'solwezi': 0.5,
+    'mazabuka': 0.35, 'chipata': 0.35, 'kabwe': 0.3, 'mongu': 0.3,
+}
+# (weight, price multiplier, room types offered)
+PROPERTY_TYPES = {
+    'apartment': (22, 0.9, ['Entire apartment']),
+    'house': (14, 1.0, ['Entire house']),
+    'guesthouse': (18, 0.6, ['Single', 'Double', 'Twin', 'Family']),
+    'lodge': (12, 1.4, ['Double', 'Twin', 'Family chalet', 'Luxury tent']),
+    'hotel': (10, 1.3, ['Standard', 'Double', 'Twin', 'Executive', 'Suite']),
+    'hostel': (5, 0.35, ['Dorm bed', 'Private room']),
+    'cottage': (7, 0.8, ['Entire cottage']),
+    'cabin': (5, 0.9, ['Entire cabin']),
+    'villa': (7, 2.2, ['Entire villa']),
+}
+ROOM_TYPES = {
+    # name: (price multiplier, capacity, rooms of this type (min, max))
+    'Single': (0.7, 1, (2, 8)), 'Double': (1.0, 2, (3, 15)), 'Twin': (1.0, 2, (2, 10)),
+    'Family': (1.5, 4, (1, 4)), 'Family chalet': (1.6, 5, (1, 4)), 'Luxury tent': (2.0, 2, (2, 6)),
+    'Standard': (0.9, 2, (10, 40)), 'Executive': (1.6, 2, (4, 12)), 'Suite': (2.5, 3, (1, 4)),
+    'Dorm bed': (0.4, 1, (8, 24)), 'Private room': (1.0, 2, (2, 6)),
+    'Entire apartment': (1.0, 4, (1, 1)), 'Entire house': (1.0, 6, (1, 1)),
+    'Entire cottage': (1.0, 4, (1, 1)), 'Entire cabin': (1.0, 4, (1, 1)), 'Entire villa': (1.0, 10, (1, 1)),
+}
+FIRST_NAMES = (
+    'Mwansa Chanda Bwalya Mulenga Musonda Natasha Kondwani Thandiwe Chilufya Mutale Lweendo Chipo '
+    'Mapalo Luyando Kabwe Nalukui Chisomo Mwila Temwani Njavwa Bupe Kasonde Inonge Mubanga '
+    'Chileshe Daliso Misozi Lubinda Namakau Chikondi'
+).split()
+LAST_NAMES = (
+    'Banda Phiri Tembo Zulu Mwale Lungu Sakala Daka Mumba Ngoma Mwanza Kapembwa Chisenga Mbewe '
+    'Nyirenda Kabwe Siame Simbeye Hamusonde Mwiinga Munsaka Mulenga Kalaba Nkhata Chama'
+).split()
+STREETS = (
+    'Cairo Road, Great East Road, Independence Avenue, Kabulonga Road, Addis Ababa Drive, Mosi-oa-Tunya Road, '
+    'Broadway, Freedom Way, Obote Avenue, President Avenue, Chiwala Road, Kafue Road'
+).split(', ')
+TITLE_WORDS = {
+    'apartment': ['Modern', 'City', 'Serviced', 'Cosy', 'Executive'],
+    'house': ['Family', 'Garden', 'Spacious', 'Quiet'],
+    'guesthouse': ['Friendly', 'Budget', 'Comfort', 'Heritage'],
+    'lodge': ['Riverside', 'Safari', 'Zambezi', 'Bush', 'Sunset'],
+    'hotel': ['Grand', 'Royal', 'Continental', 'Premier'],
+    'hostel': ['Backpackers', 'Traveller', 'Jollyboys'],
+    'cottage': ['Lakeside', 'Farm', 'Hillside'],
+    'cabin': ['Bush', 'Forest', 'River'],
+    'villa': ['Luxury', 'Palm', 'Kariba'],
+}
+PAYMENT_METHODS = [('mtn_momo', 40), ('airtel_money', 30), ('card', 25), ('zamtel_kwacha', 5)]
+RATINGS = [(5, 45), (4, 35), (3, 12), (2, 5), (1, 3)]
+REVIEW_COMMENTS = {
+    5: ['Wonderful stay, the host went out of their way for us.', 'Spotless and exactly as described.'],
+    4: ['Good value and a great location.', 'Comfortable, would stay again.'],
+    3: ['Decent, but the water pressure was low.', 'Fine for a night or two.'],
+    2: ['Load-shedding with no backup power.', 'Not as clean as the photos suggest.'],
+    1: ['Booking was not honoured on arrival.', 'Would not recommend.'],
+}
+GUEST_LINES = [
+    'Hello, is airport pickup available?', 'What time is check-in?', 'Is there backup power during load-shedding?',
+    'Can we pay by mobile money on arrival?', 'Is breakfast included?', 'We will arrive late, around 22:00.',
+]
+HOST_LINES = [
+    'Welcome! Check-in is from 14:00.', 'Yes, we have a solar backup.', 'Pickup is K250 from the airport.',
+    'Breakfast is served from 06:30 to 09:30.', 'No problem, the night guard will let you in.',
+    'Thank you for booking with us.',
+]
+# Length of stay in nights and how common it is
+STAY_NIGHTS = [(1, 30), (2, 28), (3, 18), (4, 8), (5, 6), (7, 6), (10, 2), (14, 2)]
+
+
+class Choice:
+    """Weighted choice with a cumulative table, faster than rng.choices()
+    when the same weights are drawn from millions of times"""
+
+    def __init__(self, weighted):
+        self.values = [value for value, _ in weighted]
+        self.cumulative = list(itertools.accumulate(weight for _, weight in weighted))
+
+    def __call__(self, rng):
+        return self.values[bisect.bisect(self.cumulative, rng.random() * self.cumulative[-1])]
+
+
+@contextmanager
+def given_timestamps(*models):
+    """Let bulk_create keep the created_at/updated_at values set on the objects"""
+    fields = [field for model in models for field in model._meta.concrete_fields
+              if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)]
+    saved = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, saved):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    help = 'Generate production-scale synthetic users, listings, inventory, bookings and messages'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20000, help='Guests')
+        parser.add_argument('--hosts', type=int, default=2000)
+        parser.add_argument('--properties', type=int, default=10000)
+        parser.add_argument('--days', type=int, default=180, help='Nights of availability from today')
+        parser.add_argument('--bookings', type=int, default=100000)
+        parser.add_argument('--conversation-share', type=float, default=0.3,
+                            help='Fraction of bookings with a guest-host conversation')
+        parser.add_argument('--max-messages', type=int, default=12, help='Messages per conversation, at most')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--force', action='store_true', help='Allow running with DEBUG off')
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options['force']:
+            raise CommandError('DEBUG is off: this writes synthetic rows into the configured database. '
+                               'Pass --force if that is really what you want.')
+        if not options['hosts'] or not options['users']:
+            raise CommandError('Need at least one guest and one host')
+        if User.objects.filter(email=self.email('guest', options['seed'], 0)).exists():
+            raise CommandError(f"Data for seed {options['seed']} already exists; pick another --seed")
+
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.today = date.today()
+        self.now = datetime.now().replace(microsecond=0)
+        started = time.perf_counter()
+        with given_timestamps(Property, Booking, Payment, Review, Conversation, Message):
+            guests = self.step('users', lambda: self.users(options, 'guest', options['users']))
+            hosts = self.step('hosts', lambda: self.users(options, 'host', options['hosts']))
+            properties = self.step('properties', lambda: self.properties(options, hosts))
+            room_types = self.step('room types', lambda: self.room_types(properties))
+            self.step('availability', lambda: self.availability(options, properties, room_types))
+            self.step('bookings and related rows', lambda: self.bookings(options, guests, properties, room_types))
+        self.step('rating aggregates', lambda: ratings.rebuild())
+        self.step('unread counters', lambda: unread.rebuild())
+        self.stdout.write(self.style.SUCCESS(f'Done in {time.perf_counter() - started:.1f}s'))
+
+    def step(self, label, fn):
+        started = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - started
+        rows = result if isinstance(result, int) else len(result)
+        self.stdout.write(f'{label:<28} {rows:>12,} rows  {elapsed:>7.1f}s  {rows / max(elapsed, 1e-9):>10,.0f} rows/s')
+        return result
+
+    def email(self, kind, seed, i):
+        return f'{kind}-{seed}-{i}@mwaiseni.test'
+
+    def users(self, options, kind, count):
+        """Returns the new users' ids"""
+        rng, password = self.rng, make_password(None)
+        city = Choice([(city, weight) for city, weight in CITY_WEIGHTS.items() if city != 'mazabuka'] + [('other', 5)])
+        tier = Choice([('bronze', 70), ('silver', 20), ('gold', 7), ('platinum', 2), ('diamond', 1)])
+        users = []
+
+        def rows():
+            for i in range(count):
+                pk = uuid.UUID(int=rng.getrandbits(128), version=4)
+                users.append(pk)
+                yield User(
+                    id=pk, email=self.email(kind, options['seed'], i), password=password,
+                    first_name=rng.choice(FIRST_NAMES), last_name=rng.choice(LAST_NAMES), user_type=kind,
+                    phone=f'+260 9{rng.choice("567")}{rng.randrange(10 ** 7):07d}', city=city(rng),
+                    is_verified=kind == 'host' or rng.random() < 0.4,
+                    date_joined=self.now - timedelta(days=rng.randrange(3 * 365), minutes=rng.randrange(1440)),
+                    loyalty_tier=tier(rng), loyalty_points=rng.randrange(5000),
+                )
+
+        stream_create(User, rows(), self.batch_size)
+        return users
+
+    def properties(self, options, hosts):
+        """Returns {id: (host_id, city, property_type, price)}; ids come back from bulk_create"""
+        rng = self.rng
+        cities = Choice(list(CITY_WEIGHTS.items()))
+        types = Choice([(name, weight) for name, (weight, _, _) in PROPERTY_TYPES.items()])
+        # Hosts own a skewed number of listings: most a handful, the first few a chain's worth
+        owners = Choice([(host_id, (rank + 1) ** -0.5) for rank, host_id in enumerate(hosts)])
+        properties = {}
+
+        def listing(i):
+            city = cities(rng)
+            property_type = types(rng)
+            if city == 'livingstone' and property_type in ('apartment', 'house') and rng.random() < 0.5:
+                property_type = 'lodge'
+            price = round(CITY_MEDIAN_PRICE[city] * PROPERTY_TYPES[property_type][1]
+                          * rng.lognormvariate(0, 0.35), -1) or 100
+            lat, lng = CITY_CENTRES[city]
+            lat, lng = round(lat + rng.gauss(0, 0.04), 6), round(lng + rng.gauss(0, 0.04), 6)
+            bedrooms = rng.choice([1, 1, 2, 2, 3, 4]) if len(PROPERTY_TYPES[property_type][2]) == 1 else 1
+            created_at = self.now - timedelta(days=rng.randrange(3 * 365), minutes=rng.randrange(1440))
+            return Property(
+                host_id=owners(rng), title=f'{rng.choice(TITLE_WORDS[property_type])} '
+                                           f'{property_type.title()} {rng.choice(LAST_NAMES)} {i}',
+                description=f'{rng.choice(TITLE_WORDS[property_type])} {property_type} in {city.title()}. '
+                            'Secure parking, friendly staff and easy access to town.',
+                property_type=property_type, address=f'{rng.randrange(1, 400)} {rng.choice(STREETS)}',
+                city=city, latitude=lat, longitude=lng, geohash=geo.encode(lat, lng),
+                price_per_night=Decimal(price), cleaning_fee=Decimal(0 if property_type in ('hotel', 'hostel')
+                                                                      else round(price * 0.1, -1)),
+                bedrooms=bedrooms, bathrooms=max(1, bedrooms - 1), max_guests=bedrooms * 2 + 2,
+                has_wifi=rng.random() < 0.75, has_pool=rng.random() < (0.5 if property_type == 'lodge' else 0.15),
+                has_kitchen=rng.random() < 0.5, has_parking=rng.random() < 0.8, has_ac=rng.random() < 0.45,
+                instant_book=rng.random() < 0.3, is_available=rng.random() < 0.97,
+                created_at=created_at, updated_at=created_at,
+            )
+
+        for start in range(0, options['properties'], self.batch_size):
+            batch = [listing(i) for i in range(start, min(start + self.batch_size, options['properties']))]
+            Property.objects.bulk_create(batch)
+            properties.update((p.pk, (p.host_id, p.city, p.property_type, p.price_per_night)) for p in batch)
+        return properties
+
+    def room_types(self, properties):
+        """Returns [(id, property_id, price, capacity, total_rooms)]"""
+        rng, room_types = self.rng, []
+        for start in range(0, len(properties), self.batch_size):
+            batch = []
+            for property_id, (_, _, property_type, price) in itertools.islice(
+                    properties.items(), start, start + self.batch_size):
+                names = PROPERTY_TYPES[property_type][2]
+                for name in names if len(names) == 1 else rng.sample(names, rng.randint(2, len(names))):
+                    multiplier, capacity, (low, high) = ROOM_TYPES[name]
+                    batch.append(RoomType(property_id=property_id, name=name,
+                                          price_per_night=(price * Decimal(multiplier)).quantize(Decimal(10)),
+                                          capacity=capacity, total_rooms=rng.randint(low, high)))
+            RoomType.objects.bulk_create(batch)
+            room_types.extend((r.pk, r.property_id, r.price_per_night, r.capacity, r.total_rooms) for r in batch)
+        return room_types
+
+    def availability(self, options, properties, room_types):
+        rng = self.rng
+        nights = [self.today + timedelta(days=d) for d in range(options['days'])]
+        # Extra demand per night: weekends, and the December to New Year holidays
+        demand = [(0.15 if night.weekday() >= 4 else 0) + (0.2 if (night.month, night.day) >= (12, 15)
+                                                                 or (night.month, night.day) <= (1, 3) else 0)
+                  for night in nights]
+
+        def rows():
+            for room_type_id, property_id, price, _, total in room_types:
+                occupancy = CITY_OCCUPANCY[properties[property_id][1]]
+                for night, extra in zip(nights, demand):
+                    taken = occupancy + extra + rng.gauss(0, 0.15)
+                    override = None
+                    if extra and rng.random() < 0.6:
+                        override = (price * Decimal(1 + extra)).quantize(Decimal(10))
+                    yield Availability(room_type_id=room_type_id, date=night,
+                                       available_rooms=max(0, min(total, round(total * (1 - taken)))),
+                                       price_override=override)
+
+        return stream_create(Availability, rows(), self.batch_size)
+
+    def bookings(self, options, guests, properties, room_types):
+        rng = self.rng
+        nights_choice = Choice(STAY_NIGHTS)
+        method = Choice(PAYMENT_METHODS)
+        rating = Choice(RATINGS)
+        Participant = Conversation.participants.through
+        created = 0
+
+        def booking():
+            room_type_id, property_id, price, capacity, _ = rng.choice(room_types)
+            nights = nights_choice(rng)
+            check_in = self.today + timedelta(days=rng.randrange(-365, options['days'] - nights))
+            created_at = min(self.now - timedelta(minutes=rng.randrange(1, 600)),
+                             datetime.combine(check_in, datetime.min.time())
+                             - timedelta(days=rng.randrange(0, 90), minutes=rng.randrange(1440)))
+            if check_in + timedelta(days=nights) <= self.today:
+                status = 'completed' if rng.random() < 0.85 else 'cancelled'
+            else:
+                status = rng.choices(['confirmed', 'pending', 'cancelled'], [75, 12, 13])[0]
+            rooms = 1 if rng.random() < 0.9 else 2
+            return Booking(
+                property_id=property_id, room_type_id=room_type_id, rooms=rooms,
+                guest_id=rng.choice(guests), check_in=check_in, check_out=check_in + timedelta(days=nights),
+                guests=rng.randint(1, capacity * rooms), total_price=price * nights * rooms, status=status,
+                created_at=created_at, updated_at=created_at,
+            )
+
+        for start in range(0, options['bookings'], self.batch_size):
+            with transaction.atomic():
+                batch = [booking() for _ in range(min(self.batch_size, options['bookings'] - start))]
+                Booking.objects.bulk_create(batch)
+
+                payments, reviews, conversations, threads = [], [], [], []
+                for b in batch:
+                    paid_at = b.created_at + timedelta(minutes=rng.randrange(1, 30))
+                    status = {'completed': 'completed', 'confirmed': 'completed', 'pending': 'pending',
+                              'cancelled': 'refunded' if rng.random() < 0.7 else 'failed'}[b.status]
+                    payments.append(Payment(booking_id=b.pk, amount=b.total_price, status=status,
+                                            payment_method=method(rng), created_at=paid_at,
+                                            transaction_id=f"SYN-{options['seed']}-{b.pk}"))
+                    if b.status == 'completed' and rng.random() < 0.55:
+                        stars = rating(rng)
+                        reviews.append(Review(booking_id=b.pk, rating=stars,
+                                              comment=rng.choice(REVIEW_COMMENTS[stars]),
+                                              created_at=datetime.combine(b.check_out, datetime.min.time())
+                                              + timedelta(days=rng.randrange(0, 10), hours=rng.randrange(8, 22))))
+                    if rng.random() < options['conversation_share']:
+                        conversations.append(Conversation(created_at=b.created_at, updated_at=b.created_at))
+                        threads.append((b, properties[b.property_id][0]))
+                Payment.objects.bulk_create(payments)
+                Review.objects.bulk_create(reviews)
+                Conversation.objects.bulk_create(conversations)
+
+                participants, messages = [], []
+                for conversation, (b, host_id) in zip(conversations, threads):
+                    participants += [Participant(conversation_id=conversation.pk, user_id=b.guest_id),
+                                     Participant(conversation_id=conversation.pk, user_id=host_id)]
+                    sent_at = b.created_at
+                    count = rng.randint(1, options['max_messages'])
+                    for m in range(count):
+                        sent_at = min(self.now, sent_at + timedelta(minutes=rng.randrange(2, 6 * 60)))
+                        from_guest = m % 2 == 0
+                        messages.append(Message(
+                            conversation_id=conversation.pk, sender_id=b.guest_id if from_guest else host_id,
+                            content=rng.choice(GUEST_LINES if from_guest else HOST_LINES), created_at=sent_at,
+                            # Recent tail of a thread is often still unread
+                            is_read=m < count - 2 or rng.random() < 0.6,
+                        ))
+                    conversation.updated_at = sent_at
+                Participant.objects.bulk_create(participants)
+                Message.objects.bulk_create(messages, batch_size=self.batch_size)
+                Conversation.objects.bulk_update(conversations, ['updated_at'], batch_size=self.batch_size)
+            created += len(batch) + len(payments) + len(reviews) + len(conversations) + len(messages)
+        return created
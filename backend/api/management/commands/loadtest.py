@@ -0,0 +1,293 @@
+"""
+Scripted guest and host sessions against a local server.
+
+    python manage.py loadtest --users 16 --iterations 50 --output before.json
+    python manage.py loadtest --users 16 --iterations 50 --compare before.json
+
+Seeds a throwaway on-disk database (listings with room types and nightly
+availability, guest and host accounts with tokens), serves it with gunicorn
+or daphne, and runs --users virtual users at once. Each runs --iterations
+scenarios, picked and parameterised from its own seeded random generator,
+so a run is the same sequence of requests every time:
+
+    guest  search (a stay in a city; the results carry each listing's quote)
+           -> detail of a bookable result -> book it -> list own bookings
+    host   bulk-edit weekend rates on one listing's calendar
+           -> list bookings -> inbox
+
+Per step it reports throughput, p50/p95/p99 latency and the SQL queries the
+server ran (from the Server-Timing header, see Mwaiseni/instrumentation.py).
+--output saves the run, with the commit it was made on, as JSON, and
+--compare prints the change against such a file.
+
+The clients run in this process; compare runs made on the same machine.
+"""
+
+import http.client
+import json
+import random
+import re
+import subprocess
+import sys
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+
+from Mwaiseni.benchmarking import HOST, isolated_database, percentile, serve, summarize
+from properties.management.inventory import CITY_CENTRES, seed_inventory
+from users.models import RoomType, User
+
+QUERIES = re.compile(r'desc="(\d+) queries"')
+STAY_NIGHTS = (1, 2, 3, 5)
+CALENDAR_SPAN = 14
+# Host calendars edited by the scenarios; one host owns them all
+LISTINGS = 200
+
+
+class Session:
+    """One virtual user: a keep-alive connection, a token and its samples"""
+
+    def __init__(self, port, token):
+        self.port = port
+        self.headers = {'Authorization': f'Token {token}', 'Content-Type': 'application/json'}
+        self.conn = http.client.HTTPConnection(HOST, port, timeout=30)
+        self.record = True
+        # (step, seconds, queries or None, status or None)
+        self.samples = []
+
+    def request(self, step, method, path, body=None, expect=(200,)):
+        """Parsed JSON body, or None when the status is not in `expect`"""
+        started = time.perf_counter()
+        for retry in (True, False):
+            try:
+                self.conn.request(method, path, body=None if body is None else json.dumps(body),
+                                  headers=self.headers)
+                response = self.conn.getresponse()
+                payload = response.read()
+                status, timing = response.status, response.getheader('Server-Timing', '')
+                break
+            except (OSError, http.client.HTTPException) as e:
+                self.conn.close()
+                self.conn = http.client.HTTPConnection(HOST, self.port, timeout=30)
+                status, payload, timing = None, b'', ''
+                # The server dropped an idle keep-alive connection before reading the request
+                if not (retry and isinstance(e, (http.client.RemoteDisconnected, ConnectionResetError,
+                                                 BrokenPipeError))):
+                    break
+        elapsed = time.perf_counter() - started
+        if self.record:
+            queries = QUERIES.search(timing)
+            self.samples.append((step, elapsed, queries and int(queries.group(1)), status))
+        if status not in expect:
+            return None
+        return json.loads(payload) if payload else {}
+
+
+def guest(session, rng, fixture):
+    check_in = fixture['start'] + timedelta(days=rng.randrange(1, fixture['days'] - max(STAY_NIGHTS)))
+    stay = {'check_in': check_in.isoformat(),
+            'check_out': (check_in + timedelta(days=rng.choice(STAY_NIGHTS))).isoformat()}
+    found = session.request(
+        'search', 'GET', f"{reverse('property-search')}?{urlencode(dict(stay, city=rng.choice(fixture['cities'])))}",
+    )
+    bookable = [row for row in (found or {}).get('results', [])
+                if row['stay_quote'] and row['stay_quote']['room_type']]
+    if not bookable:
+        return
+    listing = rng.choice(bookable)
+    if session.request('detail', 'GET', reverse('property-detail', args=[listing['id']])) is None:
+        return
+    session.request('book', 'POST', reverse('booking-list'),
+                    dict(stay, room_type=listing['stay_quote']['room_type'], guests=1),
+                    expect=(201, 409))
+    session.request('my_bookings', 'GET', reverse('booking-list'))
+
+
+def host(session, rng, fixture):
+    property_id, room_types = rng.choice(fixture['listings'])
+    start = fixture['start'] + timedelta(days=rng.randrange(fixture['days'] - CALENDAR_SPAN))
+    rules = [
+        {'room_type': room_type, 'start': start.isoformat(),
+         'end': (start + timedelta(days=CALENDAR_SPAN - 1)).isoformat(),
+         'weekdays': ['fri', 'sat'], 'price_override': str(rng.choice([650, 700, 900]))}
+        for room_type in room_types
+    ]
+    session.request('calendar', 'POST', reverse('property-availability', args=[property_id]), {'rules': rules})
+    session.request('bookings', 'GET', reverse('booking-list'))
+    session.request('inbox', 'GET', reverse('conversation-list'))
+
+
+class Command(BaseCommand):
+    help = 'Run scripted guest and host scenarios against a local server and report per-step latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--properties', type=int, default=2000)
+        parser.add_argument('--days', type=int, default=60, help='Nights of availability per room type')
+        parser.add_argument('--users', type=int, default=16, help='Concurrent virtual users')
+        parser.add_argument('--iterations', type=int, default=50, help='Scenarios per virtual user')
+        parser.add_argument('--warmup', type=int, default=2, help='Unrecorded scenarios per virtual user')
+        parser.add_argument('--host-share', type=float, default=0.2, help='Fraction of scenarios run as a host')
+        parser.add_argument('--server', choices=['wsgi', 'asgi'], default='wsgi')
+        parser.add_argument('--workers', type=int, default=1, help='gunicorn workers (wsgi)')
+        parser.add_argument('--threads', type=int, default=8, help='gunicorn threads per worker (wsgi)')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help='Write the results to this JSON file')
+        parser.add_argument('--compare', help='JSON file of an earlier run to compare against')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Cannot read {options['compare']}: {e}")
+
+        with isolated_database(on_disk=True):
+            fixture = self.seed(options)
+            database = connection.settings_dict['NAME']
+            connection.close()
+            with serve(self.server_command(options), options['port'], database):
+                results = self.run(options, fixture)
+
+        self.report(results)
+        if baseline:
+            self.compare(baseline, results)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(f"Saved {options['output']}")
+
+    def server_command(self, options):
+        if options['server'] == 'asgi':
+            return [sys.executable, '-m', 'daphne', '-b', HOST, '-p', str(options['port']), 'Mwaiseni.asgi:application']
+        return [sys.executable, '-m', 'gunicorn', 'Mwaiseni.wsgi:application',
+                '--bind', f"{HOST}:{options['port']}", '--worker-class', 'gthread',
+                '--workers', str(options['workers']), '--threads', str(options['threads'])]
+
+    def seed(self, options):
+        start = date.today()
+        seed_inventory(options['properties'], options['days'], start, seed=options['seed'])
+        host_user = User.objects.get(email=f"bench-host-{options['seed']}@mwaiseni.test")
+        guests = User.objects.bulk_create(
+            User(email=f'loadtest-guest-{i}@mwaiseni.test', password='x', first_name='Guest', last_name=str(i))
+            for i in range(options['users'])
+        )
+        tokens = Token.objects.bulk_create(
+            Token(key=Token.generate_key(), user=user) for user in [host_user, *guests]
+        )
+        room_types = defaultdict(list)
+        for property_id, room_type in RoomType.objects.filter(property__host=host_user) \
+                .order_by('property_id', 'pk').values_list('property_id', 'pk')[:LISTINGS]:
+            room_types[property_id].append(room_type)
+        return {
+            'start': start,
+            'days': options['days'],
+            'cities': sorted(CITY_CENTRES),
+            'listings': sorted(room_types.items()),
+            'host_token': tokens[0].key,
+            'guest_tokens': [token.key for token in tokens[1:]],
+        }
+
+    def run(self, options, fixture):
+        def virtual_user(i):
+            rng = random.Random(f"{options['seed']}-{i}")
+            is_host = lambda: rng.random() < options['host_share']  # noqa: E731
+            sessions = {
+                guest: Session(options['port'], fixture['guest_tokens'][i]),
+                host: Session(options['port'], fixture['host_token']),
+            }
+            for n in range(options['warmup'] + options['iterations']):
+                scenario = host if is_host() else guest
+                sessions[scenario].record = n >= options['warmup']
+                scenario(sessions[scenario], rng, fixture)
+            for session in sessions.values():
+                session.conn.close()
+            return [sample for session in sessions.values() for sample in session.samples]
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['users']) as pool:
+            samples = [sample for run in pool.map(virtual_user, range(options['users'])) for sample in run]
+        elapsed = time.perf_counter() - started
+
+        steps = {}
+        for step in dict.fromkeys(step for step, *_ in samples):
+            rows = [row for row in samples if row[0] == step]
+            queries = [q for _, _, q, _ in rows if q is not None]
+            statuses = Counter(str(status) for _, _, _, status in rows)
+            steps[step] = {
+                'requests': len(rows),
+                'throughput': round(len(rows) / elapsed, 2),
+                'errors': sum(status is None or status >= 500 for _, _, _, status in rows),
+                'statuses': dict(sorted(statuses.items())),
+                **summarize([seconds for _, seconds, _, _ in rows]),
+                'queries_mean': round(sum(queries) / len(queries), 2) if queries else None,
+                'queries_p95': percentile(queries, 95) if queries else None,
+            }
+        return {
+            'commit': self.commit(),
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'options': {key: options[key] for key in (
+                'properties', 'days', 'users', 'iterations', 'warmup', 'host_share',
+                'server', 'workers', 'threads', 'seed')},
+            'elapsed_s': round(elapsed, 3),
+            'requests': len(samples),
+            'throughput': round(len(samples) / elapsed, 2),
+            'steps': steps,
+        }
+
+    def commit(self):
+        try:
+            return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                                  capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def report(self, results):
+        options = results['options']
+        self.stdout.write(
+            f"{options['server']}, {options['users']} users x {options['iterations']} scenarios, "
+            f"{options['properties']} properties: {results['requests']} requests in {results['elapsed_s']:.1f} s "
+            f"({results['throughput']:.1f} req/s)\n"
+        )
+        self.stdout.write(f"{'step':<12} {'requests':>8} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+                          f"{'queries':>8} {'errors':>7}  statuses")
+        for step, stats in results['steps'].items():
+            queries = '-' if stats['queries_mean'] is None else f"{stats['queries_mean']:.1f}"
+            statuses = ' '.join(f'{status}:{n}' for status, n in stats['statuses'].items())
+            self.stdout.write(
+                f"{step:<12} {stats['requests']:>8} {stats['throughput']:>8.1f} {stats['p50_ms']:>9.2f} "
+                f"{stats['p95_ms']:>9.2f} {stats['p99_ms']:>9.2f} {queries:>8} {stats['errors']:>7}  {statuses}"
+            )
+
+    def compare(self, baseline, results):
+        self.stdout.write(f"\nAgainst {baseline.get('commit') or 'baseline'} ({baseline.get('created_at')}):")
+        if baseline.get('options') != results['options']:
+            self.stdout.write(self.style.WARNING('Options differ between the runs; deltas may not be meaningful'))
+
+        def change(old, new):
+            if old in (None, 0) or new is None:
+                return '-'
+            return f'{(new - old) / old * 100:+.0f}%'
+
+        self.stdout.write(f"{'step':<12} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'queries':>8}")
+        for step, stats in results['steps'].items():
+            old = baseline.get('steps', {}).get(step)
+            if old is None:
+                self.stdout.write(f'{step:<12} (new step)')
+                continue
+            self.stdout.write(
+                f"{step:<12} {change(old['throughput'], stats['throughput']):>8} "
+                f"{change(old['p50_ms'], stats['p50_ms']):>8} {change(old['p95_ms'], stats['p95_ms']):>8} "
+                f"{change(old['p99_ms'], stats['p99_ms']):>8} "
+                f"{change(old['queries_mean'], stats['queries_mean']):>8}"
+            )
@@ -1,3 +1,95 @@
-from django.test import TestCase
+import uuid
+from datetime import date, datetime
+from decimal import Decimal
+from io import BytesIO, StringIO
 
-# Create your tests here.
+from django.core.management import CommandError, call_command
+from django.db.models import Count, F, Sum
+from django.test import SimpleTestCase, TestCase
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from Mwaiseni.fastjson import UJSONParser, UJSONRenderer
+
+from properties.models import Property
+from users.models import Availability, Booking, Conversation, ConversationUnread, Message, Payment, Review, RoomType, User
+
+
+class GenerateDataTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('generate_data', users=40, hosts=4, properties=12, days=7, bookings=150,
+                     conversation_share=0.5, batch_size=50, force=True, stdout=StringIO())
+
+    def test_row_counts(self):
+        self.assertEqual(User.objects.count(), 44)
+        self.assertEqual(Property.objects.count(), 12)
+        self.assertEqual(Availability.objects.count(), RoomType.objects.count() * 7)
+        self.assertEqual(Booking.objects.count(), 150)
+        self.assertEqual(Payment.objects.count(), 150)
+
+    def test_related_rows_are_consistent(self):
+        self.assertFalse(Review.objects.exclude(booking__status='completed').exists())
+        self.assertFalse(Availability.objects.filter(available_rooms__gt=F('room_type__total_rooms')).exists())
+        participants = Conversation.objects.annotate(n=Count('participants')).values_list('n', flat=True)
+        self.assertTrue(participants)
+        self.assertEqual(set(participants), {2})
+        for conversation in Conversation.objects.all():
+            self.assertEqual(conversation.updated_at, conversation.messages.order_by('-id').first().created_at)
+
+    def test_denormalised_counters_rebuilt(self):
+        rated = Property.objects.filter(review_count__gt=0)
+        self.assertEqual(sum(rated.values_list('review_count', flat=True)), Review.objects.count())
+        unread = Message.objects.filter(is_read=False).count()
+        self.assertEqual(ConversationUnread.objects.aggregate(total=Sum('unread'))['total'], unread)
+        self.assertEqual(User.objects.aggregate(total=Sum('unread_messages'))['total'], unread)
+
+    def test_refuses_to_reuse_a_seed(self):
+        with self.assertRaisesMessage(CommandError, 'already exists'):
+            call_command('generate_data', users=1, hosts=1, properties=1, days=1, bookings=1, force=True,
+                         stdout=StringIO())
+
+
+class FastJSONTests(SimpleTestCase):
+
+    def parse(self, body, parser=JSONParser):
+        return parser().parse(BytesIO(body))
+
+    def test_renders_what_the_stdlib_renderer_renders(self):
+        data = [{
+            'id': uuid.UUID('2f1c1e7e-8d43-4d4a-9a43-0d0a4c3b4a11'), 'price': Decimal('850.50'),
+            'created_at': datetime(2026, 3, 1, 14, 30, 5, 123000), 'check_in': date(2026, 3, 2),
+            'title': 'Zambezi Lodge \u2028 \u00e9 </script>', 'rooms': (1, 2), 'rating': 4.25, 'host': None,
+        }]
+        body = UJSONRenderer().render(data)
+        self.assertEqual(self.parse(body), self.parse(JSONRenderer().render(data)))
+        self.assertNotIn('\u2028'.encode(), body)
+
+    def test_indent_from_accept_header(self):
+        body = UJSONRenderer().render({'a': [1]}, 'application/json; indent=2')
+        self.assertEqual(body, b'{\n  "a": [\n    1\n  ]\n}')
+        self.assertEqual(UJSONRenderer().render({'a': [1]}), b'{"a":[1]}')
+
+    def test_strict_json(self):
+        with self.assertRaises(ValueError):
+            UJSONRenderer().render({'price': float('nan')})
+        with self.assertRaises(ParseError):
+            self.parse(b'{"price": NaN}', UJSONParser)
+        self.assertEqual(self.parse(b'{"note": "NaN is fine in a string"}', UJSONParser),
+                         {'note': 'NaN is fine in a string'})
+
+    def test_numbers_ujson_cannot_encode(self):
+        # Integers past 64 bits are valid JSON; the stdlib renders them too
+        data = {'big': 2 ** 70, 'small': -2 ** 70}
+        self.assertEqual(UJSONRenderer().render(data), JSONRenderer().render(data))
+        # Out of float range: the stdlib renderer's error, not ujson's
+        with self.assertRaisesMessage(ValueError, 'Out of range float values are not JSON compliant'):
+            UJSONRenderer().render({'price': Decimal('1e400')})
+
+    def test_parses(self):
+        self.assertEqual(self.parse('{"city": "Lusaka", "guests": 2, "é": [1.5, null]}'.encode(), UJSONParser),
+                         {'city': 'Lusaka', 'guests': 2, 'é': [1.5, None]})
+        with self.assertRaises(ParseError):
+            self.parse(b'{"city": ', UJSONParser)
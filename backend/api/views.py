@@ -1,15 +1,20 @@
 from rest_framework import generics
+from Mwaiseni.pagination import KeysetPagination
 from .models import Property, Booking
 from .serializers import PropertySerializer, BookingSerializer
 
 class PropertyList(generics.ListCreateAPIView):
-    queryset = Property.objects.all()
+    # Ordered for keyset pagination: (-created_at, -id)
+    queryset = Property.objects.order_by('-created_at')
     serializer_class = PropertySerializer
+    pagination_class = KeysetPagination
 
 class PropertyDetail(generics.RetrieveUpdateDestroyAPIView):
     queryset = Property.objects.all()
     serializer_class = PropertySerializer
 
 class BookingList(generics.ListCreateAPIView):
-    queryset = Booking.objects.all()
+    # Ordered for keyset pagination: (-check_in, -id)
+    queryset = Booking.objects.order_by('-check_in')
     serializer_class = BookingSerializer
+    pagination_class = KeysetPagination
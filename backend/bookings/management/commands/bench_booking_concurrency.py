@@ -0,0 +1,124 @@
+"""
+Flash-sale harness: hundreds of guests booking the same room type at once.
+
+    python manage.py bench_booking_concurrency --requests 500 --workers 32 --inventory 40
+
+Every request goes through the full API stack (BookingViewSet) on its own
+thread and database connection. Afterwards the inventory is audited: no
+night may end below zero rooms or have more rooms booked than it started
+with, and the number of successful bookings must match what was sold.
+"""
+
+import logging
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Min, Sum
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from Mwaiseni.benchmarking import format_stats, isolated_database, summarize
+from properties.models import Property
+from users.models import Availability, Booking, RoomType, User
+
+
+class Command(BaseCommand):
+    help = 'Fire parallel booking requests at one room type and check for oversells'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--workers', type=int, default=32)
+        parser.add_argument('--inventory', type=int, default=40, help='Rooms per night')
+        parser.add_argument('--nights', type=int, default=3)
+        parser.add_argument('--max-rooms', type=int, default=2, help='Rooms per booking, 1..N')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        # Hundreds of expected 409s would otherwise be logged as warnings
+        logging.getLogger('django.request').setLevel(logging.ERROR)
+        with isolated_database(on_disk=True):
+            room_type, check_in, check_out = self.seed(options)
+            guests = list(User.objects.filter(email__startswith='guest-').order_by('email'))
+            payloads = [
+                (guests[i], {'room_type': room_type.pk, 'check_in': check_in.isoformat(),
+                             'check_out': check_out.isoformat(), 'rooms': rng.randint(1, options['max_rooms'])})
+                for i in range(options['requests'])
+            ]
+
+            local = threading.local()
+            url = reverse('booking-list')
+
+            def book(payload):
+                guest, data = payload
+                if not hasattr(local, 'client'):
+                    local.client = APIClient()
+                local.client.force_authenticate(guest)
+                start = time.perf_counter()
+                response = local.client.post(url, data, format='json')
+                return response.status_code, time.perf_counter() - start
+
+            def close_connection(_):
+                connection.close()
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+                results = list(pool.map(book, payloads))
+                # Each worker thread opened its own connection
+                list(pool.map(close_connection, range(options['workers'])))
+            elapsed = time.perf_counter() - started
+
+            self.report(results, elapsed, options)
+            self.audit(room_type, options)
+
+    def seed(self, options):
+        host = User.objects.create_user(email='bench-host@mwaiseni.test', password=None)
+        prop = Property.objects.create(
+            host=host, title='Flash Sale Lodge', description='Bench', property_type='lodge',
+            address='1 Cairo Road', city='lusaka', price_per_night=500,
+            bedrooms=1, bathrooms=1, max_guests=2,
+        )
+        room_type = RoomType.objects.create(property=prop, name='Double', price_per_night=500,
+                                            capacity=2, total_rooms=options['inventory'])
+        check_in = date.today() + timedelta(days=7)
+        check_out = check_in + timedelta(days=options['nights'])
+        Availability.objects.bulk_create(
+            Availability(room_type=room_type, date=check_in + timedelta(days=d),
+                         available_rooms=options['inventory'])
+            for d in range(options['nights'])
+        )
+        password = make_password(None)
+        User.objects.bulk_create(
+            User(email=f'guest-{i:06d}@mwaiseni.test', password=password)
+            for i in range(options['requests'])
+        )
+        return room_type, check_in, check_out
+
+    def report(self, results, elapsed, options):
+        statuses = Counter(code for code, _ in results)
+        self.stdout.write(f"{options['requests']} requests, {options['workers']} workers, "
+                          f"{options['inventory']} rooms x {options['nights']} nights")
+        self.stdout.write(f'  throughput: {len(results) / elapsed:.1f} req/s over {elapsed:.2f}s')
+        self.stdout.write(format_stats('  latency', summarize([seconds for _, seconds in results])))
+        self.stdout.write('  responses: ' + ', '.join(f'{code} x{n}' for code, n in sorted(statuses.items())))
+
+    def audit(self, room_type, options):
+        inventory = options['inventory']
+        confirmed = Booking.objects.filter(room_type=room_type, status='confirmed')
+        rooms_sold = confirmed.aggregate(rooms=Sum('rooms'))['rooms'] or 0
+        lowest = room_type.availabilities.aggregate(low=Min('available_rooms'))['low']
+        remaining = set(room_type.availabilities.values_list('available_rooms', flat=True))
+
+        oversold = max(0, rooms_sold - inventory) + max(0, -lowest)
+        self.stdout.write(f'  bookings: {confirmed.count()} confirmed, {rooms_sold} of {inventory} rooms sold, '
+                          f'{lowest} left on the fullest night')
+        self.stdout.write(f'  oversold: {oversold}')
+        if oversold or remaining != {inventory - rooms_sold}:
+            raise CommandError('Inventory does not add up: rooms were oversold or lost')
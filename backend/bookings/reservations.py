@@ -0,0 +1,82 @@
+"""
+Overbooking-safe booking creation and cancellation.
+
+A booking takes `rooms` rooms out of Availability for every night of the
+stay with one conditional UPDATE:
+
+    UPDATE users_availability SET available_rooms = available_rooms - :rooms
+    WHERE room_type_id = :id AND date >= :check_in AND date < :check_out
+      AND available_rooms >= :rooms
+
+If fewer rows than nights were updated, some night is sold out (or has no
+inventory row) and the transaction rolls back, so a stay is either fully
+reserved or not at all. The check and the decrement are the same statement,
+so two guests racing for the last room can't both win: the database
+serializes the row updates and the loser's WHERE no longer matches.
+
+On databases with row locks the nights are first locked in date order, so
+two overlapping multi-night bookings can't deadlock on each other.
+"""
+
+from django.db import connection, transaction
+from django.db.models import F
+
+from properties import calendar, pricing
+from users.models import Availability, Booking
+
+
+class BookingUnavailable(Exception):
+    """Not enough rooms left on at least one night of the stay"""
+
+
+def _nights(room_type_id, check_in, check_out):
+    return Availability.objects.filter(room_type_id=room_type_id, date__gte=check_in, date__lt=check_out)
+
+
+def reserve(guest, room_type, check_in, check_out, guests=1, rooms=1):
+    """Create a confirmed Booking, taking inventory for every night atomically.
+
+    Raises BookingUnavailable when any night lacks `rooms` free rooms.
+    """
+    nights = (check_out - check_in).days
+    with transaction.atomic():
+        if connection.features.has_select_for_update:
+            list(_nights(room_type.pk, check_in, check_out).order_by('date')
+                 .select_for_update().values_list('pk', flat=True))
+
+        taken = _nights(room_type.pk, check_in, check_out).filter(
+            available_rooms__gte=rooms
+        ).update(available_rooms=F('available_rooms') - rooms)
+        if taken != nights:
+            raise BookingUnavailable('Not enough rooms available for the selected dates')
+
+        nightly_total = pricing.room_type_nightly_total(room_type.pk, check_in, check_out)
+        booking = Booking.objects.create(
+            property_id=room_type.property_id, room_type=room_type, rooms=rooms,
+            guest=guest, check_in=check_in, check_out=check_out, guests=guests,
+            total_price=pricing.stay_total(nightly_total, room_type.property.cleaning_fee, rooms),
+            status='confirmed',
+        )
+        calendar.invalidate_on_commit([room_type.pk])
+    return booking
+
+
+def cancel(booking):
+    """Cancel a pending or confirmed booking and give its rooms back.
+
+    Returns False if the booking was already cancelled or completed.
+    """
+    with transaction.atomic():
+        # The status flip is the guard: only one concurrent cancel returns inventory
+        cancelled = Booking.objects.filter(
+            pk=booking.pk, status__in=['pending', 'confirmed']
+        ).update(status='cancelled')
+        if not cancelled:
+            return False
+        if booking.room_type_id:
+            _nights(booking.room_type_id, booking.check_in, booking.check_out).update(
+                available_rooms=F('available_rooms') + booking.rooms
+            )
+            calendar.invalidate_on_commit([booking.room_type_id])
+    booking.status = 'cancelled'
+    return True
@@ -1,7 +1,38 @@
+from datetime import date
+
 from rest_framework import serializers
-from .models import Booking
+
+from properties.availability import MAX_STAY_NIGHTS
+from users.models import Booking, RoomType
+
 
 class BookingSerializer(serializers.ModelSerializer):
+    """Booking as returned to the guest"""
+
     class Meta:
         model = Booking
-        fields = '__all__'
+        fields = ['id', 'property', 'room_type', 'rooms', 'check_in', 'check_out',
+                  'guests', 'total_price', 'status', 'created_at']
+        read_only_fields = fields
+
+
+class BookingCreateSerializer(serializers.Serializer):
+    """Validates a booking request; inventory is taken by reservations.reserve()"""
+
+    room_type = serializers.PrimaryKeyRelatedField(queryset=RoomType.objects.select_related('property'))
+    check_in = serializers.DateField()
+    check_out = serializers.DateField()
+    guests = serializers.IntegerField(min_value=1, default=1)
+    rooms = serializers.IntegerField(min_value=1, max_value=20, default=1)
+
+    def validate(self, attrs):
+        nights = (attrs['check_out'] - attrs['check_in']).days
+        if attrs['check_in'] < date.today():
+            raise serializers.ValidationError({'check_in': 'check_in cannot be in the past'})
+        if nights <= 0:
+            raise serializers.ValidationError({'check_out': 'check_out must be after check_in'})
+        if nights > MAX_STAY_NIGHTS:
+            raise serializers.ValidationError({'check_out': f'Stays are limited to {MAX_STAY_NIGHTS} nights'})
+        if attrs['guests'] > attrs['room_type'].capacity * attrs['rooms']:
+            raise serializers.ValidationError({'guests': 'Too many guests for the selected rooms'})
+        return attrs
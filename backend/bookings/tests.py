@@ -1,3 +1,80 @@
-from django.test import TestCase
+from datetime import date, timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from properties.tests import make_property
+from users.models import Availability, Booking, RoomType, User
+
+
+class BookingCreationTests(APITestCase):
+    """Bookings take inventory for every night or not at all"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create_user(email='host@mwaiseni.test', password=None)
+        cls.guest = User.objects.create_user(email='guest@mwaiseni.test', password=None)
+        prop = make_property(cls.host, cleaning_fee=100)
+        cls.room_type = RoomType.objects.create(property=prop, name='Double', price_per_night=500,
+                                                capacity=2, total_rooms=2)
+        cls.check_in = date.today() + timedelta(days=7)
+        Availability.objects.bulk_create(
+            Availability(room_type=cls.room_type, date=cls.check_in + timedelta(days=d), available_rooms=2,
+                         price_override=650 if d == 1 else None)
+            for d in range(3)
+        )
+
+    def setUp(self):
+        self.client.force_authenticate(self.guest)
+
+    def book(self, nights=3, **kwargs):
+        data = {'room_type': self.room_type.pk, 'check_in': self.check_in.isoformat(),
+                'check_out': (self.check_in + timedelta(days=nights)).isoformat()}
+        data.update(kwargs)
+        return self.client.post(reverse('booking-list'), data, format='json')
+
+    def free_rooms(self):
+        return list(self.room_type.availabilities.order_by('date').values_list('available_rooms', flat=True))
+
+    def test_booking_takes_a_room_every_night(self):
+        response = self.book()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['status'], 'confirmed')
+        self.assertEqual(Decimal(response.data['total_price']), Decimal('500') + 650 + 500 + 100)
+        self.assertEqual(self.free_rooms(), [1, 1, 1])
+
+    def test_sold_out_night_rejects_the_whole_stay(self):
+        Availability.objects.filter(room_type=self.room_type, date=self.check_in + timedelta(days=2)) \
+            .update(available_rooms=0)
+        response = self.book()
+        self.assertEqual(response.status_code, 409)
+        self.assertIn('error', response.data)
+        self.assertEqual(self.free_rooms(), [2, 2, 0])
+        self.assertFalse(Booking.objects.exists())
+
+    def test_last_rooms_cannot_be_oversold(self):
+        self.assertEqual(self.book(rooms=2, guests=3).status_code, 201)
+        self.assertEqual(self.book().status_code, 409)
+        self.assertEqual(self.free_rooms(), [0, 0, 0])
+
+    def test_nights_without_inventory_are_unavailable(self):
+        self.assertEqual(self.book(nights=4).status_code, 409)
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.book(nights=0).status_code, 400)
+        self.assertEqual(self.book(guests=5).status_code, 400)
+        self.assertEqual(self.book(check_in='2000-01-01').status_code, 400)
+
+    def test_cancel_releases_rooms(self):
+        booking_id = self.book().data['id']
+        url = reverse('booking-cancel', args=[booking_id])
+        self.assertEqual(self.client.post(url).status_code, 200)
+        self.assertEqual(self.free_rooms(), [2, 2, 2])
+        self.assertEqual(self.client.post(url).status_code, 400)
+        self.assertEqual(self.free_rooms(), [2, 2, 2])
+
+    def test_guests_only_see_their_own_bookings(self):
+        self.book()
+        self.client.force_authenticate(self.host)
+        self.assertEqual(self.client.get(reverse('booking-list')).data['results'], [])
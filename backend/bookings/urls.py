@@ -3,7 +3,7 @@ from rest_framework.routers import DefaultRouter
 from . import views
 
 router = DefaultRouter()
-# router.register(r'bookings', views.BookingViewSet) # Uncomment when ViewSet exists
+router.register(r'bookings', views.BookingViewSet, basename='booking')
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -1,3 +1,43 @@
-from django.shortcuts import render
+from rest_framework import mixins, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
 
-# Create your views here.
+from Mwaiseni.instrumentation import SerializerTimingMixin
+from Mwaiseni.pagination import KeysetPagination
+from users.models import Booking
+
+from . import reservations
+from .serializers import BookingCreateSerializer, BookingSerializer
+
+
+class BookingViewSet(SerializerTimingMixin,
+                     mixins.CreateModelMixin,
+                     mixins.ListModelMixin,
+                     mixins.RetrieveModelMixin,
+                     viewsets.GenericViewSet):
+    """The signed-in guest's bookings"""
+    permission_classes = [IsAuthenticated]
+    serializer_class = BookingSerializer
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        return Booking.objects.filter(guest=self.request.user).order_by('-created_at', '-id')
+
+    def create(self, request, *args, **kwargs):
+        serializer = BookingCreateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            booking = reservations.reserve(request.user, **serializer.validated_data)
+        except reservations.BookingUnavailable as e:
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
+        return Response(BookingSerializer(booking).data, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['post'])
+    def cancel(self, request, pk=None):
+        """Cancel the booking and release its rooms"""
+        booking = self.get_object()
+        if not reservations.cancel(booking):
+            return Response({'error': f'Booking is already {booking.status}'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response(BookingSerializer(booking).data)
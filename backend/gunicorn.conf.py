@@ -0,0 +1,24 @@
+"""
+Gunicorn settings, read automatically when gunicorn starts in backend/.
+
+With PROMETHEUS_MULTIPROC_DIR set, workers keep their Prometheus counters
+in files in that directory (see Mwaiseni/metrics.py). The directory is
+emptied when the master starts, and a dead worker's live gauges are
+removed when it exits.
+"""
+
+import os
+import shutil
+
+
+def on_starting(server):
+    path = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path, exist_ok=True)
+
+
+def child_exit(server, worker):
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -1,9 +1,3 @@
 from django.contrib import admin
-from .models import Message
 
-@admin.register(Message)
-class MessageAdmin(admin.ModelAdmin):
-    list_display = ['id', 'sender', 'recipient', 'subject', 'timestamp', 'is_read']
-    list_filter = ['is_read', 'timestamp']
-    search_fields = ['sender__email', 'recipient__email', 'subject']
-    readonly_fields = ['timestamp']
+# Conversation and Message live in the users app and are registered in users/admin.py
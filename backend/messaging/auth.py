@@ -0,0 +1,41 @@
+"""
+Token authentication for WebSocket connections.
+
+Sockets authenticate with the same DRF token, and the same cached lookup
+(users/authentication.py), as the REST API. Browsers
+can't set headers on a WebSocket handshake, so the key may be sent as
+?token=<key>; other clients can use the usual "Authorization: Token <key>".
+"""
+
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.contrib.auth.models import AnonymousUser
+
+from users.authentication import get_token
+
+
+def scope_token(scope):
+    for name, value in scope.get('headers', []):
+        if name == b'authorization':
+            keyword, _, key = value.decode('latin1').partition(' ')
+            if keyword.lower() == 'token' and key.strip():
+                return key.strip()
+    query = parse_qs(scope.get('query_string', b'').decode('latin1'))
+    return query.get('token', [None])[0]
+
+
+@database_sync_to_async
+def user_for_token(key):
+    token = get_token(key)
+    return token.user if token is not None and token.user.is_active else AnonymousUser()
+
+
+class TokenAuthMiddleware(BaseMiddleware):
+    """Sets scope['user'] from the connection's token"""
+
+    async def __call__(self, scope, receive, send):
+        key = scope_token(scope)
+        scope['user'] = await user_for_token(key) if key else AnonymousUser()
+        return await super().__call__(scope, receive, send)
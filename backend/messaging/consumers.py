@@ -0,0 +1,110 @@
+"""
+Live conversation sockets: ws/conversations/<id>/?token=<key>
+
+Clients send JSON frames:
+
+    {"type": "message", "content": "..."}     post a message
+    {"type": "typing", "is_typing": true}      typing indicator
+    {"type": "read", "up_to": <message id>}    read receipt
+
+and receive:
+
+    {"type": "message", "message": {...}}      a new message, the sender's own included
+    {"type": "typing", "user": id, "is_typing": bool}
+    {"type": "read", "user": id, "up_to": id}
+    {"type": "error", "error": "..."}          only to the socket that sent a bad frame
+
+New messages are pushed from the Message post_save handler (signals.py), so
+messages created outside the socket reach connected participants too.
+"""
+
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from django.db import transaction
+
+from users.models import Conversation, Message
+
+from . import realtime, unread
+from .serializers import MessageSerializer
+
+
+@database_sync_to_async
+def is_participant(user_id, conversation_id):
+    return Conversation.participants.through.objects.filter(
+        conversation_id=conversation_id, user_id=user_id,
+    ).exists()
+
+
+@database_sync_to_async
+def create_message(conversation_id, sender, content):
+    # The post_save handlers update counters and recency in the same transaction
+    with transaction.atomic():
+        return Message.objects.create(conversation_id=conversation_id, sender=sender, content=content)
+
+
+@database_sync_to_async
+def mark_read(conversation_id, reader, up_to):
+    return unread.mark_read(reader, conversation_id, up_to)
+
+
+class ConversationConsumer(AsyncJsonWebsocketConsumer):
+    group = None
+
+    async def connect(self):
+        self.user = self.scope['user']
+        self.conversation_id = self.scope['url_route']['kwargs']['conversation_id']
+        if not self.user.is_authenticated or not await is_participant(self.user.pk, self.conversation_id):
+            await self.close()
+            return
+        self.group = realtime.group_name(self.conversation_id)
+        await self.channel_layer.group_add(self.group, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, code):
+        if self.group:
+            await self.channel_layer.group_discard(self.group, self.channel_name)
+
+    async def receive_json(self, content, **kwargs):
+        handlers = {'message': self.post_message, 'typing': self.post_typing, 'read': self.post_read}
+        handler = handlers.get(content.get('type')) if isinstance(content, dict) else None
+        if handler is None:
+            await self.send_json({'type': 'error', 'error': 'Unknown frame type'})
+            return
+        await handler(content)
+
+    # -- frames from this client ------------------------------------------
+
+    async def post_message(self, content):
+        serializer = MessageSerializer(data={'content': content.get('content')})
+        if not serializer.is_valid():
+            await self.send_json({'type': 'error', 'error': serializer.errors})
+            return
+        # Delivered to the group, this socket included, by the post_save handler
+        await create_message(self.conversation_id, self.user, serializer.validated_data['content'])
+
+    async def post_typing(self, content):
+        await self.channel_layer.group_send(self.group, {
+            'type': 'typing.event', 'user': str(self.user.pk), 'is_typing': bool(content.get('is_typing')),
+        })
+
+    async def post_read(self, content):
+        up_to = content.get('up_to')
+        if not isinstance(up_to, int) or isinstance(up_to, bool):
+            await self.send_json({'type': 'error', 'error': 'up_to must be a message id'})
+            return
+        if await mark_read(self.conversation_id, self.user, up_to):
+            await self.channel_layer.group_send(self.group, {
+                'type': 'read.event', 'user': str(self.user.pk), 'up_to': up_to,
+            })
+
+    # -- group events -----------------------------------------------------
+
+    async def message_event(self, event):
+        await self.send_json({'type': 'message', 'message': event['message']})
+
+    async def typing_event(self, event):
+        if event['user'] != str(self.user.pk):
+            await self.send_json({'type': 'typing', 'user': event['user'], 'is_typing': event['is_typing']})
+
+    async def read_event(self, event):
+        await self.send_json({'type': 'read', 'user': event['user'], 'up_to': event['up_to']})
@@ -0,0 +1,48 @@
+"""
+The conversation inbox in one query.
+
+Each of a user's conversations comes back with its newest message (a
+preview of the content, when it was sent, the sender's id and name) and the
+user's unread count as correlated subquery annotations on Conversation.
+The newest message is a seek on the message_conversation_latest index, the
+unread count a seek on ConversationUnread's (user, conversation) key, so the
+query costs the same per row whether a conversation holds ten messages or
+ten thousand. Rows are ordered by updated_at, which the Message post_save
+handler moves to the latest message, and paged by KeysetPagination, so
+page 50 of a large inbox is no slower than page 1 and nothing is COUNTed.
+"""
+
+from django.db.models import CharField, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Concat, Substr
+
+from users.models import Conversation, ConversationUnread, Message
+
+PREVIEW_LENGTH = 140
+
+ORDERING = ['-updated_at', '-id']
+
+
+def inbox(user):
+    """The user's conversations, most recent first, annotated with last_message_*
+    columns (None when a conversation has no messages) and `unread`"""
+    latest = Message.objects.filter(conversation=OuterRef('pk')).order_by('-id')
+
+    def last(expression, output_field=None):
+        expression = F(expression) if isinstance(expression, str) else expression
+        return Subquery(latest.values(value=expression)[:1], output_field=output_field)
+
+    unread = ConversationUnread.objects.filter(conversation=OuterRef('pk'), user=user).values('unread')[:1]
+    return (
+        Conversation.objects.filter(participants=user)
+        .annotate(
+            last_message_id=last('id'),
+            last_message_preview=last(Substr('content', 1, PREVIEW_LENGTH), CharField()),
+            last_message_created_at=last('created_at'),
+            last_message_sender_id=last('sender_id'),
+            last_message_sender_name=last(
+                Concat('sender__first_name', Value(' '), 'sender__last_name', output_field=CharField()),
+            ),
+            unread=Coalesce(Subquery(unread, output_field=IntegerField()), 0),
+        )
+        .order_by(*ORDERING)
+    )
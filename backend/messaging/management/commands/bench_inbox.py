@@ -0,0 +1,114 @@
+"""
+Inbox cost for a user with thousands of conversations.
+
+    python manage.py bench_inbox --conversations 5000 --messages 5
+
+Times GET /api/messaging/conversations/ (the one-query inbox) on its first
+page and deep into the inbox, next to the naive version of the same page:
+list the conversations, then per conversation fetch the latest message, its
+sender and the unread count (1 + 3N queries).
+"""
+
+import random
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from messaging.inbox import ORDERING
+from Mwaiseni.benchmarking import count_queries, format_stats, isolated_database, measure
+from users.models import Conversation, ConversationUnread, Message, User
+
+BATCH_SIZE = 2000
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the single-query conversation inbox against per-conversation queries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--conversations', type=int, default=5000)
+        parser.add_argument('--messages', type=int, default=5, help='Messages per conversation')
+        parser.add_argument('--page-size', type=int, default=20)
+        parser.add_argument('--depth', type=int, default=100, help='Page number for the deep-page timing')
+        parser.add_argument('--repeat', type=int, default=30)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        with isolated_database():
+            user = self.seed(options)
+            client = APIClient()
+            client.force_authenticate(user)
+            first = f"{reverse('conversation-list')}?page_size={options['page_size']}"
+            deep = first
+            for _ in range(options['depth'] - 1):
+                deep = client.get(deep).data['next'] or deep
+
+            def inbox(url):
+                response = client.get(url)
+                assert response.status_code == 200, response.status_code
+                return response
+
+            def naive():
+                rows = []
+                page = Conversation.objects.filter(participants=user).order_by(*ORDERING)[:options['page_size']]
+                for conversation in page:
+                    message = conversation.messages.order_by('-id').first()
+                    sender = User.objects.get(pk=message.sender_id) if message else None
+                    rows.append({
+                        'id': conversation.pk,
+                        'last_message': message and message.content[:140],
+                        'sender_name': sender and sender.full_name,
+                        'unread': conversation.messages.filter(is_read=False).exclude(sender=user).count(),
+                    })
+                return rows
+
+            self.stdout.write(f"{options['conversations']} conversations x {options['messages']} messages, "
+                              f"page size {options['page_size']}\n")
+            for label, fn in [
+                ('inbox, page 1', lambda: inbox(first)),
+                (f"inbox, page {options['depth']}", lambda: inbox(deep)),
+                ('naive, page 1', naive),
+            ]:
+                with count_queries() as queries:
+                    fn()
+                self.stdout.write(format_stats(f'{label} ({len(queries)} queries)', measure(fn, options['repeat'])))
+
+    def seed(self, options):
+        rng = random.Random(options['seed'])
+        n = options['conversations']
+        password = make_password(None)
+        user = User.objects.create_user(email='bench-guest@mwaiseni.test', password=None,
+                                        first_name='Bench', last_name='Guest')
+        hosts = User.objects.bulk_create(
+            [User(email=f'bench-host-{i}@mwaiseni.test', password=password, first_name='Host', last_name=str(i))
+             for i in range(n)],
+            batch_size=BATCH_SIZE,
+        )
+        conversations = Conversation.objects.bulk_create([Conversation() for _ in range(n)], batch_size=BATCH_SIZE)
+        now = timezone.now()
+        for conversation in conversations:
+            conversation.updated_at = now - timedelta(minutes=rng.randint(0, 60 * 24 * 365))
+        Conversation.objects.bulk_update(conversations, ['updated_at'], batch_size=BATCH_SIZE)
+
+        Participant = Conversation.participants.through
+        Participant.objects.bulk_create(
+            [Participant(conversation=c, user=u) for c, host in zip(conversations, hosts) for u in (user, host)],
+            batch_size=BATCH_SIZE,
+        )
+        messages, counters = [], []
+        for conversation, host in zip(conversations, hosts):
+            unread = 0
+            for m in range(options['messages']):
+                from_host = rng.random() < 0.5
+                is_read = m < options['messages'] - 2 or not from_host
+                unread += from_host and not is_read
+                messages.append(Message(conversation=conversation, sender=host if from_host else user,
+                                        content=f'Message {m} about the stay ' * 8, is_read=is_read))
+            counters.append(ConversationUnread(user=user, conversation=conversation, unread=unread))
+        Message.objects.bulk_create(messages, batch_size=BATCH_SIZE)
+        ConversationUnread.objects.bulk_create(counters, batch_size=BATCH_SIZE)
+        User.objects.filter(pk=user.pk).update(unread_messages=sum(c.unread for c in counters))
+        return user
@@ -0,0 +1,23 @@
+"""
+Recompute ConversationUnread counters and User.unread_messages from messages.
+
+    python manage.py rebuild_unread
+
+Use it after importing messages or to repair counters after manual edits.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from messaging import unread
+
+
+class Command(BaseCommand):
+    help = 'Rebuild denormalised unread-message counters from Message.is_read'
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        users = unread.rebuild()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt unread counters for {users} users in {elapsed:.2f}s'))
@@ -0,0 +1,21 @@
+"""
+Channel layer plumbing for live conversations.
+
+Every open conversation socket joins the group of its conversation; events
+sent to the group reach all participants' sockets, in whichever process
+they are connected (the Redis channel layer in production).
+"""
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+
+def group_name(conversation_id):
+    return f'conversation.{conversation_id}'
+
+
+def broadcast(conversation_id, event):
+    """group_send() for sync code, e.g. signal handlers"""
+    layer = get_channel_layer()
+    if layer is not None:
+        async_to_sync(layer.group_send)(group_name(conversation_id), event)
@@ -0,0 +1,7 @@
+from django.urls import path
+
+from . import consumers
+
+websocket_urlpatterns = [
+    path('ws/conversations/<int:conversation_id>/', consumers.ConversationConsumer.as_asgi()),
+]
@@ -1,7 +1,33 @@
 from rest_framework import serializers
-from .models import Message
+from users.models import Conversation, Message
+
 
 class MessageSerializer(serializers.ModelSerializer):
+    # A plain string, so the payload can travel over the channel layer as is
+    sender = serializers.PrimaryKeyRelatedField(read_only=True, pk_field=serializers.UUIDField())
+
     class Meta:
         model = Message
-        fields = '__all__'
+        fields = ['id', 'conversation', 'sender', 'content', 'is_read', 'created_at']
+        read_only_fields = ['conversation', 'sender', 'is_read', 'created_at']
+
+
+class InboxSerializer(serializers.ModelSerializer):
+    """A conversation row of messaging.inbox.inbox()"""
+    last_message = serializers.SerializerMethodField()
+    unread = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Conversation
+        fields = ['id', 'updated_at', 'last_message', 'unread']
+
+    def get_last_message(self, obj):
+        if obj.last_message_id is None:
+            return None
+        return {
+            'id': obj.last_message_id,
+            'preview': obj.last_message_preview,
+            'created_at': serializers.DateTimeField().to_representation(obj.last_message_created_at),
+            'sender': str(obj.last_message_sender_id),
+            'sender_name': obj.last_message_sender_name.strip(),
+        }
@@ -0,0 +1,36 @@
+"""
+Signal handlers for the messaging app.
+
+Connected in MessagingConfig.ready().
+"""
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from users.models import Conversation, Message
+
+from . import realtime, unread
+from .serializers import MessageSerializer
+
+
+@receiver(post_save, sender=Message)
+def push_new_message(sender, instance, created, **kwargs):
+    if not created:
+        return
+    # Conversation.updated_at orders the inbox
+    Conversation.objects.filter(pk=instance.conversation_id).update(updated_at=instance.created_at)
+    unread.message_created(instance)
+    event = {'type': 'message.event', 'message': dict(MessageSerializer(instance).data)}
+    # After commit, so a client never receives a message it can't fetch yet
+    transaction.on_commit(lambda: realtime.broadcast(instance.conversation_id, event))
+
+
+@receiver(post_delete, sender=Message)
+def uncount_deleted_message(sender, instance, **kwargs):
+    unread.message_deleted(instance)
+
+
+@receiver(pre_delete, sender=Conversation)
+def uncount_deleted_conversation(sender, instance, **kwargs):
+    unread.conversation_deleted(instance)
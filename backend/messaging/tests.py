@@ -1,3 +1,224 @@
-from django.test import TestCase
+from io import StringIO
 
-# Create your tests here.
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.core.management import call_command
+from django.db import connection
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+
+from Mwaiseni.testing import QueryBudgetTestCase
+from users.models import Conversation, ConversationUnread, Message, User
+
+from . import unread
+from .auth import TokenAuthMiddleware
+from .routing import websocket_urlpatterns
+
+application = TokenAuthMiddleware(URLRouter(websocket_urlpatterns))
+
+
+class ConversationSocketTests(TransactionTestCase):
+    # Real commits: new messages are pushed from transaction.on_commit()
+
+    def setUp(self):
+        self.guest = User.objects.create_user(email='guest@mwaiseni.test', password=None)
+        self.host = User.objects.create_user(email='host@mwaiseni.test', password=None)
+        self.outsider = User.objects.create_user(email='outsider@mwaiseni.test', password=None)
+        self.conversation = Conversation.objects.create()
+        self.conversation.participants.add(self.guest, self.host)
+
+    async def connect(self, user, conversation=None):
+        key = (await Token.objects.aget_or_create(user=user))[0].key if user else ''
+        conversation_id = (conversation or self.conversation).pk
+        communicator = WebsocketCommunicator(application, f'/ws/conversations/{conversation_id}/?token={key}')
+        connected, _ = await communicator.connect()
+        return communicator, connected
+
+    async def test_rejects_anonymous_and_outsiders(self):
+        for user in (None, self.outsider):
+            communicator, connected = await self.connect(user)
+            self.assertFalse(connected)
+
+    async def test_message_reaches_every_participant(self):
+        guest, _ = await self.connect(self.guest)
+        host, _ = await self.connect(self.host)
+        await guest.send_json_to({'type': 'message', 'content': 'Is early check-in possible?'})
+
+        for communicator in (guest, host):
+            frame = await communicator.receive_json_from()
+            self.assertEqual(frame['type'], 'message')
+            self.assertEqual(frame['message']['content'], 'Is early check-in possible?')
+            self.assertEqual(frame['message']['sender'], str(self.guest.pk))
+        self.assertEqual(await Message.objects.filter(conversation=self.conversation).acount(), 1)
+        await guest.disconnect()
+        await host.disconnect()
+
+    async def test_typing_and_read_receipts(self):
+        message = await Message.objects.acreate(conversation=self.conversation, sender=self.host, content='Yes')
+        guest, _ = await self.connect(self.guest)
+        host, _ = await self.connect(self.host)
+
+        await guest.send_json_to({'type': 'typing', 'is_typing': True})
+        self.assertEqual(await host.receive_json_from(),
+                         {'type': 'typing', 'user': str(self.guest.pk), 'is_typing': True})
+        # The typist doesn't get their own indicator back
+        self.assertTrue(await guest.receive_nothing())
+
+        await guest.send_json_to({'type': 'read', 'up_to': message.pk})
+        receipt = {'type': 'read', 'user': str(self.guest.pk), 'up_to': message.pk}
+        self.assertEqual(await host.receive_json_from(), receipt)
+        self.assertEqual(await guest.receive_json_from(), receipt)
+        await message.arefresh_from_db()
+        self.assertTrue(message.is_read)
+        await guest.disconnect()
+        await host.disconnect()
+
+    async def test_bad_frames_get_an_error(self):
+        guest, _ = await self.connect(self.guest)
+        for frame in ({'type': 'shout'}, {'type': 'message', 'content': ''}, {'type': 'read', 'up_to': 'all'}):
+            await guest.send_json_to(frame)
+            self.assertEqual((await guest.receive_json_from())['type'], 'error')
+        await guest.disconnect()
+
+
+class UnreadCounterTests(QueryBudgetTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.guest = User.objects.create_user(email='guest@mwaiseni.test', password=None)
+        cls.host = User.objects.create_user(email='host@mwaiseni.test', password=None)
+        cls.conversations = []
+        for _ in range(2):
+            conversation = Conversation.objects.create()
+            conversation.participants.add(cls.guest, cls.host)
+            cls.conversations.append(conversation)
+
+    def setUp(self):
+        self.client.force_authenticate(self.guest)
+
+    def send(self, conversation, sender, n=1):
+        return [Message.objects.create(conversation=conversation, sender=sender, content='Hi') for _ in range(n)]
+
+    def counters(self, user, nonzero=False):
+        user.refresh_from_db()
+        counters = ConversationUnread.objects.filter(user=user)
+        if nonzero:
+            counters = counters.filter(unread__gt=0)
+        return user.unread_messages, dict(counters.values_list('conversation_id', 'unread'))
+
+    def test_new_messages_count_for_recipients_only(self):
+        self.send(self.conversations[0], self.host, 2)
+        self.send(self.conversations[1], self.host)
+        self.send(self.conversations[1], self.guest)
+        first, second = (c.pk for c in self.conversations)
+        self.assertEqual(self.counters(self.guest), (3, {first: 2, second: 1}))
+        self.assertEqual(self.counters(self.host), (1, {second: 1}))
+
+    def test_total_is_one_row_read(self):
+        self.send(self.conversations[0], self.host, 3)
+        response = self.assertQueryBudget(1, reverse('conversation-unread'))
+        self.assertEqual(response.data, {'total': 3})
+
+    def test_mark_read_flips_messages_and_resets_counters(self):
+        self.send(self.conversations[0], self.host, 2)
+        self.send(self.conversations[1], self.host)
+        mine = self.send(self.conversations[0], self.guest)[0]
+
+        response = self.client.post(reverse('conversation-read', args=[self.conversations[0].pk]))
+        self.assertEqual(response.data, {'marked_read': 2, 'total': 1})
+        self.assertEqual(self.counters(self.guest), (1, {self.conversations[0].pk: 0, self.conversations[1].pk: 1}))
+        self.assertEqual(Message.objects.filter(conversation=self.conversations[0], is_read=False).get(), mine)
+
+    def test_partial_read_and_deletes(self):
+        messages = self.send(self.conversations[0], self.host, 3)
+        unread.mark_read(self.guest, self.conversations[0].pk, up_to=messages[0].pk)
+        self.assertEqual(self.counters(self.guest)[0], 2)
+        messages[1].delete()
+        self.assertEqual(self.counters(self.guest)[0], 1)
+        self.send(self.conversations[1], self.host)
+        self.conversations[0].delete()
+        self.assertEqual(self.counters(self.guest), (1, {self.conversations[1].pk: 1}))
+
+    def test_mark_read_locks_the_counter_before_flipping(self):
+        self.send(self.conversations[0], self.host, 2)
+        with CaptureQueriesContext(connection) as queries:
+            unread.mark_read(self.guest, self.conversations[0].pk)
+        statements = [q['sql'] for q in queries.captured_queries if 'SAVEPOINT' not in q['sql']]
+        self.assertIn('users_conversationunread', statements[0])
+        self.assertTrue(statements[1].startswith('UPDATE "users_message"'))
+
+    def test_mark_read_clears_only_what_it_flipped(self):
+        self.send(self.conversations[0], self.host, 2)
+        # A message counted by a request that hasn't flipped anything yet
+        unread._add(self.conversations[0].pk, [self.guest.pk], 1)
+        self.assertEqual(unread.mark_read(self.guest, self.conversations[0].pk), 2)
+        self.assertEqual(self.counters(self.guest), (1, {self.conversations[0].pk: 1}))
+
+    def test_outsiders_cannot_mark_read(self):
+        outsider = User.objects.create_user(email='outsider@mwaiseni.test', password=None)
+        self.client.force_authenticate(outsider)
+        response = self.client.post(reverse('conversation-read', args=[self.conversations[0].pk]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_rebuild_matches_maintained_counters(self):
+        self.send(self.conversations[0], self.host, 2)
+        self.send(self.conversations[1], self.guest, 3)
+        expected = [self.counters(user, nonzero=True) for user in (self.guest, self.host)]
+        ConversationUnread.objects.update(unread=7)
+        User.objects.update(unread_messages=0)
+        call_command('rebuild_unread', stdout=StringIO())
+        self.assertEqual([self.counters(user, nonzero=True) for user in (self.guest, self.host)], expected)
+
+
+class InboxTests(QueryBudgetTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.guest = User.objects.create_user(email='guest@mwaiseni.test', password=None,
+                                             first_name='Chanda', last_name='Mwale')
+        cls.hosts = [User.objects.create_user(email=f'host{i}@mwaiseni.test', password=None,
+                                              first_name='Host', last_name=str(i)) for i in range(25)]
+        cls.conversations = []
+        for host in cls.hosts:
+            conversation = Conversation.objects.create()
+            conversation.participants.add(cls.guest, host)
+            cls.conversations.append(conversation)
+        # Oldest first, so conversation 24 is the most recent
+        for i, (conversation, host) in enumerate(zip(cls.conversations, cls.hosts)):
+            Message.objects.create(conversation=conversation, sender=cls.guest, content='Hello')
+            for _ in range(i % 3):
+                Message.objects.create(conversation=conversation, sender=host, content=f'Reply from {i} ' * 20)
+
+    def setUp(self):
+        self.client.force_authenticate(self.guest)
+
+    def test_inbox_is_one_query(self):
+        response = self.assertQueryBudget(1, reverse('conversation-list'), data={'page_size': 20})
+        rows = response.data['results']
+        self.assertEqual([row['id'] for row in rows], [c.pk for c in reversed(self.conversations)][:20])
+
+        # Conversation 24 has no replies, 23 has two
+        self.assertEqual((rows[0]['unread'], rows[0]['last_message']['sender_name']), (0, 'Chanda Mwale'))
+        self.assertEqual(rows[1]['unread'], 2)
+        self.assertEqual(rows[1]['last_message']['sender_name'], 'Host 23')
+        self.assertEqual(rows[1]['last_message']['preview'], ('Reply from 23 ' * 20)[:140])
+
+    def test_new_message_moves_conversation_to_the_top(self):
+        oldest = self.conversations[0]
+        Message.objects.create(conversation=oldest, sender=self.hosts[0], content='Still available?')
+        first = self.client.get(reverse('conversation-list')).data['results'][0]
+        self.assertEqual(first['id'], oldest.pk)
+        self.assertEqual(first['last_message']['preview'], 'Still available?')
+
+    def test_pages_cover_the_inbox_once(self):
+        empty = Conversation.objects.create()
+        empty.participants.add(self.guest)
+        seen, url = [], reverse('conversation-list') + '?page_size=7'
+        while url:
+            page = self.assertQueryBudget(1, url).data
+            seen += [row['id'] for row in page['results']]
+            url = page['next']
+        self.assertCountEqual(seen, [c.pk for c in self.conversations] + [empty.pk])
+        self.assertEqual(len(seen), len(set(seen)))
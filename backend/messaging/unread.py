@@ -0,0 +1,130 @@
+"""
+Denormalised unread-message counters for inbox badges.
+
+Every (participant, conversation) pair has a ConversationUnread row and
+every user an unread_messages total. A new message adds one to both for
+each participant other than the sender; marking a conversation read flips
+is_read with one UPDATE and takes the cleared amount off both. All changes
+are F() expressions, so concurrent messages and reads are never lost, and a
+badge is one primary-key read of User.unread_messages.
+
+rebuild() recomputes every counter from Message.is_read, for backfills and
+repairs (see the rebuild_unread command).
+"""
+
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from users.models import Conversation, ConversationUnread, Message, User
+
+BATCH_SIZE = 2000
+
+
+def _recipients(conversation_id, sender_id):
+    return list(
+        Conversation.participants.through.objects
+        .filter(conversation_id=conversation_id).exclude(user_id=sender_id)
+        .values_list('user_id', flat=True)
+    )
+
+
+def _add(conversation_id, user_ids, delta):
+    ConversationUnread.objects.filter(conversation_id=conversation_id, user_id__in=user_ids) \
+        .update(unread=F('unread') + delta)
+    User.objects.filter(pk__in=user_ids).update(unread_messages=F('unread_messages') + delta)
+
+
+def message_created(message):
+    """Count a new message as unread for everyone but its sender"""
+    recipients = _recipients(message.conversation_id, message.sender_id)
+    if not recipients:
+        return
+    with transaction.atomic():
+        ConversationUnread.objects.bulk_create(
+            [ConversationUnread(user_id=user_id, conversation_id=message.conversation_id)
+             for user_id in recipients],
+            ignore_conflicts=True,
+        )
+        _add(message.conversation_id, recipients, 1)
+
+
+def message_deleted(message):
+    """Stop counting a deleted unread message"""
+    if message.is_read:
+        return
+    with transaction.atomic():
+        counted = list(
+            ConversationUnread.objects
+            .filter(conversation_id=message.conversation_id, unread__gt=0)
+            .exclude(user_id=message.sender_id).values_list('user_id', flat=True)
+        )
+        if counted:
+            _add(message.conversation_id, counted, -1)
+
+
+def conversation_deleted(conversation):
+    """Take a conversation's counters off the users' totals before it goes"""
+    with transaction.atomic():
+        for user_id, unread in ConversationUnread.objects.filter(
+            conversation=conversation, unread__gt=0,
+        ).values_list('user_id', 'unread'):
+            User.objects.filter(pk=user_id).update(unread_messages=F('unread_messages') - unread)
+        # Zeroed so the cascading Message deletes don't subtract them again
+        ConversationUnread.objects.filter(conversation=conversation).update(unread=0)
+
+
+def mark_read(user, conversation_id, up_to=None):
+    """Mark the other participants' messages read, all of them or those with
+    pk <= up_to, and clear them from user's counters. Returns how many
+    messages were flipped."""
+    messages = Message.objects.filter(conversation_id=conversation_id, is_read=False).exclude(sender=user)
+    if up_to is not None:
+        messages = messages.filter(pk__lte=up_to)
+    with transaction.atomic():
+        # Lock the counter before flipping: a message counted after the flip
+        # but before the read would otherwise be cleared without being read
+        counter = (
+            ConversationUnread.objects.select_for_update()
+            .filter(user=user, conversation_id=conversation_id)
+            .values_list('unread', flat=True).first()
+        ) or 0
+        flipped = messages.update(is_read=True)
+        # Never below zero, should the counter have drifted
+        cleared = min(flipped, counter)
+        if cleared:
+            _add(conversation_id, [user.pk], -cleared)
+    return flipped
+
+
+def total_unread(user_id):
+    """Unread messages across all of a user's conversations: one row by primary key"""
+    return User.objects.filter(pk=user_id).values_list('unread_messages', flat=True).first() or 0
+
+
+def rebuild():
+    """Recompute every counter from Message.is_read"""
+    Participant = Conversation.participants.through
+
+    unread = (
+        Message.objects.filter(conversation_id=OuterRef('conversation_id'), is_read=False)
+        .exclude(sender_id=OuterRef('user_id'))
+        .order_by().values('conversation_id').annotate(n=Count('*')).values('n')
+    )
+    pairs = Participant.objects.annotate(
+        unread=Coalesce(Subquery(unread, output_field=IntegerField()), 0),
+    ).values_list('user_id', 'conversation_id', 'unread')
+    totals = (
+        ConversationUnread.objects.filter(user_id=OuterRef('pk'))
+        .order_by().values('user_id').annotate(total=Sum('unread')).values('total')
+    )
+    with transaction.atomic():
+        ConversationUnread.objects.all().delete()
+        ConversationUnread.objects.bulk_create(
+            (ConversationUnread(user_id=user_id, conversation_id=conversation_id, unread=n)
+             for user_id, conversation_id, n in pairs.iterator()),
+            batch_size=BATCH_SIZE,
+        )
+        return User.objects.update(
+            unread_messages=Coalesce(Subquery(totals, output_field=IntegerField()), 0),
+        )
@@ -3,7 +3,7 @@ from rest_framework.routers import DefaultRouter
 from . import views
 
 router = DefaultRouter()
-# router.register(r'messages', views.MessageViewSet)
+router.register(r'conversations', views.ConversationViewSet, basename='conversation')
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -1,3 +1,36 @@
-from django.shortcuts import render
+from rest_framework import mixins, viewsets
+from rest_framework.decorators import action
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
 
-# Create your views here.
+from Mwaiseni.instrumentation import SerializerTimingMixin
+from Mwaiseni.pagination import KeysetPagination
+from users.models import Conversation
+
+from . import unread
+from .inbox import inbox
+from .serializers import InboxSerializer
+
+
+class ConversationViewSet(SerializerTimingMixin, mixins.ListModelMixin, viewsets.GenericViewSet):
+    """The signed-in user's conversations; list is the inbox"""
+    permission_classes = [IsAuthenticated]
+    serializer_class = InboxSerializer
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        if self.action == 'list':
+            return inbox(self.request.user)
+        return Conversation.objects.filter(participants=self.request.user)
+
+    @action(detail=False, methods=['get'])
+    def unread(self, request):
+        """Unread badge: total unread messages across all conversations"""
+        return Response({'total': unread.total_unread(request.user.pk)})
+
+    @action(detail=True, methods=['post'])
+    def read(self, request, pk=None):
+        """Mark every message of this conversation read for the current user"""
+        conversation = self.get_object()
+        marked = unread.mark_read(request.user, conversation.pk)
+        return Response({'marked_read': marked, 'total': unread.total_unread(request.user.pk)})
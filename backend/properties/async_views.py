@@ -0,0 +1,77 @@
+"""
+Async views for the read-heavy property endpoints, served under ASGI.
+
+With ASYNC_VIEWS on (Mwaiseni/asgi.py turns it on) GET and HEAD requests to
+the property list, search, detail and featured routes are handled here
+instead of by the router. Each request still drives a PropertyViewSet, so
+filtering, keyset pagination, serializers, conditional GET and error bodies
+are the same as under WSGI, but rows are fetched with the async ORM and the
+featured cache goes through the async cache helpers, so a request waiting
+on the database or cache parks a coroutine rather than a worker thread.
+That holds only while every middleware in settings.MIDDLEWARE is
+async-capable (WhiteNoise goes through Mwaiseni/static_files.py): one
+sync-only middleware makes Django run the whole chain in a thread.
+
+Authentication and permission checks run through sync_to_async because the
+authentication classes are synchronous. Other methods (create, update,
+delete) are passed to the regular viewset. Responses are always rendered as
+JSON, by the first JSON renderer in DEFAULT_RENDERER_CLASSES.
+"""
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from .views import PropertyViewSet
+
+SAFE_METHODS = ('GET', 'HEAD')
+
+
+def json_renderer():
+    return next((renderer for renderer in api_settings.DEFAULT_RENDERER_CLASSES if renderer.format == 'json'),
+                JSONRenderer)
+
+
+def _rendered(response):
+    # Django renders template responses through sync_to_async(); hand it
+    # plain bytes instead so the response never leaves the event loop
+    if not isinstance(response, Response):
+        return response
+    response.render()
+    return HttpResponse(response.content, status=response.status_code, headers=response.headers)
+
+
+def async_view(action, handler, actions):
+    """Async view running `handler` of a PropertyViewSet for GET and HEAD,
+    and the sync `actions` map of the viewset for every other method"""
+    sync_view = sync_to_async(PropertyViewSet.as_view(actions))
+
+    async def view(request, *args, **kwargs):
+        if request.method not in SAFE_METHODS:
+            return await sync_view(request, *args, **kwargs)
+
+        viewset = PropertyViewSet(action_map={'get': action, 'head': action}, args=args, kwargs=kwargs,
+                                  renderer_classes=[json_renderer()])
+        viewset.request = viewset.initialize_request(request, *args, **kwargs)
+        viewset.headers = viewset.default_response_headers
+        try:
+            await sync_to_async(viewset.initial)(viewset.request, *args, **kwargs)
+            response = await getattr(viewset, handler)(viewset.request, *args, **kwargs)
+        except Exception as exc:
+            response = viewset.handle_exception(exc)
+        return _rendered(viewset.finalize_response(viewset.request, response, *args, **kwargs))
+
+    # Django 4.2's csrf_exempt() can't wrap coroutine functions; unsafe
+    # methods go through the DRF view, which does its own CSRF checks
+    view.csrf_exempt = True
+    return view
+
+
+property_list = async_view('list', 'alist', {'get': 'list', 'post': 'create'})
+property_search = async_view('search', 'asearch', {'get': 'search'})
+property_featured = async_view('featured', 'afeatured', {'get': 'featured'})
+property_detail = async_view('retrieve', 'aretrieve', {
+    'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy',
+})
@@ -0,0 +1,82 @@
+"""
+Stay availability queries for Mwaiseni properties.
+
+A property is bookable for a stay when at least one of its room types can
+hold the party and has a free room on every night from check-in up to (but
+not including) check-out. Everything is expressed as one SQL statement so the
+database does the work, not a Python loop over properties.
+"""
+
+from datetime import date
+
+from django.db.models import Count, Exists, IntegerField, OuterRef, Subquery
+
+from users.models import Availability, RoomType
+
+# Guests can't search further out than this many nights in one stay
+MAX_STAY_NIGHTS = 90
+
+
+class StaySearchError(ValueError):
+    """Raised when check-in / check-out / guests parameters are unusable"""
+
+
+def parse_stay(params):
+    """Read check_in, check_out and guests from query params.
+
+    Returns None when no dates were given, otherwise a (check_in, check_out, guests)
+    tuple. Raises StaySearchError for malformed or impossible values.
+    """
+    check_in = params.get('check_in')
+    check_out = params.get('check_out')
+    if not check_in and not check_out:
+        return None
+    if not (check_in and check_out):
+        raise StaySearchError('Both check_in and check_out are required')
+
+    try:
+        check_in = date.fromisoformat(check_in)
+        check_out = date.fromisoformat(check_out)
+    except ValueError:
+        raise StaySearchError('Dates must be in YYYY-MM-DD format')
+
+    try:
+        guests = int(params.get('guests') or 1)
+    except ValueError:
+        raise StaySearchError('guests must be a whole number')
+
+    nights = (check_out - check_in).days
+    if nights <= 0:
+        raise StaySearchError('check_out must be after check_in')
+    if nights > MAX_STAY_NIGHTS:
+        raise StaySearchError(f'Stays are limited to {MAX_STAY_NIGHTS} nights')
+    if guests < 1:
+        raise StaySearchError('guests must be at least 1')
+
+    return check_in, check_out, guests
+
+
+def free_room_types(check_in, check_out, guests=1):
+    """RoomType queryset that can host `guests` on every night of the stay"""
+    nights = (check_out - check_in).days
+    free_nights = (
+        Availability.objects
+        .filter(room_type=OuterRef('pk'), date__gte=check_in, date__lt=check_out,
+                available_rooms__gt=0)
+        .order_by()
+        .values('room_type')
+        .annotate(n=Count('*'))
+        .values('n')
+    )
+    return (
+        RoomType.objects
+        .filter(capacity__gte=guests)
+        .annotate(free_nights=Subquery(free_nights, output_field=IntegerField()))
+        .filter(free_nights=nights)
+    )
+
+
+def filter_available(queryset, check_in, check_out, guests=1):
+    """Narrow a Property queryset to listings bookable for the whole stay"""
+    rooms = free_room_types(check_in, check_out, guests).filter(property=OuterRef('pk'))
+    return queryset.filter(Exists(rooms))
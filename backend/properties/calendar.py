@@ -0,0 +1,193 @@
+"""
+Compact per-RoomType availability calendars.
+
+A calendar is two packed arrays indexed by epoch day (days since 1970-01-01,
+offset from the calendar's first day): rooms left per night and the nightly
+price override in ngwee (-1 when the room type's base price applies), wide
+enough for any value the Availability columns hold. A year of one room type
+is about 4 KB, so range checks and "first free window" lookups become array
+slices instead of SQL range scans.
+
+Calendars live in the Django cache. Every write that moves inventory
+(Availability saves and deletes, bookings, bulk upserts) drops the affected
+calendars once its transaction commits, and the next read reloads them, so a
+reader never re-caches inventory that is about to change. They serve the
+read side: GET /properties/<id>/availability/ answers from them, while
+booking creation still checks and takes inventory in the database
+(bookings/reservations.py).
+"""
+
+from array import array
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import transaction
+
+from users.models import Availability
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+CALENDAR_DAYS = 366
+# However far out a stay asks, never load more than this per room type
+MAX_CALENDAR_DAYS = 2 * CALENDAR_DAYS
+CALENDAR_TTL = 60 * 60
+NO_OVERRIDE = -1
+# available_rooms is an IntegerField; price_override, a DecimalField with
+# max_digits=10, reaches 9,999,999,999 ngwee, past a 32-bit int
+ROOMS_TYPECODE = 'i'
+PRICES_TYPECODE = 'q'
+
+
+def epoch_day(day):
+    """Days since 1970-01-01"""
+    return day.toordinal() - EPOCH_ORDINAL
+
+
+def from_epoch_day(n):
+    return date.fromordinal(n + EPOCH_ORDINAL)
+
+
+def cache_key(room_type_id):
+    # v2: 32-bit rooms and 64-bit prices; v1 pickles packed them as 16/32 bits
+    return f'availability-calendar:v2:{room_type_id}'
+
+
+class RoomCalendar:
+    """Packed nightly inventory and price overrides for one RoomType"""
+
+    __slots__ = ('room_type_id', 'start', 'rooms', 'prices')
+
+    def __init__(self, room_type_id, start, days):
+        self.room_type_id = room_type_id
+        self.start = start
+        self.rooms = array(ROOMS_TYPECODE, [0]) * days
+        self.prices = array(PRICES_TYPECODE, [NO_OVERRIDE]) * days
+
+    def __getstate__(self):
+        return (self.room_type_id, self.start, self.rooms.tobytes(), self.prices.tobytes())
+
+    def __setstate__(self, state):
+        self.room_type_id, self.start, rooms, prices = state
+        self.rooms = array(ROOMS_TYPECODE)
+        self.rooms.frombytes(rooms)
+        self.prices = array(PRICES_TYPECODE)
+        self.prices.frombytes(prices)
+
+    @property
+    def end(self):
+        """First epoch day past the calendar"""
+        return self.start + len(self.rooms)
+
+    @property
+    def nbytes(self):
+        return self.rooms.itemsize * len(self.rooms) + self.prices.itemsize * len(self.prices)
+
+    def covers(self, check_in, check_out):
+        return self.start <= epoch_day(check_in) and epoch_day(check_out) <= self.end
+
+    def _slice(self, check_in, check_out):
+        return slice(epoch_day(check_in) - self.start, epoch_day(check_out) - self.start)
+
+    def set_night(self, day, available_rooms, price_override=None):
+        """Patch one night in place; days outside the calendar are ignored"""
+        i = epoch_day(day) - self.start
+        if 0 <= i < len(self.rooms):
+            self.rooms[i] = available_rooms
+            self.prices[i] = NO_OVERRIDE if price_override is None else int(price_override * 100)
+
+    def is_free(self, check_in, check_out, rooms=1):
+        """True when every night in [check_in, check_out) has `rooms` left;
+        nights outside the calendar are not bookable"""
+        if not self.covers(check_in, check_out):
+            return False
+        nights = self.rooms[self._slice(check_in, check_out)]
+        return len(nights) > 0 and min(nights) >= rooms
+
+    def first_free_window(self, nights, after=None, rooms=1):
+        """Earliest check-in date on/after `after` with `nights` free nights in a row"""
+        i = max(0, epoch_day(after) - self.start) if after else 0
+        run = 0
+        for j in range(i, len(self.rooms)):
+            run = run + 1 if self.rooms[j] >= rooms else 0
+            if run == nights:
+                return from_epoch_day(self.start + j - nights + 1)
+        return None
+
+    def nightly_prices(self, check_in, check_out):
+        """Price override per night as Decimal, or None where the base rate applies"""
+        return [
+            None if ngwee == NO_OVERRIDE else Decimal(ngwee) / 100
+            for ngwee in self.prices[self._slice(check_in, check_out)]
+        ]
+
+
+def load_calendar(room_type_id, start=None, days=CALENDAR_DAYS):
+    """Build a calendar from one range query over Availability"""
+    start = start or date.today()
+    calendar = RoomCalendar(room_type_id, epoch_day(start), days)
+    rows = Availability.objects.filter(
+        room_type_id=room_type_id, date__gte=start, date__lt=start + timedelta(days=days),
+    ).values_list('date', 'available_rooms', 'price_override')
+    for day, available_rooms, price_override in rows:
+        calendar.set_night(day, available_rooms, price_override)
+    return calendar
+
+
+def get_calendar(room_type_id, check_in=None, check_out=None):
+    """Cached calendar for a room type, reloaded when it doesn't cover the
+    stay. At most MAX_CALENDAR_DAYS are loaded, so a stay further out is
+    left uncovered (and not free) rather than loaded night by night"""
+    key = cache_key(room_type_id)
+    calendar = cache.get(key)
+    if calendar is not None and (check_in is None or calendar.covers(check_in, check_out)):
+        return calendar
+
+    start = date.today()
+    if check_in is not None:
+        start = min(start, check_in)
+        days = min(max(CALENDAR_DAYS, (check_out - start).days), MAX_CALENDAR_DAYS)
+    else:
+        days = CALENDAR_DAYS
+    calendar = load_calendar(room_type_id, start, days)
+    cache.set(key, calendar, CALENDAR_TTL)
+    return calendar
+
+
+def is_room_type_free(room_type_id, check_in, check_out, rooms=1):
+    return get_calendar(room_type_id, check_in, check_out).is_free(check_in, check_out, rooms)
+
+
+def room_type_availability(room_types, check_in, check_out, guests=1):
+    """For each RoomType: whether it can host `guests` on every night of the
+    stay, the first check-in on or after check_in with as many free nights in
+    a row, and the nightly rates (override, else the room type's price)"""
+    nights = (check_out - check_in).days
+    result = []
+    for room_type in room_types:
+        calendar = get_calendar(room_type.pk, check_in, check_out)
+        fits = room_type.capacity >= guests
+        covered = calendar.covers(check_in, check_out)
+        result.append({
+            'room_type': room_type.pk,
+            'name': room_type.name,
+            'capacity': room_type.capacity,
+            'free': fits and calendar.is_free(check_in, check_out),
+            'first_free_check_in': calendar.first_free_window(nights, after=check_in) if fits else None,
+            'nightly_rates': [
+                room_type.price_per_night if price is None else price
+                for price in calendar.nightly_prices(check_in, check_out)
+            ] if covered else [],
+        })
+    return result
+
+
+def invalidate(room_type_ids):
+    cache.delete_many([cache_key(pk) for pk in room_type_ids])
+
+
+def invalidate_on_commit(room_type_ids):
+    """Drop the calendars once the current transaction commits (at once
+    outside one); dropping earlier would let a concurrent reader cache the
+    inventory the transaction is about to change"""
+    room_type_ids = list(room_type_ids)
+    transaction.on_commit(lambda: invalidate(room_type_ids))
@@ -0,0 +1,93 @@
+"""
+Facet counts for the property search page.
+
+Every facet value is one conditional aggregate, COUNT(*) FILTER (WHERE ...),
+over the already-filtered search queryset, so the whole facets block costs a
+single scan of the matching rows no matter how many facets there are.
+Counts describe the current filter set: picking a city narrows the
+property_type and amenity counts too.
+
+Search ETags don't fold in the facets themselves, which would cost the
+whole aggregate on every revalidation, but their version: the matching
+rows' count and latest updated_at. Any change that can move a count
+changes one of the two, and the facets query returns both for free.
+"""
+
+from django.db.models import Count, Max, Q
+
+from .models import Property
+
+AMENITIES = ['has_wifi', 'has_pool', 'has_parking', 'has_ac', 'has_kitchen']
+
+# (min, max) price_per_night in ZMW; max is exclusive, None is open-ended
+PRICE_BUCKETS = [(0, 500), (500, 1000), (1000, 2000), (2000, None)]
+
+VERSION_AGGREGATES = {'total': Count('pk'), 'last_modified': Max('updated_at')}
+
+
+def _bucket_condition(low, high):
+    condition = Q(price_per_night__gte=low)
+    if high is not None:
+        condition &= Q(price_per_night__lt=high)
+    return condition
+
+
+def facet_aggregates():
+    """{alias: aggregate} for every facet value"""
+    aggregates = dict(VERSION_AGGREGATES)
+    for value, _ in Property.ZAMBIAN_CITIES:
+        aggregates[f'city__{value}'] = Count('pk', filter=Q(city=value))
+    for value, _ in Property.PROPERTY_TYPES:
+        aggregates[f'property_type__{value}'] = Count('pk', filter=Q(property_type=value))
+    for amenity in AMENITIES:
+        aggregates[f'amenity__{amenity}'] = Count('pk', filter=Q(**{amenity: True}))
+    for n, (low, high) in enumerate(PRICE_BUCKETS):
+        aggregates[f'price__{n}'] = Count('pk', filter=_bucket_condition(low, high))
+    return aggregates
+
+
+def _counting(queryset):
+    # Ordering, joins and column lists of the result query don't affect counts
+    return queryset.select_related(None).order_by()
+
+
+def _version(counts):
+    return [counts['total'], counts['last_modified']]
+
+
+def facet_counts(queryset):
+    """Facets block for a filtered Property queryset, in one query"""
+    return facets_and_version(queryset)[0]
+
+
+def facets_and_version(queryset):
+    """(facets block, facets_version()) in one query"""
+    counts = _counting(queryset).aggregate(**facet_aggregates())
+    return facets_block(counts), _version(counts)
+
+
+async def afacets_and_version(queryset):
+    counts = await _counting(queryset).aaggregate(**facet_aggregates())
+    return facets_block(counts), _version(counts)
+
+
+def facets_version(queryset):
+    """What the facets block of queryset depends on, without counting the facets"""
+    return _version(_counting(queryset).aggregate(**VERSION_AGGREGATES))
+
+
+async def afacets_version(queryset):
+    return _version(await _counting(queryset).aaggregate(**VERSION_AGGREGATES))
+
+
+def facets_block(counts):
+    return {
+        'total': counts['total'],
+        'city': {value: counts[f'city__{value}'] for value, _ in Property.ZAMBIAN_CITIES},
+        'property_type': {value: counts[f'property_type__{value}'] for value, _ in Property.PROPERTY_TYPES},
+        'amenities': {amenity: counts[f'amenity__{amenity}'] for amenity in AMENITIES},
+        'price': [
+            {'min': low, 'max': high, 'count': counts[f'price__{n}']}
+            for n, (low, high) in enumerate(PRICE_BUCKETS)
+        ],
+    }
@@ -1,5 +1,20 @@
 import django_filters
+from rest_framework import filters
+from rest_framework.exceptions import ValidationError
 from .models import Property
+from . import geo
+
+
+def _floats(value, count, name):
+    """Parse 'a,b,...' into exactly `count` floats"""
+    try:
+        numbers = [float(v) for v in value.split(',')]
+    except ValueError:
+        numbers = []
+    if len(numbers) != count:
+        raise ValidationError({name: f'Expected {count} comma-separated numbers'})
+    return numbers
+
 
 class PropertyFilter(django_filters.FilterSet):
     """Advanced filters for property search"""
@@ -15,12 +30,65 @@ class PropertyFilter(django_filters.FilterSet):
     has_pool = django_filters.BooleanFilter(field_name='has_pool')
     has_ac = django_filters.BooleanFilter(field_name='has_ac')
     instant_book = django_filters.BooleanFilter(field_name='instant_book')
-    
+
+    # Map search: ?near=lat,lng&radius_km=25 and/or ?bbox=south,west,north,east
+    near = django_filters.CharFilter(method='filter_near')
+    radius_km = django_filters.NumberFilter(method='filter_radius_km')
+    bbox = django_filters.CharFilter(method='filter_bbox')
+
+    DEFAULT_RADIUS_KM = 25
+    MAX_RADIUS_KM = 500
+
     class Meta:
         model = Property
         fields = [
             'city', 'property_type', 'min_price', 'max_price',
             'min_bedrooms', 'min_bathrooms', 'min_rating',
             'has_wifi', 'has_parking', 'has_pool', 'has_ac',
-            'instant_book'
+            'instant_book', 'near', 'radius_km', 'bbox'
         ]
+
+    def filter_near(self, queryset, name, value):
+        """Within radius_km of a point, annotated with distance_km"""
+        latitude, longitude = _floats(value, 2, name)
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            raise ValidationError({name: 'Coordinates out of range'})
+        radius = self.form.cleaned_data.get('radius_km') or self.DEFAULT_RADIUS_KM
+        radius = min(float(radius), self.MAX_RADIUS_KM)
+
+        cells = geo.covering_cells(*geo.bounding_box(latitude, longitude, radius))
+        return (
+            queryset.filter(geo.in_cells(cells))
+            .annotate(distance_km=geo.haversine_km(latitude, longitude))
+            .filter(distance_km__lte=radius)
+        )
+
+    def filter_radius_km(self, queryset, name, value):
+        # Consumed by filter_near
+        return queryset
+
+    def filter_bbox(self, queryset, name, value):
+        """Inside a map viewport"""
+        south, west, north, east = _floats(value, 4, name)
+        if not (-90 <= south <= north <= 90 and -180 <= west <= east <= 180):
+            raise ValidationError({name: 'Expected south,west,north,east with south <= north and west <= east'})
+        return queryset.filter(
+            geo.in_cells(geo.covering_cells(south, west, north, east)),
+            latitude__range=(south, north),
+            longitude__range=(west, east),
+        )
+
+
+class PropertyOrderingFilter(filters.OrderingFilter):
+    """OrderingFilter that ignores ordering by annotations the request didn't produce
+    (e.g. ?ordering=distance_km without ?near=)"""
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if not ordering:
+            return ordering
+        annotations = queryset.query.annotations
+        optional = getattr(view, 'annotation_ordering_fields', ())
+        ordering = [term for term in ordering
+                    if term.lstrip('-') not in optional or term.lstrip('-') in annotations]
+        return ordering or self.get_default_ordering(view)
@@ -0,0 +1,104 @@
+"""
+Geohash helpers and distance expressions for map search.
+
+Each Property stores the geohash of its coordinates. A radius or viewport
+query first narrows candidates to a handful of geohash cells (index range
+scans on the geohash column) and only then computes the exact haversine
+distance, so the database never evaluates trigonometry for the whole table.
+"""
+
+import math
+
+from django.db.models import F, FloatField, Q
+from django.db.models.functions import ASin, Cast, Cos, Power, Radians, Sin, Sqrt
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_PRECISION = 9
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = 111.32
+
+# More cells means a tighter fit but a longer OR of range scans
+MAX_COVER_CELLS = 24
+
+
+def encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    """Standard base32 geohash of a point"""
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    latitude, longitude = float(latitude), float(longitude)
+    chars, bits, ch, even = [], 0, 0, True
+    while len(chars) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            ch = ch << 1 | (longitude >= mid)
+            lon_lo, lon_hi = (mid, lon_hi) if longitude >= mid else (lon_lo, mid)
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            ch = ch << 1 | (latitude >= mid)
+            lat_lo, lat_hi = (mid, lat_hi) if latitude >= mid else (lat_lo, mid)
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[ch])
+            bits, ch = 0, 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """(height, width) in degrees of a geohash cell"""
+    lon_bits = math.ceil(5 * precision / 2)
+    lat_bits = 5 * precision - lon_bits
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def _steps(lo, hi, step):
+    value = lo
+    while value < hi:
+        yield value
+        value += step
+    yield hi
+
+
+def covering_cells(south, west, north, east, max_cells=MAX_COVER_CELLS):
+    """Smallest set of geohash prefixes (at one precision) that covers a box"""
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        height, width = cell_size(precision)
+        rows = math.ceil((north - south) / height) + 1
+        cols = math.ceil((east - west) / width) + 1
+        if rows * cols <= max_cells or precision == 1:
+            return sorted({
+                encode(lat, lon, precision)
+                for lat in _steps(south, north, height)
+                for lon in _steps(west, east, width)
+            })
+    return []
+
+
+def in_cells(cells, field='geohash'):
+    """Q matching rows whose geohash starts with any of the prefixes.
+
+    Written as range comparisons rather than startswith so it stays an index
+    range scan on SQLite, where LIKE is case-insensitive and skips the index.
+    """
+    condition = Q()
+    for prefix in cells:
+        condition |= Q(**{f'{field}__gte': prefix, f'{field}__lt': prefix + '~'})
+    return condition
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """(south, west, north, east) around a point, clamped to valid coordinates"""
+    dlat = radius_km / KM_PER_DEGREE_LAT
+    dlon = radius_km / (KM_PER_DEGREE_LAT * max(math.cos(math.radians(latitude)), 1e-6))
+    return (max(latitude - dlat, -90.0), max(longitude - dlon, -180.0),
+            min(latitude + dlat, 90.0), min(longitude + dlon, 180.0))
+
+
+def haversine_km(latitude, longitude, lat_field='latitude', lon_field='longitude'):
+    """Database expression for great-circle distance in km from a point"""
+    lat = Radians(Cast(F(lat_field), FloatField()))
+    lon = Radians(Cast(F(lon_field), FloatField()))
+    lat0, lon0 = math.radians(latitude), math.radians(longitude)
+    a = (Power(Sin((lat - lat0) / 2), 2)
+         + math.cos(lat0) * Cos(lat) * Power(Sin((lon - lon0) / 2), 2))
+    return 2 * EARTH_RADIUS_KM * ASin(Sqrt(a))
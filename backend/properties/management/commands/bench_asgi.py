@@ -0,0 +1,134 @@
+"""
+WSGI vs ASGI under load, on the same seeded database.
+
+    python manage.py bench_asgi --properties 5000 --concurrency 1,8,32,64
+
+Seeds a throwaway on-disk database, then serves it twice: with gunicorn
+(Mwaiseni.wsgi, gthread workers) and with daphne (Mwaiseni.asgi, so the
+async property views are active). Each server gets the same request mix,
+property list, search with a stay, detail and featured, from keep-alive
+HTTP clients at every concurrency level, and throughput plus latency
+percentiles are reported side by side.
+
+The client runs in this process, so at high concurrency its own threads
+compete with the servers for CPU; compare the two columns, not absolute
+numbers against production.
+"""
+
+import http.client
+import itertools
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from urllib.parse import urlencode
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.urls import reverse
+
+from Mwaiseni.benchmarking import HOST, isolated_database, serve, summarize
+from properties.management.inventory import seed_inventory
+from properties.models import Property
+
+
+class Command(BaseCommand):
+    help = 'Load-test the property endpoints under gunicorn (WSGI) and daphne (ASGI)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--properties', type=int, default=5000)
+        parser.add_argument('--days', type=int, default=30, help='Nights of availability per room type')
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per concurrency level')
+        parser.add_argument('--concurrency', default='1,8,32,64', help='Comma-separated client counts')
+        parser.add_argument('--wsgi-workers', type=int, default=1)
+        parser.add_argument('--wsgi-threads', type=int, default=8)
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        levels = [int(n) for n in options['concurrency'].split(',')]
+        with isolated_database(on_disk=True):
+            start = date.today()
+            seed_inventory(options['properties'], options['days'], start, seed=options['seed'])
+            paths = self.request_mix(start, options['seed'])
+            database = connection.settings_dict['NAME']
+            connection.close()
+            self.stdout.write(f"{options['properties']} properties, {len(paths)} distinct requests, "
+                              f"{options['requests']} requests per level\n")
+
+            servers = [
+                ('wsgi', [sys.executable, '-m', 'gunicorn', 'Mwaiseni.wsgi:application',
+                          '--bind', f"{HOST}:{options['port']}", '--worker-class', 'gthread',
+                          '--workers', str(options['wsgi_workers']), '--threads', str(options['wsgi_threads'])],
+                 options['port']),
+                ('asgi', [sys.executable, '-m', 'daphne', '-b', HOST, '-p', str(options['port'] + 1),
+                          'Mwaiseni.asgi:application'],
+                 options['port'] + 1),
+            ]
+            results = {}
+            for name, command, port in servers:
+                with serve(command, port, database):
+                    self.drive(port, paths, 50, 4)
+                    for level in levels:
+                        results[name, level] = self.drive(port, paths, options['requests'], level)
+            self.report(results, levels)
+
+    def request_mix(self, start, seed):
+        rng = random.Random(seed)
+        ids = list(Property.objects.values_list('pk', flat=True))
+        list_url, search_url = reverse('property-list'), reverse('property-search')
+        stays = [
+            {'check_in': (start + timedelta(days=d)).isoformat(),
+             'check_out': (start + timedelta(days=d + 2)).isoformat()}
+            for d in range(1, 8)
+        ]
+        paths = [list_url, f"{list_url}?{urlencode({'ordering': 'price_per_night'})}", reverse('property-featured')]
+        paths += [f"{search_url}?{urlencode(dict(stay, city='lusaka'))}" for stay in stays]
+        paths += [f"{search_url}?{urlencode({'search': 'lodge'})}"]
+        paths += [reverse('property-detail', args=[pk]) for pk in rng.sample(ids, min(10, len(ids)))]
+        rng.shuffle(paths)
+        return paths
+
+    def drive(self, port, paths, requests, concurrency):
+        counter = itertools.count()
+
+        def client(_):
+            conn = http.client.HTTPConnection(HOST, port, timeout=30)
+            samples, errors = [], 0
+            while (n := next(counter)) < requests:
+                started = time.perf_counter()
+                try:
+                    conn.request('GET', paths[n % len(paths)])
+                    response = conn.getresponse()
+                    response.read()
+                    errors += response.status != 200
+                except (OSError, http.client.HTTPException):
+                    conn.close()
+                    conn = http.client.HTTPConnection(HOST, port, timeout=30)
+                    errors += 1
+                samples.append(time.perf_counter() - started)
+            conn.close()
+            return samples, errors
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            runs = list(pool.map(client, range(concurrency)))
+        elapsed = time.perf_counter() - started
+        samples = [s for run, _ in runs for s in run]
+        return {
+            'throughput': len(samples) / elapsed,
+            'errors': sum(errors for _, errors in runs),
+            **summarize(samples),
+        }
+
+    def report(self, results, levels):
+        self.stdout.write(f"{'clients':>8}  {'server':<6} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} "
+                          f"{'p99 ms':>9} {'errors':>7}")
+        for level in levels:
+            for name in ('wsgi', 'asgi'):
+                stats = results[name, level]
+                self.stdout.write(
+                    f"{level:>8}  {name:<6} {stats['throughput']:>9.1f} {stats['p50_ms']:>9.2f} "
+                    f"{stats['p95_ms']:>9.2f} {stats['p99_ms']:>9.2f} {stats['errors']:>7}"
+                )
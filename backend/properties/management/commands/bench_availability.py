@@ -0,0 +1,84 @@
+"""
+Benchmark the date-range availability search.
+
+    python manage.py bench_availability --properties 10000 --days 365
+
+Seeds a throwaway database with one room type per property and a year of
+nightly Availability rows, then times the single-statement stay search and pricing a page of results.
+"""
+
+import random
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+
+from Mwaiseni.benchmarking import format_stats, isolated_database, measure
+from properties import pricing
+from properties.availability import filter_available
+from properties.management.inventory import seed_inventory
+from properties.models import Property
+
+
+class Command(BaseCommand):
+    help = 'Benchmark check_in/check_out/guests availability search'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--properties', type=int, default=10000)
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument('--sold-out', type=float, default=0.15,
+                            help='Fraction of nights with no rooms left')
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        with isolated_database():
+            start = date.today()
+            self.seed(options, start)
+            self.run(options, start)
+
+    def seed(self, options, start):
+        room_type_ids = seed_inventory(options['properties'], options['days'], start,
+                                       sold_out=options['sold_out'], seed=options['seed'])
+        self.stdout.write(
+            f"Seeded {options['properties']} properties, {len(room_type_ids)} room types, "
+            f"{len(room_type_ids) * options['days']} availability rows"
+        )
+
+    def run(self, options, start):
+        rng = random.Random(options['seed'])
+        horizon = max(1, options['days'] - 7)
+
+        def stay():
+            check_in = start + timedelta(days=rng.randrange(horizon))
+            return check_in, check_in + timedelta(days=rng.randint(1, 7)), rng.randint(1, 3)
+
+        def first_page():
+            list(filter_available(Property.objects.all(), *stay())[:20])
+
+        def city_page():
+            list(filter_available(Property.objects.filter(city='livingstone'), *stay())[:20])
+
+        def full_count():
+            filter_available(Property.objects.all(), *stay()).count()
+
+        pages = [list(Property.objects.order_by('?')[:20]) for _ in range(5)]
+
+        def quote_page():
+            pricing.quote_stays(rng.choice(pages), *stay())
+
+        def quote_per_listing():
+            # What pricing each result on its own would cost
+            check_in, check_out, guests = stay()
+            for prop in rng.choice(pages):
+                pricing.quote_stays([prop], check_in, check_out, guests)
+
+        repeat = options['repeat']
+        self.stdout.write(format_stats('search, first 20 results', measure(first_page, repeat)))
+        self.stdout.write(format_stats('search, city=livingstone', measure(city_page, repeat)))
+        self.stdout.write(format_stats('search, count all matches', measure(full_count, repeat)))
+        self.stdout.write(format_stats('quote 20 results, one query', measure(quote_page, repeat)))
+        self.stdout.write(format_stats('quote 20 results, per listing', measure(quote_per_listing, repeat)))
+
+        check_in, check_out, guests = stay()
+        plan = filter_available(Property.objects.all(), check_in, check_out, guests)[:20].explain()
+        self.stdout.write('\nQuery plan:\n' + plan)
@@ -0,0 +1,72 @@
+"""
+Time a year of partner calendar rates through the bulk upsert against per-row saves.
+
+    python manage.py bench_bulk_availability --room-types 20 --days 365
+"""
+
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from Mwaiseni.benchmarking import count_queries, isolated_database
+from properties.bulk_inventory import apply_rules
+from properties.models import Property
+from users.models import Availability, RoomType, User
+
+
+class Command(BaseCommand):
+    help = 'Benchmark bulk availability/rate upserts for one lodge'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--room-types', type=int, default=20)
+        parser.add_argument('--days', type=int, default=365)
+
+    def handle(self, *args, **options):
+        with isolated_database():
+            host = User.objects.create_user(email='bench-host@mwaiseni.test', password=None)
+            lodge = Property.objects.create(
+                host=host, title='Bench Lodge', description='Bench', property_type='lodge',
+                address='1 Cairo Road', city='lusaka', price_per_night=500,
+                bedrooms=20, bathrooms=20, max_guests=40,
+            )
+            room_types = [RoomType.objects.create(property=lodge, name=f'Room {i}', price_per_night=500,
+                                                  capacity=2, total_rooms=5)
+                          for i in range(options['room_types'])]
+            start = date.today()
+            end = start + timedelta(days=options['days'] - 1)
+
+            def rules(price, **extra):
+                return [dict(room_type=room_type, start=start, end=end, price_override=Decimal(price), **extra)
+                        for room_type in room_types]
+
+            self.stdout.write(f"{len(room_types)} room types x {options['days']} days")
+            self.run('bulk, new nights', lambda: apply_rules(rules('650.00', available_rooms=5)))
+            self.run('bulk, every rate changed', lambda: apply_rules(rules('700.00')))
+            self.run('bulk, same rules again', lambda: apply_rules(rules('700.00')))
+            self.run('bulk, weekends only', lambda: apply_rules(rules('900.00', weekdays=['sat', 'sun'])))
+
+            # The admin path: one save per night, timed on one room type and extrapolated
+            nights = list(Availability.objects.filter(room_type=room_types[0]))
+
+            def per_row():
+                with transaction.atomic():
+                    for night in nights:
+                        night.price_override = Decimal('750.00')
+                        night.save()
+
+            started = time.perf_counter()
+            per_row()
+            elapsed = (time.perf_counter() - started) * len(room_types)
+            self.stdout.write(f'  {"per-row save() (extrapolated)":<32} {elapsed * 1000:>9.1f} ms')
+
+    def run(self, label, fn):
+        with count_queries() as queries:
+            started = time.perf_counter()
+            result = fn()
+            elapsed = time.perf_counter() - started
+        self.stdout.write(f'  {label:<32} {elapsed * 1000:>9.1f} ms  {len(queries):>3} queries  '
+                          f"created {result['created']}, updated {result['updated']}, "
+                          f"unchanged {result['unchanged']}")
@@ -0,0 +1,90 @@
+"""
+Compare availability calendar lookups with the equivalent ORM queries.
+
+    python manage.py bench_calendar --room-types 200 --days 365
+"""
+
+import pickle
+import random
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+
+from Mwaiseni.benchmarking import format_stats, isolated_database, measure
+from properties import calendar
+from properties.management.inventory import seed_inventory
+from users.models import Availability
+
+
+class Command(BaseCommand):
+    help = 'Benchmark cached RoomType calendars against Availability range scans'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--room-types', type=int, default=200)
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument('--repeat', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        with isolated_database():
+            start = date.today()
+            room_type_ids = seed_inventory(options['room_types'], options['days'], start,
+                                           seed=options['seed'])
+            self.run(options, start, room_type_ids)
+
+    def run(self, options, start, room_type_ids):
+        rng = random.Random(options['seed'])
+        horizon = max(1, options['days'] - 14)
+
+        def stay():
+            check_in = start + timedelta(days=rng.randrange(horizon))
+            return rng.choice(room_type_ids), check_in, check_in + timedelta(days=rng.randint(1, 7))
+
+        def orm_range_check():
+            room_type_id, check_in, check_out = stay()
+            free = Availability.objects.filter(
+                room_type_id=room_type_id, date__gte=check_in, date__lt=check_out,
+                available_rooms__gte=1,
+            ).count()
+            return free == (check_out - check_in).days
+
+        def orm_first_window():
+            room_type_id, check_in, _ = stay()
+            run, previous = 0, None
+            nights = Availability.objects.filter(
+                room_type_id=room_type_id, date__gte=check_in,
+            ).order_by('date').values_list('date', 'available_rooms')
+            for night, rooms in nights.iterator():
+                if rooms < 1:
+                    run = 0
+                elif previous is not None and night - previous == timedelta(days=1):
+                    run += 1
+                else:
+                    run = 1
+                previous = night
+                if run == 5:
+                    return night - timedelta(days=4)
+            return None
+
+        def calendar_range_check():
+            room_type_id, check_in, check_out = stay()
+            return calendar.is_room_type_free(room_type_id, check_in, check_out)
+
+        def calendar_first_window():
+            room_type_id, check_in, _ = stay()
+            return calendar.get_calendar(room_type_id).first_free_window(5, after=check_in)
+
+        for room_type_id in room_type_ids:
+            calendar.get_calendar(room_type_id)
+
+        repeat = options['repeat']
+        self.stdout.write(format_stats('ORM range check', measure(orm_range_check, repeat)))
+        self.stdout.write(format_stats('calendar range check', measure(calendar_range_check, repeat)))
+        self.stdout.write(format_stats('ORM first 5-night window', measure(orm_first_window, repeat)))
+        self.stdout.write(format_stats('calendar first 5-night window', measure(calendar_first_window, repeat)))
+
+        sample = calendar.get_calendar(room_type_ids[0])
+        self.stdout.write(
+            f'\nCalendar size per RoomType ({len(sample.rooms)} days): '
+            f'{sample.nbytes} bytes of arrays, {len(pickle.dumps(sample))} bytes pickled'
+        )
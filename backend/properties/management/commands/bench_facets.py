@@ -0,0 +1,69 @@
+"""
+Cost of the search facets block next to the result page it accompanies.
+
+    python manage.py bench_facets --properties 50000
+"""
+
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from Mwaiseni.benchmarking import count_queries, format_stats, isolated_database, measure
+from properties import geo, search
+from properties.facets import facet_aggregates, facet_counts
+from properties.management.inventory import seed_inventory
+from properties.models import Property
+from properties.views import LIST_COLUMNS
+
+# (label, queryset builder) covering the filter shapes the search page sends
+SCENARIOS = [
+    ('no filters', lambda qs: qs),
+    ('city', lambda qs: qs.filter(city='lusaka')),
+    ('price + wifi', lambda qs: qs.filter(price_per_night__gte=500, price_per_night__lte=1500, has_wifi=True)),
+    ('full-text', lambda qs: search.search(qs, 'safari lodge')),
+    ('radius 10 km', lambda qs: qs.filter(geo.in_cells(geo.covering_cells(*geo.bounding_box(-15.4167, 28.2833, 10))))
+        .annotate(distance_km=geo.haversine_km(-15.4167, 28.2833)).filter(distance_km__lte=10)),
+]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the facet aggregate query against the search result query'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--properties', type=int, default=50000)
+        parser.add_argument('--repeat', type=int, default=30)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        with isolated_database():
+            seed_inventory(options['properties'], 0, date.today(), seed=options['seed'])
+            base = Property.objects.select_related('host').only(*LIST_COLUMNS)
+            self.stdout.write(f"{options['properties']} properties\n")
+
+            for label, build in SCENARIOS:
+                queryset = build(base)
+
+                def results():
+                    list(queryset.order_by('-created_at', '-id')[:21])
+
+                def facets():
+                    facet_counts(queryset)
+
+                def query_per_facet():
+                    # What the page would otherwise do: one COUNT per facet value
+                    counting = queryset.select_related(None).order_by()
+                    for aggregate in facet_aggregates().values():
+                        condition = aggregate.filter
+                        (counting.filter(condition) if condition else counting).count()
+
+                with count_queries() as queries:
+                    facets()
+                results_stats = measure(results, options['repeat'])
+                facet_stats = measure(facets, options['repeat'])
+                self.stdout.write(label)
+                self.stdout.write(format_stats('  result page', results_stats))
+                self.stdout.write(format_stats(f'  facets ({len(queries)} query)', facet_stats))
+                self.stdout.write(format_stats(f'  facets ({len(facet_aggregates())} queries)',
+                                               measure(query_per_facet, options['repeat'])))
+                ratio = facet_stats['p50_ms'] / max(results_stats['p50_ms'], 0.001)
+                self.stdout.write(f'  facets / results at p50: {ratio:.1f}x\n')
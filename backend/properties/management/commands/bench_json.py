@@ -0,0 +1,62 @@
+"""
+JSON rendering and parsing of a 1,000-property payload: DRF's stdlib-based
+JSONRenderer/JSONParser against the ujson pair in Mwaiseni/fastjson.py.
+
+    python manage.py bench_json --properties 1000
+
+Payloads: the list and detail serializers' output (Decimals and timestamps
+already strings) and plain values() rows, where Decimal, datetime and the
+host's UUID reach the encoder as Python objects.
+"""
+
+import io
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from Mwaiseni.benchmarking import format_stats, isolated_database, measure
+from Mwaiseni.fastjson import UJSONParser, UJSONRenderer
+from properties.management.inventory import seed_inventory
+from properties.models import Property
+from properties.serializers import PropertyListSerializer, PropertySerializer
+from properties.views import LIST_COLUMNS
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the ujson renderer and parser against the DRF defaults'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--properties', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        with isolated_database():
+            seed_inventory(options['properties'], 0, date.today(), seed=options['seed'])
+            rows = Property.objects.select_related('host')
+            payloads = [
+                ('list serializer', PropertyListSerializer(rows.only(*LIST_COLUMNS), many=True).data),
+                ('detail serializer', PropertySerializer(rows, many=True).data),
+                ('values() rows', list(Property.objects.values())),
+            ]
+
+        self.stdout.write(f"{options['properties']} properties\n")
+        stdlib, fast = JSONRenderer(), UJSONRenderer()
+        for label, data in payloads:
+            body = stdlib.render(data)
+            if JSONParser().parse(io.BytesIO(fast.render(data))) != JSONParser().parse(io.BytesIO(body)):
+                raise CommandError(f'{label}: the renderers disagree')
+
+            self.stdout.write(f'{label} ({len(body) / 1024:.0f} KiB)')
+            render = measure(lambda: stdlib.render(data), options['repeat'])
+            fast_render = measure(lambda: fast.render(data), options['repeat'])
+            parse = measure(lambda: JSONParser().parse(io.BytesIO(body)), options['repeat'])
+            fast_parse = measure(lambda: UJSONParser().parse(io.BytesIO(body)), options['repeat'])
+            self.stdout.write(format_stats('  render, json', render))
+            self.stdout.write(format_stats('  render, ujson', fast_render))
+            self.stdout.write(format_stats('  parse, json', parse))
+            self.stdout.write(format_stats('  parse, ujson', fast_parse))
+            self.stdout.write(f"  speed-up at p50: render {render['p50_ms'] / fast_render['p50_ms']:.1f}x, "
+                              f"parse {parse['p50_ms'] / fast_parse['p50_ms']:.1f}x\n")
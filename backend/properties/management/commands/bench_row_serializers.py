@@ -0,0 +1,68 @@
+"""
+Serialization cost of a 100-row page: the list and search model serializers
+against their values()-row counterparts in properties/serializers.py.
+
+    python manage.py bench_row_serializers --properties 1000 --rows 100
+
+"serialize" times .data over rows already in memory (model instances, or
+values() dicts); "fetch + serialize" also runs the page query and builds the
+instances or dicts.
+"""
+
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from Mwaiseni.benchmarking import format_stats, isolated_database, measure
+from properties.management.inventory import seed_inventory
+from properties.models import Property
+from properties.serializers import (
+    PropertyListRowSerializer, PropertyListSerializer, PropertyRowSerializer, PropertySerializer,
+)
+from properties.views import LIST_COLUMNS
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the values()-row serializers against the model serializers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--properties', type=int, default=1000)
+        parser.add_argument('--rows', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        with isolated_database():
+            seed_inventory(options['properties'], 0, date.today(), seed=options['seed'])
+            self.stdout.write(f"{options['rows']} rows of {options['properties']} properties\n")
+            base = Property.objects.order_by('-created_at', '-id')
+            self.compare('list', options,
+                         base.select_related('host').only(*LIST_COLUMNS), PropertyListSerializer,
+                         base, PropertyListRowSerializer)
+            self.compare('search', options,
+                         base.select_related('host'), PropertySerializer,
+                         base, PropertyRowSerializer)
+
+    def compare(self, label, options, queryset, serializer, row_queryset, row_serializer):
+        page, repeat = options['rows'], options['repeat']
+        row_queryset = row_serializer.values(row_queryset, 'updated_at', 'created_at')
+        instances, rows = list(queryset[:page]), list(row_queryset[:page])
+        if JSONRenderer().render(serializer(instances, many=True).data) != \
+                JSONRenderer().render(row_serializer(rows, many=True).data):
+            raise CommandError(f'{label}: the serializers disagree')
+
+        results = [
+            ('serialize, model', measure(lambda: serializer(instances, many=True).data, repeat)),
+            ('serialize, rows', measure(lambda: row_serializer(rows, many=True).data, repeat)),
+            ('fetch + serialize, model',
+             measure(lambda: serializer(list(queryset[:page]), many=True).data, repeat)),
+            ('fetch + serialize, rows',
+             measure(lambda: row_serializer(list(row_queryset[:page]), many=True).data, repeat)),
+        ]
+        self.stdout.write(f'{label}')
+        for name, stats in results:
+            self.stdout.write(format_stats(f'  {name}', stats))
+        stats = [stats['p50_ms'] for _, stats in results]
+        self.stdout.write(f'  speed-up at p50: serialize {stats[0] / stats[1]:.1f}x, '
+                          f'fetch + serialize {stats[2] / stats[3]:.1f}x\n')
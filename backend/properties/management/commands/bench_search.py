@@ -0,0 +1,60 @@
+"""
+Compare full-text property search with the old icontains scan as the catalog grows.
+
+    python manage.py bench_search --sizes 1000 10000 50000
+"""
+
+import random
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from Mwaiseni.benchmarking import format_stats, isolated_database, measure
+from properties import search
+from properties.management.inventory import VOCABULARY, seed_inventory
+from properties.models import Property
+
+
+class Command(BaseCommand):
+    help = 'Benchmark full-text search against icontains at growing catalog sizes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000])
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+
+        def query_text():
+            words = rng.sample(VOCABULARY, rng.randint(1, 2))
+            words[-1] = words[-1][:rng.randint(3, len(words[-1]))]
+            return ' '.join(words)
+
+        def rare_text():
+            # Listing numbers only appear in one or two titles
+            return str(rng.randrange(seeded))
+
+        def fulltext(text):
+            return lambda: list(search.search(Property.objects.all(), text()).order_by('-search_rank')[:20])
+
+        def icontains(text):
+            def run():
+                term = text()
+                condition = (Q(title__icontains=term) | Q(description__icontains=term)
+                             | Q(address__icontains=term) | Q(city__icontains=term))
+                list(Property.objects.filter(condition)[:20])
+            return run
+
+        with isolated_database():
+            seeded = 0
+            for n, size in enumerate(sorted(options['sizes'])):
+                seed_inventory(size - seeded, 0, date.today(), seed=options['seed'] + n)
+                seeded = size
+                self.stdout.write(f'\n{size} properties')
+                repeat = options['repeat']
+                self.stdout.write(format_stats('  full-text, common words', measure(fulltext(query_text), repeat)))
+                self.stdout.write(format_stats('  icontains, common words', measure(icontains(query_text), repeat)))
+                self.stdout.write(format_stats('  full-text, rare word', measure(fulltext(rare_text), repeat)))
+                self.stdout.write(format_stats('  icontains, rare word', measure(icontains(rare_text), repeat)))
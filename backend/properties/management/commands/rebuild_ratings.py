@@ -0,0 +1,34 @@
+"""
+Recompute Property.rating_sum, review_count and average_rating from reviews.
+
+    python manage.py rebuild_ratings
+    python manage.py rebuild_ratings --property 12 --property 40
+
+Runs as one set-based UPDATE; use it after backfilling or importing reviews.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from properties import ratings
+from properties.models import Property
+
+
+class Command(BaseCommand):
+    help = 'Rebuild denormalised property rating aggregates from reviews'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--property', type=int, action='append', dest='property_ids',
+                            help='Only rebuild these property ids (repeatable)')
+
+    def handle(self, *args, **options):
+        queryset = Property.objects.all()
+        if options['property_ids']:
+            queryset = queryset.filter(pk__in=options['property_ids'])
+        started = time.perf_counter()
+        with transaction.atomic():
+            updated = ratings.rebuild(queryset)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt ratings for {updated} properties in {elapsed:.2f}s'))
@@ -0,0 +1,85 @@
+"""Synthetic listing inventory for the bench_* commands"""
+
+import random
+from datetime import timedelta
+
+from django.db import connection
+
+from Mwaiseni.benchmarking import stream_create
+from properties import geo
+from properties.models import Property
+from users.models import Availability, RoomType, User
+
+BATCH_SIZE = 5000
+
+# Approximate city centres (latitude, longitude)
+CITY_CENTRES = {
+    'lusaka': (-15.4167, 28.2833),
+    'livingstone': (-17.8419, 25.8543),
+    'ndola': (-12.9587, 28.6366),
+    'kitwe': (-12.8024, 28.2132),
+    'chipata': (-13.6333, 32.6500),
+    'kabwe': (-14.4469, 28.4464),
+    'mongu': (-15.2484, 23.1274),
+    'solwezi': (-12.1688, 26.3894),
+    'mazabuka': (-15.8560, 27.7480),
+}
+
+VOCABULARY = (
+    'quiet spacious modern riverside family safari budget luxury cosy garden '
+    'zambezi falls victoria lake kafue kariba bush city centre market airport '
+    'pool wifi breakfast parking braai veranda view sunset boat cruise game drive '
+    'secure borehole solar generator kitchen lounge patio shuttle walking distance'
+).split()
+
+
+def seed_inventory(properties, days, start, sold_out=0.15, room_types=1, seed=42):
+    """Bulk-create properties with room types and `days` nights of Availability.
+
+    Returns the list of RoomType ids.
+    """
+    rng = random.Random(seed)
+    cities = list(CITY_CENTRES)
+    property_types = [value for value, _ in Property.PROPERTY_TYPES]
+    host = User.objects.create_user(email=f'bench-host-{seed}@mwaiseni.test', password='x',
+                                    first_name='Bench', last_name='Host')
+
+    def listing(i):
+        city = rng.choice(cities)
+        lat, lng = CITY_CENTRES[city]
+        lat, lng = round(lat + rng.uniform(-0.1, 0.1), 6), round(lng + rng.uniform(-0.1, 0.1), 6)
+        # bulk_create skips Property.save(), so derive the geohash here
+        return Property(host=host, title=f"{' '.join(rng.sample(VOCABULARY, 3)).title()} {i}",
+                        description=' '.join(rng.choices(VOCABULARY, k=40)),
+                        property_type=rng.choice(property_types), address=f'{i} {rng.choice(VOCABULARY).title()} Road',
+                        city=city, latitude=lat, longitude=lng, geohash=geo.encode(lat, lng),
+                        price_per_night=rng.randint(300, 3000), bedrooms=2, bathrooms=1, max_guests=4,
+                        has_wifi=rng.random() < 0.7, has_pool=rng.random() < 0.2,
+                        has_parking=rng.random() < 0.5, has_ac=rng.random() < 0.4,
+                        has_kitchen=rng.random() < 0.5)
+
+    Property.objects.bulk_create((listing(i) for i in range(properties)), batch_size=BATCH_SIZE)
+    RoomType.objects.bulk_create(
+        (RoomType(property_id=pk, name=f'Room {n}', price_per_night=500,
+                  capacity=rng.choice([1, 2, 2, 3, 4]), total_rooms=3)
+         for pk in Property.objects.filter(host=host).values_list('pk', flat=True).iterator()
+         for n in range(room_types)),
+        batch_size=BATCH_SIZE,
+    )
+
+    nights = [start + timedelta(days=d) for d in range(days)]
+    room_type_ids = list(RoomType.objects.filter(property__host=host).values_list('pk', flat=True))
+    stream_create(
+        Availability,
+        (Availability(room_type_id=rt, date=night,
+                      available_rooms=0 if rng.random() < sold_out else 3,
+                      price_override=rng.choice([None, None, None, 650]))
+         for rt in room_type_ids for night in nights),
+        BATCH_SIZE,
+    )
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute('ANALYZE')
+        elif connection.vendor == 'postgresql':
+            cursor.execute('ANALYZE users_availability')
+    return room_type_ids
@@ -0,0 +1,83 @@
+from django.db import migrations
+
+# Django rebuilds tables on SQLite for most AlterField operations, which drops
+# these triggers. Any later migration that remakes properties_property must
+# re-run SQLITE_FORWARD's trigger statements.
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE properties_property_fts USING fts5(
+        title, description, address, city,
+        content='properties_property', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER properties_property_fts_ai AFTER INSERT ON properties_property BEGIN
+        INSERT INTO properties_property_fts(rowid, title, description, address, city)
+        VALUES (new.id, new.title, new.description, new.address, new.city);
+    END
+    """,
+    """
+    CREATE TRIGGER properties_property_fts_ad AFTER DELETE ON properties_property BEGIN
+        INSERT INTO properties_property_fts(properties_property_fts, rowid, title, description, address, city)
+        VALUES ('delete', old.id, old.title, old.description, old.address, old.city);
+    END
+    """,
+    """
+    CREATE TRIGGER properties_property_fts_au AFTER UPDATE OF title, description, address, city
+    ON properties_property BEGIN
+        INSERT INTO properties_property_fts(properties_property_fts, rowid, title, description, address, city)
+        VALUES ('delete', old.id, old.title, old.description, old.address, old.city);
+        INSERT INTO properties_property_fts(rowid, title, description, address, city)
+        VALUES (new.id, new.title, new.description, new.address, new.city);
+    END
+    """,
+    "INSERT INTO properties_property_fts(properties_property_fts) VALUES ('rebuild')",
+]
+
+SQLITE_BACKWARD = [
+    'DROP TRIGGER IF EXISTS properties_property_fts_au',
+    'DROP TRIGGER IF EXISTS properties_property_fts_ad',
+    'DROP TRIGGER IF EXISTS properties_property_fts_ai',
+    'DROP TABLE IF EXISTS properties_property_fts',
+]
+
+POSTGRES_FORWARD = [
+    """
+    ALTER TABLE properties_property ADD COLUMN search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english'::regconfig, coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english'::regconfig, coalesce(city, '')), 'A') ||
+        setweight(to_tsvector('english'::regconfig, coalesce(address, '')), 'B') ||
+        setweight(to_tsvector('english'::regconfig, coalesce(description, '')), 'C')
+    ) STORED
+    """,
+    'CREATE INDEX properties_property_search_gin ON properties_property USING GIN (search_vector)',
+]
+
+POSTGRES_BACKWARD = [
+    'DROP INDEX IF EXISTS properties_property_search_gin',
+    'ALTER TABLE properties_property DROP COLUMN IF EXISTS search_vector',
+]
+
+
+def run(statements):
+    def apply(apps, schema_editor):
+        for sql in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(sql)
+    return apply
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0002_alter_property_host'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run({'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRES_FORWARD}),
+            run({'sqlite': SQLITE_BACKWARD, 'postgresql': POSTGRES_BACKWARD}),
+        ),
+    ]
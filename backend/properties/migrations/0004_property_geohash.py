@@ -0,0 +1,28 @@
+# Generated by Django 4.2.10 on 2026-10-18 04:44
+
+from django.db import migrations, models
+
+from properties.geo import encode
+
+
+def backfill_geohash(apps, schema_editor):
+    Property = apps.get_model('properties', 'Property')
+    located = Property.objects.filter(latitude__isnull=False, longitude__isnull=False)
+    for pk, latitude, longitude in located.values_list('pk', 'latitude', 'longitude').iterator():
+        Property.objects.filter(pk=pk).update(geohash=encode(latitude, longitude))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0003_property_fulltext'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='property',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=12, null=True),
+        ),
+        migrations.RunPython(backfill_geohash, migrations.RunPython.noop),
+    ]
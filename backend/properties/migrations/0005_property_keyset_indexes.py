@@ -0,0 +1,25 @@
+# Generated by Django 4.2.10 on 2026-10-18 04:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0004_property_geohash'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(fields=['created_at', 'id'], name='property_created_keyset'),
+        ),
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(fields=['price_per_night', 'id'], name='property_price_keyset'),
+        ),
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(fields=['average_rating', 'id'], name='property_rating_keyset'),
+        ),
+    ]
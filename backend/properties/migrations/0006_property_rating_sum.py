@@ -0,0 +1,54 @@
+# Generated by Django 4.2.10 on 2026-10-18 05:01
+
+import importlib
+
+from django.db import migrations, models
+from django.db.models import Count, FloatField, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Cast, Coalesce, NullIf, Round
+
+fulltext = importlib.import_module('properties.migrations.0003_property_fulltext')
+
+# AddField with a default remakes properties_property on SQLite, which drops
+# the full-text triggers; put them back (the FTS table itself survives)
+FTS_TRIGGERS = [sql for sql in fulltext.SQLITE_FORWARD if 'CREATE TRIGGER' in sql]
+
+
+def restore_fts_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for sql in fulltext.SQLITE_BACKWARD[:3] + FTS_TRIGGERS:
+            schema_editor.execute(sql)
+
+
+def backfill_ratings(apps, schema_editor):
+    # properties.ratings.rebuild() as of this migration, over the historical models
+    Property = apps.get_model('properties', 'Property')
+    Review = apps.get_model('users', 'Review')
+    reviews = Review.objects.filter(booking__property=OuterRef('pk')).order_by().values('booking__property')
+    rating_sum = Coalesce(Subquery(reviews.annotate(total=Sum('rating')).values('total'),
+                                   output_field=IntegerField()), 0)
+    review_count = Coalesce(Subquery(reviews.annotate(n=Count('*')).values('n'),
+                                     output_field=IntegerField()), 0)
+    Property.objects.update(
+        rating_sum=rating_sum,
+        review_count=review_count,
+        average_rating=Coalesce(Round(Cast(rating_sum, FloatField()) / NullIf(review_count, Value(0)), 2),
+                                Value(0.0)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0005_property_keyset_indexes'),
+        ('users', '0004_booking_room_type'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='property',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(restore_fts_triggers, migrations.RunPython.noop),
+        migrations.RunPython(backfill_ratings, migrations.RunPython.noop),
+    ]
@@ -2,6 +2,8 @@ from django.db import models
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator, MaxValueValidator
 
+from . import geo
+
 User = get_user_model()
 
 class Property(models.Model):
@@ -45,6 +47,8 @@ class Property(models.Model):
     city = models.CharField(max_length=50, choices=ZAMBIAN_CITIES)
     latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    # Derived from latitude/longitude on save; indexed for radius/viewport prefiltering
+    geohash = models.CharField(max_length=12, null=True, blank=True, editable=False, db_index=True)
     
     # Pricing (in ZMW - Zambian Kwacha)
     price_per_night = models.DecimalField(max_digits=10, decimal_places=2)
@@ -71,6 +75,8 @@ class Property(models.Model):
     average_rating = models.DecimalField(max_digits=3, decimal_places=2, default=0, 
                                         validators=[MinValueValidator(0), MaxValueValidator(5)])
     review_count = models.PositiveIntegerField(default=0)
+    # Running total of review ratings; maintained with review_count by ratings.py
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
     
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
@@ -79,6 +85,22 @@ class Property(models.Model):
     def __str__(self):
         return f"{self.title} - {self.get_city_display()}"
     
+    def save(self, *args, **kwargs):
+        if self.latitude is not None and self.longitude is not None:
+            self.geohash = geo.encode(self.latitude, self.longitude)
+        else:
+            self.geohash = None
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'geohash'}
+        super().save(*args, **kwargs)
+    
     class Meta:
         verbose_name_plural = "Properties"
-        ordering = ['-created_at']
\ No newline at end of file
+        ordering = ['-created_at']
+        # Keyset pagination seeks on (ordering field, id) for each of PropertyViewSet.ordering_fields
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='property_created_keyset'),
+            models.Index(fields=['price_per_night', 'id'], name='property_price_keyset'),
+            models.Index(fields=['average_rating', 'id'], name='property_rating_keyset'),
+        ]
\ No newline at end of file
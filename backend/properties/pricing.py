@@ -0,0 +1,99 @@
+"""
+Stay quotes: what a stay costs, computed on the server.
+
+A night costs Availability.price_override when the host set one, otherwise
+the RoomType's price_per_night. A stay is the sum of its nights times the
+rooms booked, plus the property's cleaning_fee. Listings without room types
+fall back to Property.price_per_night for every night.
+
+room_type_rates() prices every room type of a whole results page in one
+grouped query: the database sums the nightly rates per room type, so one row
+per room type comes back instead of one per night, and no query runs per
+listing. quote_stays() then picks the cheapest room type that fits the
+guests and is free on every night.
+"""
+
+from django.db.models import Count, FilteredRelation, Q, Sum
+from django.db.models.functions import Coalesce
+
+from users.models import RoomType
+
+
+def _row_value(row, name):
+    return row[name] if isinstance(row, dict) else getattr(row, name)
+
+
+def stay_total(nightly_total, cleaning_fee, rooms=1):
+    return nightly_total * rooms + cleaning_fee
+
+
+def _rates(room_types, check_in, check_out, rooms=1):
+    # The stay's dates go into the JOIN condition, so only its nights are read
+    stay = FilteredRelation('availabilities', condition=Q(
+        availabilities__date__gte=check_in, availabilities__date__lt=check_out,
+    ))
+    return (
+        room_types
+        .annotate(stay=stay)
+        .values('id', 'property_id', 'capacity')
+        .annotate(
+            free_nights=Count('stay', filter=Q(stay__available_rooms__gte=rooms)),
+            nightly_total=Sum(Coalesce('stay__price_override', 'price_per_night')),
+        )
+        .order_by('id')
+    )
+
+
+def room_type_rates(property_ids, check_in, check_out, rooms=1):
+    """[{id, property_id, capacity, free_nights, nightly_total}] for every room
+    type of the given properties; a night is free when `rooms` rooms are left"""
+    return list(_rates(RoomType.objects.filter(property_id__in=property_ids), check_in, check_out, rooms))
+
+
+async def aroom_type_rates(property_ids, check_in, check_out, rooms=1):
+    return [rate async for rate in _rates(RoomType.objects.filter(property_id__in=property_ids),
+                                          check_in, check_out, rooms)]
+
+
+def room_type_nightly_total(room_type_id, check_in, check_out):
+    """Sum of one room type's nightly rates over the stay"""
+    rate = _rates(RoomType.objects.filter(pk=room_type_id), check_in, check_out).first()
+    return rate['nightly_total'] if rate else None
+
+
+def quote_stays(properties, check_in, check_out, guests=1, rates=None):
+    """{property pk: quote or None} for the cheapest bookable room type of each
+    property; pass `rates` from room_type_rates() to reuse an earlier query.
+    `properties` are Property instances or values() dicts"""
+    nights = (check_out - check_in).days
+    if rates is None:
+        rates = room_type_rates([_row_value(prop, 'id') for prop in properties], check_in, check_out)
+
+    cheapest, has_room_types = {}, set()
+    for rate in rates:
+        has_room_types.add(rate['property_id'])
+        if rate['capacity'] < guests or rate['free_nights'] != nights:
+            continue
+        best = cheapest.get(rate['property_id'])
+        if best is None or rate['nightly_total'] < best['nightly_total']:
+            cheapest[rate['property_id']] = rate
+
+    quotes = {}
+    for prop in properties:
+        pk, cleaning_fee = _row_value(prop, 'id'), _row_value(prop, 'cleaning_fee')
+        if pk in cheapest:
+            room_type, nightly_total = cheapest[pk]['id'], cheapest[pk]['nightly_total']
+        elif pk not in has_room_types and guests <= _row_value(prop, 'max_guests'):
+            room_type, nightly_total = None, _row_value(prop, 'price_per_night') * nights
+        else:
+            quotes[pk] = None
+            continue
+        quotes[pk] = {
+            'nights': nights,
+            'room_type': room_type,
+            'nightly_total': nightly_total,
+            'cleaning_fee': cleaning_fee,
+            'total': stay_total(nightly_total, cleaning_fee),
+            'currency': _row_value(prop, 'currency'),
+        }
+    return quotes
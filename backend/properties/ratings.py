@@ -0,0 +1,76 @@
+"""
+Denormalised review aggregates on Property.
+
+Each Property keeps rating_sum and review_count next to average_rating.
+A new, edited or deleted review adjusts them with one UPDATE built from F()
+expressions, so the database applies concurrent changes one after another
+instead of losing one, and every right-hand side reads the row as it was
+before the statement: average_rating is (rating_sum + delta) / (count +
+delta) in the same UPDATE. Reads (featured, ?min_rating=, ordering) only
+ever see the stored columns.
+
+rebuild() recomputes every aggregate from the reviews in one set-based
+UPDATE, for backfills and repairs (see the rebuild_ratings command).
+"""
+
+from django.db.models import Count, F, FloatField, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Cast, Coalesce, NullIf, Round
+from django.utils import timezone
+
+from Mwaiseni import caching
+from users.models import Review
+
+from .models import Property
+
+
+def _average(rating_sum, review_count):
+    """Rounded rating_sum / review_count, 0 when there are no reviews"""
+    return Coalesce(
+        Round(Cast(rating_sum, FloatField()) / NullIf(review_count, Value(0)), 2),
+        Value(0.0),
+    )
+
+
+def _invalidate():
+    # update() bypasses the Property signals that normally do this
+    caching.invalidate_on_commit(caching.FEATURED_CACHE)
+
+
+def apply_review(property_id, rating_delta, count_delta):
+    """Add a review's rating (count_delta=1), remove it (-1) or change it (0)"""
+    if not (rating_delta or count_delta):
+        return
+    rating_sum = F('rating_sum') + rating_delta
+    review_count = F('review_count') + count_delta
+    Property.objects.filter(pk=property_id).update(
+        rating_sum=rating_sum,
+        review_count=review_count,
+        average_rating=_average(rating_sum, review_count),
+        updated_at=timezone.now(),
+    )
+    _invalidate()
+
+
+def rebuild_expressions(review_model):
+    """UPDATE values that recompute the aggregates from review_model's rows"""
+    reviews = (
+        review_model.objects.filter(booking__property=OuterRef('pk'))
+        .order_by().values('booking__property')
+    )
+    rating_sum = Coalesce(Subquery(reviews.annotate(total=Sum('rating')).values('total'),
+                                   output_field=IntegerField()), 0)
+    review_count = Coalesce(Subquery(reviews.annotate(n=Count('*')).values('n'),
+                                     output_field=IntegerField()), 0)
+    return {
+        'rating_sum': rating_sum,
+        'review_count': review_count,
+        'average_rating': _average(rating_sum, review_count),
+    }
+
+
+def rebuild(queryset=None):
+    """Recompute rating aggregates for queryset (default: every property)"""
+    queryset = Property.objects.all() if queryset is None else queryset
+    updated = queryset.update(updated_at=timezone.now(), **rebuild_expressions(Review))
+    _invalidate()
+    return updated
@@ -0,0 +1,106 @@
+"""
+Full-text property search.
+
+SQLite keeps an FTS5 index (properties_property_fts) in step with the
+property table through triggers; PostgreSQL keeps a weighted tsvector in a
+generated column with a GIN index. Both are created by migration 0003 and
+are updated by the database itself on every Property save, so there is no
+application code to forget.
+
+Search terms are reduced to plain word tokens, AND-ed together, and the last
+token is treated as a prefix so results follow the SearchBar as users type.
+"""
+
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Q
+from django.db.models.expressions import RawSQL
+from rest_framework import filters
+
+FTS_TABLE = 'properties_property_fts'
+TS_CONFIG = 'english'
+MAX_TERMS = 8
+
+# Column weights: title, description, address, city
+FTS5_WEIGHTS = '10.0, 1.0, 2.0, 5.0'
+
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    return _TOKEN.findall(text or '')[:MAX_TERMS]
+
+
+def fts5_query(tokens):
+    """'victoria fal' -> '"victoria" "fal"*'"""
+    quoted = [f'"{t}"' for t in tokens]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def tsquery(tokens):
+    """'victoria fal' -> 'victoria & fal:*'"""
+    return ' & '.join(tokens[:-1] + [tokens[-1] + ':*'])
+
+
+def supports_fulltext():
+    return connection.vendor in ('sqlite', 'postgresql')
+
+
+def search(queryset, text):
+    """Filter a Property queryset by full-text match and annotate `search_rank`.
+
+    Higher search_rank means more relevant. Falls back to icontains on
+    databases without a full-text index.
+    """
+    tokens = tokenize(text)
+    if not tokens:
+        return queryset
+
+    table = queryset.model._meta.db_table
+    if connection.vendor == 'sqlite':
+        # Join the FTS5 table directly: MATCH is evaluated once for the whole
+        # statement and bm25() (lower is better) is read off the same cursor.
+        # RawSQL can't express a join against a table Django doesn't model.
+        return queryset.extra(
+            tables=[FTS_TABLE],
+            where=[f'{FTS_TABLE}.rowid = "{table}"."id"', f'{FTS_TABLE} MATCH %s'],
+            params=[fts5_query(tokens)],
+            select={'search_rank': f'-bm25({FTS_TABLE}, {FTS5_WEIGHTS})'},
+        )
+
+    if connection.vendor == 'postgresql':
+        query = tsquery(tokens)
+        return queryset.filter(RawSQL(
+            f'"{table}"."search_vector" @@ to_tsquery(%s::regconfig, %s)',
+            [TS_CONFIG, query], output_field=BooleanField(),
+        )).annotate(search_rank=RawSQL(
+            f'ts_rank_cd("{table}"."search_vector", to_tsquery(%s::regconfig, %s))',
+            [TS_CONFIG, query], output_field=FloatField(),
+        ))
+
+    condition = Q()
+    for token in tokens:
+        condition &= (Q(title__icontains=token) | Q(description__icontains=token)
+                      | Q(address__icontains=token) | Q(city__icontains=token))
+    return queryset.filter(condition)
+
+
+class FullTextSearchFilter(filters.SearchFilter):
+    """Drop-in SearchFilter (?search=...) backed by the full-text index.
+
+    Results come back most relevant first unless the client asked for an
+    explicit ?ordering=, so list this backend after OrderingFilter.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        text = request.query_params.get(self.search_param, '')
+        if not tokenize(text):
+            return queryset
+
+        queryset = search(queryset, text)
+        ranked = 'search_rank' in queryset.query.annotations or 'search_rank' in queryset.query.extra
+        if ranked and not request.query_params.get('ordering'):
+            queryset = queryset.order_by('-search_rank', *(getattr(view, 'ordering', None) or []))
+        return queryset
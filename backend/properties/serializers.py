@@ -3,40 +3,70 @@
 Booking.com level property management system
 """
 
+from django.db.models import Case, CharField, F, Value, When
+from django.db.models.functions import Concat
 from rest_framework import serializers
+from Mwaiseni.row_serializers import RowSerializer
+from Mwaiseni.sparse_fields import SparseFieldsSerializerMixin
 from .models import Property
+from .bulk_inventory import MAX_RULE_DAYS, UPSERT_FIELDS, WEEKDAYS
 from django.contrib.auth import get_user_model
+from users.models import RoomType
 
 User = get_user_model()
 
+AMENITIES = [('has_wifi', 'WiFi'), ('has_parking', 'Parking'), ('has_pool', 'Pool'), ('has_ac', 'AC')]
+QUOTE_MONEY = ('nightly_total', 'cleaning_fee', 'total')
+# What pricing.quote_stays() reads from each row
+QUOTE_COLUMNS = ['id', 'max_guests', 'price_per_night', 'cleaning_fee', 'currency']
+
+
+def amenities(row):
+    """"WiFi, Pool" for a dict row of the has_* columns"""
+    return ", ".join(label for column, label in AMENITIES if row[column])
+
+
+def stay_quote(quote):
+    """A pricing.quote_stays() quote with its money as DecimalField strings"""
+    if quote is None:
+        return None
+    money = serializers.DecimalField(max_digits=12, decimal_places=2)
+    return {key: money.to_representation(value) if key in QUOTE_MONEY else value
+            for key, value in quote.items()}
+
 
 class SimpleUserSerializer(serializers.ModelSerializer):
     """Simple user serializer for property listings"""
     
     class Meta:
         model = User
-        fields = ['id', 'username', 'first_name', 'last_name', 'email']
+        fields = ['id', 'first_name', 'last_name', 'email']
         read_only_fields = fields
 
 
-class PropertySerializer(serializers.ModelSerializer):
+class PropertySerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     """Main Property Serializer - Booking.com Level"""
     
     host = SimpleUserSerializer(read_only=True)
+    stay_quote = serializers.SerializerMethodField()
     
     class Meta:
         model = Property
         fields = [
             'id', 'title', 'description', 'property_type', 'price_per_night',
             'bedrooms', 'bathrooms', 'max_guests', 'address', 'city',
-            'country', 'latitude', 'longitude', 
+            'latitude', 'longitude', 'currency', 'cleaning_fee',
             'has_wifi', 'has_parking', 'has_pool', 'has_ac', 'has_kitchen',
-            'has_tv', 'has_washer', 'has_breakfast', 'instant_book',
-            'average_rating', 'review_count',
-            'is_available', 'available_from', 'available_to',
-            'host', 'created_at', 'updated_at'
+            'instant_book', 'average_rating', 'review_count', 'is_available',
+            'host', 'created_at', 'updated_at', 'stay_quote'
         ]
         read_only_fields = ['average_rating', 'review_count', 'created_at', 'updated_at', 'host']
+        # Columns behind the method fields, for ?fields= (Mwaiseni/sparse_fields.py)
+        field_columns = {'stay_quote': QUOTE_COLUMNS}
+    
+    def get_stay_quote(self, obj):
+        """Total for the searched stay (see pricing.quote_stays), or None without one"""
+        return stay_quote((self.context.get('stay_quotes') or {}).get(obj.pk))
     
     def create(self, validated_data):
         """Automatically set host to current user"""
@@ -44,7 +74,7 @@ class PropertySerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
-class PropertyListSerializer(serializers.ModelSerializer):
+class PropertyListSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     """Property List View Serializer"""
     
     host_name = serializers.SerializerMethodField()
@@ -53,23 +83,98 @@ class PropertyListSerializer(serializers.ModelSerializer):
     class Meta:
         model = Property
         fields = [
-            'id', 'title', 'property_type', 'city', 'country',
+            'id', 'title', 'property_type', 'city', 'currency',
             'price_per_night', 'bedrooms', 'bathrooms',
             'average_rating', 'review_count',
             'has_wifi', 'has_parking', 'has_pool',
             'instant_book', 'host_name', 'amenities',
             'is_available'
         ]
+        field_columns = {
+            'host_name': ['host__first_name', 'host__last_name', 'host__email'],
+            'amenities': [column for column, _ in AMENITIES],
+        }
     
     def get_host_name(self, obj):
         """Get host's full name"""
-        return f"{obj.host.first_name} {obj.host.last_name}" if obj.host.first_name else obj.host.username
+        return f"{obj.host.first_name} {obj.host.last_name}" if obj.host.first_name else obj.host.email
     
     def get_amenities(self, obj):
         """Generate amenities list"""
-        amenities = []
-        if obj.has_wifi: amenities.append("WiFi")
-        if obj.has_parking: amenities.append("Parking")
-        if obj.has_pool: amenities.append("Pool")
-        if obj.has_ac: amenities.append("AC")
-        return ", ".join(amenities)
+        return amenities({column: getattr(obj, column) for column, _ in AMENITIES})
+
+
+# get_host_name() in SQL, for the row serializers
+HOST_NAME = Case(
+    When(host__first_name='', then=F('host__email')),
+    default=Concat('host__first_name', Value(' '), 'host__last_name'),
+    output_field=CharField(),
+)
+
+
+class PropertyListRowSerializer(RowSerializer):
+    """PropertyListSerializer output from values() rows, for list responses"""
+    
+    serializer_class = PropertyListSerializer
+    annotations = {'host_name': HOST_NAME}
+    
+    def get_amenities(self, row):
+        return amenities(row)
+
+
+class PropertyRowSerializer(RowSerializer):
+    """PropertySerializer output from values() rows, for search responses"""
+    
+    serializer_class = PropertySerializer
+    
+    def get_stay_quote(self, row):
+        return stay_quote((self.context.get('stay_quotes') or {}).get(row['id']))
+
+
+class RoomTypeAvailabilitySerializer(serializers.Serializer):
+    """One room type of calendar.room_type_availability()"""
+    
+    room_type = serializers.IntegerField()
+    name = serializers.CharField()
+    capacity = serializers.IntegerField()
+    free = serializers.BooleanField()
+    first_free_check_in = serializers.DateField(allow_null=True)
+    nightly_rates = serializers.ListField(child=serializers.DecimalField(max_digits=12, decimal_places=2))
+
+
+class AvailabilityRuleSerializer(serializers.Serializer):
+    """One partner calendar rule: a room type, an inclusive date range, optional
+    weekdays ('mon'..'sun') and the values to set on those nights"""
+
+    # Resolved to RoomType instances for all rules at once by BulkAvailabilitySerializer
+    room_type = serializers.IntegerField()
+    start = serializers.DateField()
+    end = serializers.DateField()
+    weekdays = serializers.ListField(child=serializers.ChoiceField(choices=WEEKDAYS), required=False,
+                                     allow_empty=False)
+    available_rooms = serializers.IntegerField(min_value=0, required=False)
+    price_override = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0,
+                                              required=False, allow_null=True)
+
+    def validate(self, attrs):
+        if attrs['end'] < attrs['start']:
+            raise serializers.ValidationError({'end': 'end must not be before start'})
+        if (attrs['end'] - attrs['start']).days >= MAX_RULE_DAYS:
+            raise serializers.ValidationError({'end': f'A rule can span at most {MAX_RULE_DAYS} days'})
+        if not any(field in attrs for field in UPSERT_FIELDS):
+            raise serializers.ValidationError('Set available_rooms and/or price_override')
+        return attrs
+
+
+class BulkAvailabilitySerializer(serializers.Serializer):
+    """Rules for one property's room types; pass the property as context['property']"""
+
+    rules = AvailabilityRuleSerializer(many=True, allow_empty=False)
+
+    def validate_rules(self, rules):
+        room_types = RoomType.objects.filter(property=self.context['property']) \
+            .in_bulk({rule['room_type'] for rule in rules})
+        unknown = sorted({rule['room_type'] for rule in rules} - set(room_types))
+        if unknown:
+            raise serializers.ValidationError(f'Unknown room types for this property: {unknown}')
+        return [dict(rule, room_type=room_types[rule['room_type']]) for rule in rules]
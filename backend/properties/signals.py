@@ -1,3 +1,78 @@
-# Signals for properties app (if needed later)
-# This file is created to prevent import errors
-# You can add signal handlers here when needed
+"""
+Signal handlers for the properties app.
+
+Connected in PropertiesConfig.ready().
+"""
+
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from Mwaiseni import caching
+from users.models import Availability, Booking, Review, RoomType, User
+
+from . import calendar, ratings
+from .models import Property
+
+# Host fields embedded in cached property payloads
+HOST_DISPLAY_FIELDS = {'first_name', 'last_name', 'email'}
+
+
+@receiver(post_save, sender=Property)
+@receiver(post_delete, sender=Property)
+def invalidate_featured(sender, **kwargs):
+    caching.invalidate_on_commit(caching.FEATURED_CACHE)
+
+
+@receiver(post_save, sender=User)
+def invalidate_featured_host(sender, update_fields=None, **kwargs):
+    # Logins save last_login only; don't throw the cache away for those
+    if update_fields is None or HOST_DISPLAY_FIELDS & set(update_fields):
+        caching.invalidate_on_commit(caching.FEATURED_CACHE)
+
+
+@receiver(post_save, sender=Availability)
+@receiver(post_delete, sender=Availability)
+@receiver(post_delete, sender=RoomType)
+def drop_room_type_calendar(sender, instance, **kwargs):
+    calendar.invalidate_on_commit([instance.pk if sender is RoomType else instance.room_type_id])
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+def drop_property_calendars(sender, instance, **kwargs):
+    """Bookings move inventory for the whole property, so reload its calendars"""
+    room_type_ids = RoomType.objects.filter(property_id=instance.property_id).values_list('pk', flat=True)
+    calendar.invalidate_on_commit(room_type_ids)
+
+
+@receiver(pre_save, sender=Review)
+def remember_previous_rating(sender, instance, **kwargs):
+    """Edits need the stored rating and property to apply the difference"""
+    instance._rating_before = None
+    if instance.pk is not None:
+        instance._rating_before = (
+            Review.objects.filter(pk=instance.pk)
+            .values_list('rating', 'booking__property_id').first()
+        )
+
+
+@receiver(post_save, sender=Review)
+def count_review(sender, instance, created, **kwargs):
+    property_id = instance.booking.property_id
+    before = getattr(instance, '_rating_before', None)
+    if before is None:
+        ratings.apply_review(property_id, instance.rating, 1)
+    elif before[1] == property_id:
+        ratings.apply_review(property_id, instance.rating - before[0], 0)
+    else:
+        # Moved to another booking's property
+        ratings.apply_review(before[1], -before[0], -1)
+        ratings.apply_review(property_id, instance.rating, 1)
+
+
+@receiver(post_delete, sender=Review)
+def uncount_review(sender, instance, **kwargs):
+    property_id = Booking.objects.filter(pk=instance.booking_id).values_list('property_id', flat=True).first()
+    # None when the booking is already gone with its property
+    if property_id is not None:
+        ratings.apply_review(property_id, -instance.rating, -1)
@@ -1,3 +1,883 @@
-from django.test import TestCase
+import math
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path, reverse
+
+from Mwaiseni.fastjson import UJSONRenderer
+from Mwaiseni.static_files import StaticFilesMiddleware
+from Mwaiseni.testing import QueryBudgetTestCase
+from users.models import Availability, Booking, Review, RoomType, User
+
+from . import async_views, calendar, geo, search
+from .availability import filter_available
+from .models import Property
+from .pricing import quote_stays
+from .serializers import PropertyListRowSerializer, PropertyListSerializer, PropertyRowSerializer, PropertySerializer
+
+
+def make_property(host, **kwargs):
+    fields = dict(
+        title='Falls View Lodge', description='Near Victoria Falls', property_type='lodge',
+        address='Mosi-oa-Tunya Road', city='livingstone', price_per_night=850,
+        bedrooms=2, bathrooms=1, max_guests=4, average_rating=4.5,
+        latitude=-17.9243, longitude=25.8572,
+    )
+    fields.update(kwargs)
+    return Property.objects.create(host=host, **fields)
+
+
+class PropertyQueryBudgetTests(QueryBudgetTestCase):
+    """Query counts for PropertyViewSet must not grow with the number of rows"""
+
+    ROWS = 30
+
+    @classmethod
+    def setUpTestData(cls):
+        today = date.today()
+        for i in range(cls.ROWS):
+            host = User.objects.create_user(email=f'host{i}@mwaiseni.test', password=None,
+                                            first_name='Host', last_name=str(i))
+            prop = make_property(host, title=f'Falls View Lodge {i}')
+            room = RoomType.objects.create(property=prop, name='Double', price_per_night=850, capacity=2)
+            Availability.objects.bulk_create(
+                Availability(room_type=room, date=today + timedelta(days=d), available_rooms=1)
+                for d in range(3)
+            )
+        cls.property = prop
+        cls.today = today
+
+    def setUp(self):
+        cache.clear()
+
+    def test_list(self):
+        response = self.assertQueryBudget(1, reverse('property-list'))
+        self.assertEqual(len(response.data['results']), 20)
+
+    def test_list_next_page(self):
+        first = self.client.get(reverse('property-list'))
+        self.assertQueryBudget(1, first.data['next'])
+
+    def test_list_by_distance(self):
+        self.assertQueryBudget(1, reverse('property-list'),
+                               data={'near': '-17.92,25.85', 'radius_km': 10, 'ordering': 'distance_km'})
+
+    def test_detail(self):
+        self.assertQueryBudget(1, reverse('property-detail', args=[self.property.pk]))
+
+    def test_featured(self):
+        response = self.assertQueryBudget(1, reverse('property-featured'))
+        self.assertEqual(len(response.data), 10)
+
+    # Search pages also carry the facets block (one aggregate query), and stay
+    # searches price the page's room types (one grouped query)
+
+    def test_search(self):
+        self.assertQueryBudget(2, reverse('property-search'), data={'search': 'falls'})
+
+    def test_search_with_stay(self):
+        check_out = self.today + timedelta(days=2)
+        response = self.assertQueryBudget(3, reverse('property-search'), data={
+            'check_in': self.today.isoformat(), 'check_out': check_out.isoformat(), 'guests': 2,
+        })
+        self.assertEqual(len(response.data['results']), 20)
+
+
+class KeysetPaginationTests(QueryBudgetTestCase):
+    """Cursors over an ordering whose leading key has ties"""
+
+    PRICES = [500, 500, 500, 850, 850, 850, 1200]
+
+    @classmethod
+    def setUpTestData(cls):
+        host = User.objects.create_user(email='host@mwaiseni.test', password=None)
+        cls.properties = [make_property(host, title=f'Lodge {i}', price_per_night=price)
+                          for i, price in enumerate(cls.PRICES)]
+        cls.url = reverse('property-list')
+
+    def ids(self, response):
+        return [row['id'] for row in response.data['results']]
+
+    def test_pages_walk_across_equal_prices(self):
+        response = self.client.get(self.url, {'ordering': 'price_per_night', 'page_size': 2})
+        seen = self.ids(response)
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            seen += self.ids(response)
+        expected = sorted(self.properties, key=lambda prop: (prop.price_per_night, prop.pk))
+        self.assertEqual(seen, [prop.pk for prop in expected])
+
+    def test_previous_link(self):
+        first = self.client.get(self.url, {'ordering': '-price_per_night', 'page_size': 2})
+        self.assertIsNone(first.data['previous'])
+        second = self.client.get(first.data['next'])
+        third = self.client.get(second.data['next'])
+        self.assertEqual(self.ids(self.client.get(third.data['previous'])), self.ids(second))
+        self.assertEqual(self.ids(self.client.get(second.data['previous'])), self.ids(first))
+
+    def test_cursor_from_another_ordering(self):
+        first = self.client.get(self.url, {'ordering': 'price_per_night', 'page_size': 2})
+        cursor = first.data['next'].split('cursor=')[1]
+        response = self.client.get(self.url, {'ordering': '-created_at', 'cursor': cursor})
+        self.assertEqual(response.status_code, 404)
+
+    def test_malformed_cursor(self):
+        for cursor in ('not-a-cursor', 'e30=', 'eyJrIjoxfQ=='):
+            with self.subTest(cursor=cursor):
+                self.assertEqual(self.client.get(self.url, {'cursor': cursor}).status_code, 404)
+
+
+class FilterAvailableTests(QueryBudgetTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        host = User.objects.create_user(email='host@mwaiseni.test', password=None)
+        cls.check_in = date.today() + timedelta(days=5)
+
+        def listing(title, capacity=2, rooms=(1, 1, 1)):
+            prop = make_property(host, title=title)
+            room = RoomType.objects.create(property=prop, name='Double', price_per_night=850, capacity=capacity)
+            Availability.objects.bulk_create(
+                Availability(room_type=room, date=cls.check_in + timedelta(days=d), available_rooms=free)
+                for d, free in enumerate(rooms) if free is not None
+            )
+            return prop
+
+        cls.free = listing('Free every night')
+        cls.sold_out = listing('Sold out on the second night', rooms=(1, 0, 1))
+        cls.small = listing('Sleeps one', capacity=1)
+        cls.partial = listing('No calendar for the last night', rooms=(1, 1, None))
+        # Several room types, none free for the whole stay on its own
+        cls.split = listing('Split across room types', rooms=(1, 0, 0))
+        other = RoomType.objects.create(property=cls.split, name='Twin', price_per_night=700, capacity=2)
+        Availability.objects.bulk_create(
+            Availability(room_type=other, date=cls.check_in + timedelta(days=d), available_rooms=1) for d in (1, 2)
+        )
+
+    def available(self, nights=3, guests=2, offset=0):
+        check_in = self.check_in + timedelta(days=offset)
+        return set(filter_available(Property.objects.all(), check_in, check_in + timedelta(days=nights), guests))
+
+    def test_whole_stay_on_one_room_type(self):
+        self.assertEqual(self.available(), {self.free})
+
+    def test_guests_must_fit(self):
+        self.assertEqual(self.available(guests=1), {self.free, self.small})
+        self.assertEqual(self.available(guests=3), set())
+
+    def test_only_the_nights_of_the_stay_count(self):
+        # check_out is exclusive: a 2-night stay never reads the third night
+        self.assertEqual(self.available(nights=2), {self.free, self.partial})
+        self.assertEqual(self.available(nights=2, offset=1), {self.free, self.split})
+        self.assertEqual(self.available(nights=1, offset=2), {self.free, self.sold_out, self.split})
+        # Nights with no calendar rows are not bookable
+        self.assertEqual(self.available(nights=3, offset=1), set())
+
+
+class SearchFacetTests(QueryBudgetTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        host = User.objects.create_user(email='host@mwaiseni.test', password=None,
+                                        first_name='Host', last_name='One')
+        make_property(host, city='lusaka', property_type='apartment', price_per_night=450, has_wifi=True)
+        make_property(host, city='lusaka', property_type='hotel', price_per_night=1200,
+                      has_wifi=True, has_pool=True)
+        make_property(host, city='livingstone', price_per_night=2500, has_pool=True)
+
+    def test_counts_follow_the_filters(self):
+        response = self.client.get(reverse('property-search'), {'city': 'lusaka'})
+        facets = response.data['facets']
+        self.assertEqual(facets['total'], 2)
+        self.assertEqual(facets['city']['lusaka'], 2)
+        self.assertEqual(facets['city']['livingstone'], 0)
+        self.assertEqual(facets['property_type']['apartment'], 1)
+        self.assertEqual(facets['property_type']['hotel'], 1)
+        self.assertEqual(facets['amenities']['has_wifi'], 2)
+        self.assertEqual(facets['amenities']['has_pool'], 1)
+        self.assertEqual([bucket['count'] for bucket in facets['price']], [1, 0, 1, 0])
+
+    def test_full_text_search_narrows_facets(self):
+        response = self.client.get(reverse('property-search'), {'search': 'falls', 'max_price': 1000})
+        self.assertEqual(response.data['facets']['total'], 1)
+
+
+class FullTextSearchTests(QueryBudgetTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create_user(email='host@mwaiseni.test', password=None)
+        cls.lodge = make_property(cls.host, title='Zambezi Sunset Lodge', description='On the river',
+                                  price_per_night=1500)
+        cls.cottage = make_property(cls.host, title='Garden Cottage', description='A short drive to the Zambezi',
+                                    price_per_night=600)
+
+    def matches(self, text):
+        return set(search.search(Property.objects.all(), text).values_list('pk', flat=True))
+
+    def test_index_follows_writes(self):
+        self.assertEqual(self.matches('zambezi'), {self.lodge.pk, self.cottage.pk})
+        self.lodge.title = 'Kafue Sunset Lodge'
+        self.lodge.save()
+        self.assertEqual(self.matches('kafue'), {self.lodge.pk})
+        self.assertEqual(self.matches('zambezi'), {self.cottage.pk})
+        Property.objects.filter(pk=self.cottage.pk).update(description='Walking distance to town')
+        self.assertEqual(self.matches('zambezi'), set())
+        self.cottage.delete()
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT rowid FROM {search.FTS_TABLE}')
+            self.assertEqual([row for row, in cursor.fetchall()], [self.lodge.pk])
+
+    def test_last_token_is_a_prefix(self):
+        self.assertEqual(self.matches('sunset lod'), {self.lodge.pk})
+        self.assertEqual(self.matches('lod sunset'), set())
+
+    def test_ranked_unless_ordered(self):
+        url = reverse('property-list')
+        response = self.client.get(url, {'search': 'zambezi'})
+        # A title match outranks a description match
+        self.assertEqual([row['id'] for row in response.data['results']], [self.lodge.pk, self.cottage.pk])
+        response = self.client.get(url, {'search': 'zambezi', 'ordering': 'price_per_night'})
+        self.assertEqual([row['id'] for row in response.data['results']], [self.cottage.pk, self.lodge.pk])
+
+    def test_operator_and_punctuation_input(self):
+        for text in ('NEAR(', '"zambezi', 'zambezi AND', 'NOT zambezi*', '^:-)', '()"'):
+            for name in ('property-list', 'property-search'):
+                with self.subTest(text=text, url=name):
+                    response = self.client.get(reverse(name), {'search': text})
+                    self.assertEqual(response.status_code, 200)
+                    self.assertIsInstance(response.data['results'], list)
+
+
+class StayQuoteTests(QueryBudgetTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        host = User.objects.create_user(email='host@mwaiseni.test', password=None)
+        cls.lodge = make_property(host, cleaning_fee=100)
+        cls.check_in = date.today() + timedelta(days=3)
+        cls.suite = RoomType.objects.create(property=cls.lodge, name='Suite', price_per_night=900, capacity=4)
+        cls.double = RoomType.objects.create(property=cls.lodge, name='Double', price_per_night=500, capacity=2)
+        for room_type in (cls.suite, cls.double):
+            Availability.objects.bulk_create(
+                Availability(room_type=room_type, date=cls.check_in + timedelta(days=d), available_rooms=1,
+                             price_override=650 if d == 0 and room_type == cls.double else None)
+                for d in range(2)
+            )
+        cls.unlisted = make_property(host, price_per_night=300, cleaning_fee=50, max_guests=2)
+
+    def search(self, guests=2, **headers):
+        return self.client.get(reverse('property-search'), {
+            'check_in': self.check_in.isoformat(),
+            'check_out': (self.check_in + timedelta(days=2)).isoformat(), 'guests': guests,
+        }, **headers)
+
+    def test_cheapest_room_type_that_fits(self):
+        quote = self.search().data['results'][0]['stay_quote']
+        self.assertEqual(quote, {'nights': 2, 'room_type': self.double.pk, 'nightly_total': '1150.00',
+                                 'cleaning_fee': '100.00', 'total': '1250.00', 'currency': 'ZMW'})
+        self.assertEqual(self.search(guests=3).data['results'][0]['stay_quote']['room_type'], self.suite.pk)
+
+    def test_listing_without_room_types_uses_its_own_rate(self):
+        check_out = self.check_in + timedelta(days=2)
+        quotes = quote_stays([self.lodge, self.unlisted], self.check_in, check_out, guests=2)
+        self.assertEqual(quotes[self.unlisted.pk]['total'], Decimal('650'))
+        self.assertIsNone(quote_stays([self.lodge], self.check_in, check_out, guests=5)[self.lodge.pk])
+
+    def test_rate_changes_invalidate_the_etag(self):
+        etag = self.search()['ETag']
+        Availability.objects.filter(room_type=self.double).update(price_override=400)
+        response = self.search(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['stay_quote']['total'], '900.00')
+
+
+class RatingAggregateTests(QueryBudgetTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        host = User.objects.create_user(email='host@mwaiseni.test', password=None)
+        cls.guest = User.objects.create_user(email='guest@mwaiseni.test', password=None)
+        cls.lodge = make_property(host, average_rating=0)
+
+    def setUp(self):
+        cache.clear()
+
+    def review(self, rating, prop=None):
+        booking = Booking.objects.create(property=prop or self.lodge, guest=self.guest, check_in=date.today(),
+                                         check_out=date.today() + timedelta(days=1), total_price=850)
+        return Review.objects.create(booking=booking, rating=rating, comment='')
+
+    def aggregates(self, prop=None):
+        prop = Property.objects.get(pk=(prop or self.lodge).pk)
+        return prop.rating_sum, prop.review_count, prop.average_rating
+
+    def test_create_edit_delete(self):
+        self.review(5)
+        review = self.review(4)
+        self.review(4)
+        self.assertEqual(self.aggregates(), (13, 3, Decimal('4.33')))
+        review.rating = 1
+        review.save()
+        self.assertEqual(self.aggregates(), (10, 3, Decimal('3.33')))
+        Review.objects.all().delete()
+        self.assertEqual(self.aggregates(), (0, 0, Decimal('0')))
+
+    def test_min_rating_and_featured_follow_reviews(self):
+        self.review(5)
+        self.assertEqual(len(self.client.get(reverse('property-featured')).data), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.review(1)
+        self.assertEqual(self.client.get(reverse('property-featured')).data, [])
+        response = self.client.get(reverse('property-list'), {'min_rating': 3.5})
+        self.assertEqual(response.data['results'], [])
+
+    def test_rebuild_command_repairs_drift(self):
+        self.review(3)
+        self.review(4)
+        Property.objects.filter(pk=self.lodge.pk).update(rating_sum=0, review_count=9, average_rating=1)
+        call_command('rebuild_ratings', stdout=StringIO())
+        self.assertEqual(self.aggregates(), (7, 2, Decimal('3.5')))
+
+
+class FeaturedCacheTests(QueryBudgetTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create_user(email='host@mwaiseni.test', password=None,
+                                            first_name='Host', last_name='One')
+        cls.property = make_property(cls.host)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_repeat_hits_are_served_from_cache(self):
+        url = reverse('property-featured')
+        self.client.get(url)
+        self.assertQueryBudget(0, url)
+
+    def test_property_save_invalidates(self):
+        url = reverse('property-featured')
+        self.assertEqual(len(self.client.get(url).data), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            make_property(self.host, title='Kafue River Camp')
+            # Still cached until the transaction commits
+            self.assertEqual(len(self.client.get(url).data), 1)
+        self.assertEqual(len(self.client.get(url).data), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.property.is_available = False
+            self.property.save()
+        titles = [p['title'] for p in self.client.get(url).data]
+        self.assertEqual(titles, ['Kafue River Camp'])
+
+
+class ConditionalGetTests(QueryBudgetTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        host = User.objects.create_user(email='host@mwaiseni.test', password=None,
+                                        first_name='Host', last_name='One')
+        cls.properties = [make_property(host, title=f'Lodge {i}') for i in range(3)]
+
+    def test_unchanged_list_revalidates_with_one_query(self):
+        url = reverse('property-list')
+        etag = self.client.get(url)['ETag']
+        response = self.assertQueryBudget(1, url, status_code=304, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_edit_changes_etag(self):
+        url = reverse('property-detail', args=[self.properties[0].pk])
+        etag = self.client.get(url)['ETag']
+        self.properties[0].title = 'Renamed Lodge'
+        self.properties[0].save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_unchanged_search_revalidates_without_facets(self):
+        url = reverse('property-search')
+        etag = self.client.get(url, {'search': 'lodge'})['ETag']
+        with CaptureQueriesContext(connection) as context:
+            response = self.assertQueryBudget(2, url, data={'search': 'lodge'}, status_code=304,
+                                              HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response['ETag'], etag)
+        self.assertFalse([q for q in context.captured_queries if 'city__' in q['sql']])
+
+    def test_changes_off_the_page_change_the_search_etag(self):
+        url, params = reverse('property-search'), {'page_size': 1, 'ordering': 'title'}
+        etag = self.client.get(url, params)['ETag']
+        self.properties[2].city = 'lusaka'
+        self.properties[2].save()
+        response = self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['facets']['city']['lusaka'], 1)
+        etag = response['ETag']
+        self.properties[1].delete()
+        self.assertEqual(self.client.get(url, params, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_query_params_are_part_of_the_etag(self):
+        url = reverse('property-search')
+        etag = self.client.get(url, {'search': 'lodge'})['ETag']
+        response = self.client.get(url, {'search': 'lodge', 'ordering': 'price_per_night'},
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
+# The project URLconf as ASYNC_VIEWS=True builds it
+urlpatterns = [
+    path('api/properties/properties/', async_views.property_list, name='property-list'),
+    path('api/properties/properties/search/', async_views.property_search, name='property-search'),
+    path('api/properties/properties/featured/', async_views.property_featured, name='property-featured'),
+    path('api/properties/properties/<pk>/', async_views.property_detail, name='property-detail'),
+    path('', include('Mwaiseni.urls')),
+]
+
+
+class RowSerializerTests(QueryBudgetTestCase):
+    """values()-row serializers must render byte for byte like the model serializers"""
+
+    @classmethod
+    def setUpTestData(cls):
+        hosts = [
+            User.objects.create_user(email='named@mwaiseni.test', password=None, first_name='Mutale', last_name='Banda'),
+            User.objects.create_user(email='first@mwaiseni.test', password=None, first_name='Chipo'),
+            User.objects.create_user(email='anon@mwaiseni.test', password=None, last_name='Phiri'),
+        ]
+        for i, host in enumerate(hosts * 2):
+            make_property(host, title=f'Lodge \u00e9 {i}', price_per_night=Decimal('850.5') + i * 1000,
+                          cleaning_fee=i * 25, average_rating=Decimal('4.25') - Decimal(i) / 2, review_count=i,
+                          has_wifi=i % 2 == 0, has_parking=i % 3 == 0, has_pool=i == 4, has_ac=i > 2,
+                          latitude=None if i == 1 else -15.4167, city='lusaka' if i % 2 else 'livingstone')
+        cls.check_in = date.today() + timedelta(days=1)
+        cls.check_out = cls.check_in + timedelta(days=2)
+
+    def render(self, data):
+        return UJSONRenderer().render(data)
+
+    def test_list_rows(self):
+        instances = Property.objects.select_related('host').order_by('id')
+        rows = list(PropertyListRowSerializer.values(Property.objects.order_by('id')))
+        self.assertEqual(self.render(PropertyListRowSerializer(rows, many=True).data),
+                         self.render(PropertyListSerializer(instances, many=True).data))
+        host_names = [row['host_name'] for row in rows[:3]]
+        self.assertEqual(host_names, ['Mutale Banda', 'Chipo ', 'anon@mwaiseni.test'])
+
+    def test_search_rows_with_stay_quotes(self):
+        instances = list(Property.objects.select_related('host').order_by('id'))
+        rows = list(PropertyRowSerializer.values(Property.objects.order_by('id')))
+        expected = PropertySerializer(instances, many=True, context={
+            'stay_quotes': quote_stays(instances, self.check_in, self.check_out, guests=3)})
+        data = PropertyRowSerializer(rows, many=True, context={
+            'stay_quotes': quote_stays(rows, self.check_in, self.check_out, guests=3)})
+        self.assertEqual(self.render(data.data), self.render(expected.data))
+
+    def test_list_view(self):
+        response = self.assertQueryBudget(1, reverse('property-list'), data={'ordering': 'price_per_night'})
+        instances = Property.objects.select_related('host').order_by('price_per_night', 'id')
+        self.assertEqual(self.render(response.data['results']),
+                         self.render(PropertyListSerializer(instances, many=True).data))
+
+
+class SparseFieldsTests(QueryBudgetTestCase):
+    """?fields= and ?expand= narrow both the payload and the SQL"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create_user(email='host@mwaiseni.test', password=None,
+                                            first_name='Host', last_name='One')
+        cls.property = make_property(cls.host, has_wifi=True)
+        cls.check_in = date.today() + timedelta(days=1)
+        room = RoomType.objects.create(property=cls.property, name='Double', price_per_night=850, capacity=2)
+        Availability.objects.bulk_create(
+            Availability(room_type=room, date=cls.check_in + timedelta(days=d), available_rooms=1) for d in range(2)
+        )
+
+    def get(self, url, params):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response, '\n'.join(q['sql'] for q in context.captured_queries)
+
+    def test_list_fields(self):
+        response, sql = self.get(reverse('property-list'), {'fields': 'id,title,price_per_night'})
+        self.assertEqual(list(response.data['results'][0]), ['id', 'title', 'price_per_night'])
+        self.assertNotIn('users_user', sql)
+        self.assertNotIn('"description"', sql)
+        response, sql = self.get(reverse('property-list'), {'fields': 'title,host_name,amenities'})
+        self.assertEqual(response.data['results'][0], {'title': 'Falls View Lodge', 'host_name': 'Host One',
+                                                       'amenities': 'WiFi'})
+        self.assertIn('users_user', sql)
+
+    def test_detail_expand(self):
+        url = reverse('property-detail', args=[self.property.pk])
+        response, sql = self.get(url, {'fields': 'title,host'})
+        self.assertEqual(response.data['host']['email'], 'host@mwaiseni.test')
+        response, sql = self.get(url, {'fields': 'title,host', 'expand': ''})
+        self.assertEqual(response.json(), {'title': 'Falls View Lodge', 'host': str(self.host.pk)})
+        self.assertNotIn('users_user', sql)
+        self.assertNotIn('"description"', sql)
+
+    def test_search_without_stay_quote_skips_pricing(self):
+        stay = {'check_in': self.check_in.isoformat(), 'check_out': (self.check_in + timedelta(days=2)).isoformat()}
+        response = self.assertQueryBudget(2, reverse('property-search'), data=dict(stay, fields='id,title'))
+        self.assertEqual(list(response.data['results'][0]), ['id', 'title'])
+        response = self.client.get(reverse('property-search'), dict(stay, fields='stay_quote', expand=''))
+        self.assertEqual(response.data['results'][0]['stay_quote']['total'], '1700.00')
+
+    def test_full_text_search_with_fields(self):
+        # The SQLite rank is an extra() select, not a field .only() can take
+        response, _ = self.get(reverse('property-search'), {'search': 'lodge', 'fields': 'id,title'})
+        self.assertEqual(response.data['results'], [{'id': self.property.pk, 'title': 'Falls View Lodge'}])
+        response, _ = self.get(reverse('property-list'), {'search': 'lodge', 'fields': 'title'})
+        self.assertEqual(response.data['results'], [{'title': 'Falls View Lodge'}])
+
+    def test_featured_cache_per_selection(self):
+        self.assertIn('host', self.client.get(reverse('property-featured')).data[0])
+        self.assertEqual(list(self.client.get(reverse('property-featured'), {'fields': 'title'}).data[0]), ['title'])
+        self.assertIn('host', self.client.get(reverse('property-featured')).data[0])
+
+    def test_unknown_names(self):
+        response = self.client.get(reverse('property-list'), {'fields': 'title,secret'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('secret', response.data['fields'])
+        response = self.client.get(reverse('property-detail', args=[self.property.pk]), {'expand': 'title'})
+        self.assertEqual(response.status_code, 400)
+
+
+class AsyncViewTests(QueryBudgetTestCase):
+    """The ASGI views must answer exactly like the WSGI viewset"""
+
+    @classmethod
+    def setUpTestData(cls):
+        today = date.today()
+        cls.host = User.objects.create_user(email='host@mwaiseni.test', password=None,
+                                            first_name='Host', last_name='One')
+        cls.properties = [make_property(cls.host, title=f'Lodge {i}', price_per_night=500 + i)
+                          for i in range(5)]
+        room = RoomType.objects.create(property=cls.properties[0], name='Double',
+                                       price_per_night=700, capacity=2)
+        Availability.objects.bulk_create(
+            Availability(room_type=room, date=today + timedelta(days=d), available_rooms=1)
+            for d in range(1, 5)
+        )
+        cls.stay = {'check_in': (today + timedelta(days=1)).isoformat(),
+                    'check_out': (today + timedelta(days=3)).isoformat()}
+
+    async def async_get(self, url, params=None, **extra):
+        with override_settings(ROOT_URLCONF=__name__):
+            return await self.async_client.get(url, params or {}, **extra)
+
+    async def assertSameResponse(self, url, params=None):
+        response = await self.async_get(url, params)
+        expected = await sync_to_async(self.client.get)(url, params or {})
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(response.json(), expected.json())
+        self.assertEqual(response.get('ETag'), expected.get('ETag'))
+        return response
+
+    async def test_list_and_pages(self):
+        params = {'page_size': 2, 'ordering': 'price_per_night'}
+        response = await self.assertSameResponse(reverse('property-list'), params)
+        cursor = response.json()['next'].split('cursor=')[1]
+        await self.assertSameResponse(reverse('property-list'), dict(params, cursor=cursor))
+
+    async def test_search_with_facets_and_stay(self):
+        response = await self.assertSameResponse(reverse('property-search'), self.stay)
+        self.assertEqual(response.json()['results'][0]['stay_quote']['nightly_total'], '1400.00')
+        await self.assertSameResponse(reverse('property-search'),
+                                      {'check_in': self.stay['check_out'], 'check_out': self.stay['check_in']})
+
+    async def test_sparse_fields(self):
+        await self.assertSameResponse(reverse('property-list'), {'fields': 'id,title', 'ordering': 'price_per_night'})
+        await self.assertSameResponse(reverse('property-search'), dict(self.stay, fields='title,stay_quote'))
+        await self.assertSameResponse(reverse('property-detail', args=[self.properties[0].pk]),
+                                      {'fields': 'title,host', 'expand': ''})
+
+    async def test_detail_and_missing(self):
+        await self.assertSameResponse(reverse('property-detail', args=[self.properties[0].pk]))
+        await self.assertSameResponse(reverse('property-detail', args=[0]))
+        await self.assertSameResponse(reverse('property-detail', args=['lodge']))
+
+    async def test_featured(self):
+        await self.assertSameResponse(reverse('property-featured'))
+
+    async def test_conditional_get(self):
+        url = reverse('property-list')
+        etag = (await self.async_get(url))['ETag']
+        response = await self.async_get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+    async def test_conditional_search(self):
+        url = reverse('property-search')
+        etag = (await self.async_get(url, self.stay))['ETag']
+        self.assertEqual(etag, (await sync_to_async(self.client.get)(url, self.stay))['ETag'])
+        response = await self.async_get(url, self.stay, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+    async def test_writes_use_the_viewset(self):
+        with override_settings(ROOT_URLCONF=__name__):
+            response = await self.async_client.post(reverse('property-list'), {}, content_type='application/json')
+        self.assertEqual(response.status_code, 401)
+
+    @override_settings(DEBUG=True)
+    def test_middleware_chain_stays_async(self):
+        # With DEBUG on, Django logs every middleware it adapts to the other mode
+        with self.assertNoLogs('django.request', 'DEBUG'):
+            ASGIHandler()
+        whitenoise = [name.replace('Mwaiseni.static_files.StaticFilesMiddleware',
+                                   'whitenoise.middleware.WhiteNoiseMiddleware') for name in settings.MIDDLEWARE]
+        with override_settings(MIDDLEWARE=whitenoise), self.assertLogs('django.request', 'DEBUG'):
+            ASGIHandler()
+
+    async def test_static_files_under_asgi(self):
+        async def api(request):
+            return HttpResponse('api')
+
+        with TemporaryDirectory() as root:
+            Path(root, 'app.js').write_text('console.log(1)')
+            with override_settings(STATIC_ROOT=root):
+                middleware = StaticFilesMiddleware(api)
+            static = await middleware(RequestFactory().get('/static/app.js'))
+            self.assertEqual(b''.join(static.streaming_content), b'console.log(1)')
+            self.assertEqual((await middleware(RequestFactory().get('/api/properties/'))).content, b'api')
+
+
+class MapSearchTests(QueryBudgetTestCase):
+    """?near= and ?bbox= against listings placed around their edges"""
+
+    LAT, LNG = -15.4167, 28.2833  # Lusaka
+    KM_PER_DEGREE = math.radians(geo.EARTH_RADIUS_KM)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create_user(email='host@mwaiseni.test', password=None)
+
+    def place(self, title, latitude, longitude):
+        return make_property(self.host, title=title, latitude=round(latitude, 6), longitude=round(longitude, 6))
+
+    def titles(self, **params):
+        response = self.client.get(reverse('property-list'), params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return [row['title'] for row in response.data['results']]
+
+    def north(self, km):
+        return self.LAT + km / self.KM_PER_DEGREE
+
+    def test_radius_edge(self):
+        self.place('9.9 km north', self.north(9.9), self.LNG)
+        self.place('10.1 km north', self.north(10.1), self.LNG)
+        near = f'{self.LAT},{self.LNG}'
+        self.assertEqual(self.titles(near=near, radius_km=10), ['9.9 km north'])
+        self.assertEqual(sorted(self.titles(near=near, radius_km=10.2)), ['10.1 km north', '9.9 km north'])
+
+    def test_ordering_by_distance(self):
+        for km in (7, 2, 5):
+            self.place(f'{km} km', self.north(km), self.LNG)
+        near = f'{self.LAT},{self.LNG}'
+        self.assertEqual(self.titles(near=near, ordering='distance_km'), ['2 km', '5 km', '7 km'])
+        self.assertEqual(self.titles(near=near, ordering='-distance_km'), ['7 km', '5 km', '2 km'])
+
+    def test_across_a_geohash_cell_boundary(self):
+        # Both sides of a cell edge at the precision a 1 km search covers with
+        cells = geo.covering_cells(*geo.bounding_box(self.LAT, self.LNG, 1))
+        _, width = geo.cell_size(len(cells[0]))
+        edge = math.floor(self.LNG / width) * width
+        west = self.place('West of the edge', self.LAT, edge - 0.0005)
+        east = self.place('East of the edge', self.LAT, edge + 0.0005)
+        self.assertNotEqual(west.geohash[:len(cells[0])], east.geohash[:len(cells[0])])
+        self.assertEqual(sorted(self.titles(near=f'{self.LAT},{edge}', radius_km=1)),
+                         ['East of the edge', 'West of the edge'])
+        bbox = f'{self.LAT - 0.01},{edge - 0.001},{self.LAT + 0.01},{edge + 0.001}'
+        self.assertEqual(sorted(self.titles(bbox=bbox)), ['East of the edge', 'West of the edge'])
+
+    def test_bbox_edges(self):
+        self.place('On the south edge', -15.5, 28.3)
+        self.place('On the east edge', -15.45, 28.4)
+        self.place('Just south', -15.500001, 28.3)
+        self.place('Just east', -15.45, 28.400001)
+        self.assertEqual(sorted(self.titles(bbox='-15.5,28.2,-15.4,28.4')), ['On the east edge', 'On the south edge'])
+
+    def test_invalid_coordinates(self):
+        self.assertEqual(self.client.get(reverse('property-list'), {'near': '95,28'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('property-list'), {'bbox': '-15.4,28.2,-15.5,28.4'}).status_code, 400)
+
+
+class BulkAvailabilityTests(QueryBudgetTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create_user(email='host@mwaiseni.test', password=None)
+        cls.property = make_property(cls.host)
+        cls.room_types = [
+            RoomType.objects.create(property=cls.property, name=f'Room {i}', price_per_night=500,
+                                    capacity=2, total_rooms=4)
+            for i in range(2)
+        ]
+        cls.start = date(2030, 1, 1)  # a Tuesday
+
+    def setUp(self):
+        self.client.force_authenticate(self.host)
+
+    def upsert(self, *rules, **kwargs):
+        return self.client.post(reverse('property-availability', args=[self.property.pk]),
+                                {'rules': list(rules)}, format='json', **kwargs)
+
+    def rule(self, room_type, days, **values):
+        return dict(room_type=room_type.pk, start=self.start.isoformat(),
+                    end=(self.start + timedelta(days=days - 1)).isoformat(), **values)
+
+    def test_year_of_rates_in_a_few_queries(self):
+        rules = [self.rule(room_type, 365, price_override='650.00') for room_type in self.room_types]
+        url = reverse('property-availability', args=[self.property.pk])
+        # property, room types, existing nights, then the upserts in batches of the
+        # backend's parameter limit (three on SQLite) inside a savepoint
+        response = self.assertQueryBudget(8, url, method='post', data={'rules': rules}, format='json')
+        self.assertEqual(response.data['created'], 730)
+        self.assertEqual(Availability.objects.filter(price_override=650, available_rooms=4).count(), 730)
+
+    def test_weekday_rules_override_ranges_and_report_changes(self):
+        self.upsert(self.rule(self.room_types[0], 14, available_rooms=3, price_override='500.00'))
+        response = self.upsert(
+            self.rule(self.room_types[0], 14, available_rooms=3),
+            self.rule(self.room_types[0], 14, weekdays=['sat', 'sun'], price_override='900.00'),
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['created'], response.data['updated'], response.data['unchanged']),
+                         (0, 4, 10))
+        weekend = Availability.objects.filter(room_type=self.room_types[0], price_override=900)
+        self.assertEqual(sorted(night.date.weekday() for night in weekend), [5, 5, 6, 6])
+        self.assertFalse(Availability.objects.exclude(available_rooms=3).exists())
+
+    def test_price_only_rule_keeps_rooms(self):
+        self.upsert(self.rule(self.room_types[0], 3, available_rooms=1))
+        self.upsert(self.rule(self.room_types[0], 5, price_override=None))
+        rooms = Availability.objects.order_by('date').values_list('available_rooms', flat=True)
+        self.assertEqual(list(rooms), [1, 1, 1, 4, 4])
+
+    def test_only_the_host_may_edit(self):
+        other = User.objects.create_user(email='other@mwaiseni.test', password=None)
+        self.client.force_authenticate(other)
+        self.assertEqual(self.upsert(self.rule(self.room_types[0], 3, available_rooms=1)).status_code, 403)
+
+    def test_invalid_rules(self):
+        foreign = RoomType.objects.create(property=make_property(self.host), name='Other',
+                                          price_per_night=1, capacity=1)
+        self.assertEqual(self.upsert(self.rule(foreign, 3, available_rooms=1)).status_code, 400)
+        self.assertEqual(self.upsert(self.rule(self.room_types[0], 3)).status_code, 400)
+        self.assertEqual(self.upsert(self.rule(self.room_types[0], 800, available_rooms=1)).status_code, 400)
+
+
+class CalendarTests(QueryBudgetTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create_user(email='host@mwaiseni.test', password=None)
+        cls.property = make_property(cls.host)
+        cls.room_type = RoomType.objects.create(property=cls.property, name='Double', price_per_night=850,
+                                                capacity=2, total_rooms=2)
+        cls.check_in = date.today() + timedelta(days=5)
+        Availability.objects.bulk_create(
+            Availability(room_type=cls.room_type, date=cls.check_in + timedelta(days=d), available_rooms=free,
+                         price_override=Decimal('900.50') if d == 1 else None)
+            for d, free in enumerate((1, 0, 2, 2, 1))
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def night(self, offset):
+        return self.check_in + timedelta(days=offset)
+
+    def test_lookups(self):
+        room_calendar = calendar.load_calendar(self.room_type.pk)
+        self.assertTrue(room_calendar.is_free(self.night(2), self.night(5)))
+        self.assertTrue(room_calendar.is_free(self.night(2), self.night(4), rooms=2))
+        self.assertFalse(room_calendar.is_free(self.night(0), self.night(2)))
+        # Nights without rows have no rooms
+        self.assertFalse(room_calendar.is_free(self.night(4), self.night(6)))
+        self.assertEqual(room_calendar.first_free_window(2), self.night(2))
+        self.assertEqual(room_calendar.first_free_window(1, after=self.night(1)), self.night(2))
+        self.assertIsNone(room_calendar.first_free_window(4))
+        self.assertEqual(room_calendar.nightly_prices(self.night(0), self.night(3)), [None, Decimal('900.50'), None])
+
+    def test_cached_calendar_round_trips(self):
+        with self.assertNumQueries(1):
+            calendar.get_calendar(self.room_type.pk)
+        with self.assertNumQueries(0):
+            cached = calendar.get_calendar(self.room_type.pk)
+        self.assertEqual(cached.nightly_prices(self.night(0), self.night(2)), [None, Decimal('900.50')])
+        self.assertTrue(cached.is_free(self.night(2), self.night(5)))
+
+    def test_far_stays_are_capped(self):
+        check_in = date.today() + timedelta(days=10 * calendar.CALENDAR_DAYS)
+        room_calendar = calendar.get_calendar(self.room_type.pk, check_in, check_in + timedelta(days=2))
+        self.assertLessEqual(len(room_calendar.rooms), calendar.MAX_CALENDAR_DAYS)
+        self.assertFalse(room_calendar.is_free(check_in, check_in + timedelta(days=2)))
+        self.assertFalse(calendar.is_room_type_free(self.room_type.pk, check_in, check_in + timedelta(days=2)))
+
+    def test_writes_drop_the_calendar_on_commit(self):
+        key = calendar.cache_key(self.room_type.pk)
+        calendar.get_calendar(self.room_type.pk)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            Availability.objects.filter(date=self.night(1)).get().delete()
+            # Still cached until the transaction commits
+            self.assertIsNotNone(cache.get(key))
+        self.assertEqual(len(callbacks), 1)
+        self.assertIsNone(cache.get(key))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Availability.objects.create(room_type=self.room_type, date=self.night(1), available_rooms=2)
+        self.assertTrue(calendar.get_calendar(self.room_type.pk).is_free(self.night(0), self.night(4)))
+
+    def test_availability_endpoint(self):
+        url = reverse('property-availability', args=[self.property.pk])
+        response = self.client.get(url, {'check_in': self.night(0).isoformat(),
+                                         'check_out': self.night(3).isoformat(), 'guests': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['room_types'], [{
+            'room_type': self.room_type.pk, 'name': 'Double', 'capacity': 2, 'free': False,
+            'first_free_check_in': self.night(2).isoformat(),
+            'nightly_rates': ['850.00', '900.50', '850.00'],
+        }])
+        response = self.client.get(url, {'check_in': self.night(0).isoformat(),
+                                         'check_out': self.night(3).isoformat(), 'guests': 3})
+        self.assertEqual(response.json()['room_types'][0]['first_free_check_in'], None)
+
+    def test_column_limits_fit_the_calendar(self):
+        # Past 16-bit room counts and 32-bit ngwee, up to the columns' own limits
+        room_type = RoomType.objects.create(property=self.property, name='Campsite', price_per_night=100,
+                                            capacity=2, total_rooms=40000)
+        top_price = Decimal('99999999.99')
+        for offset, rooms in enumerate((40000, 2 ** 31 - 1)):
+            Availability.objects.create(room_type=room_type, date=self.night(offset), available_rooms=rooms,
+                                        price_override=top_price)
+        calendar.get_calendar(room_type.pk)
+        cached = calendar.get_calendar(room_type.pk)
+        self.assertTrue(cached.is_free(self.night(0), self.night(2), rooms=40000))
+        self.assertEqual(cached.nightly_prices(self.night(0), self.night(2)), [top_price, top_price])
+        cached.set_night(self.night(2), 2 ** 31 - 1, top_price)
+        self.assertEqual(cached.nightly_prices(self.night(2), self.night(3)), [top_price])
+
+        url = reverse('property-availability', args=[self.property.pk])
+        response = self.client.get(url, {'check_in': self.night(0).isoformat(),
+                                         'check_out': self.night(2).isoformat()})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['room_types'][0]['nightly_rates'], ['99999999.99', '99999999.99'])
+
+    def test_availability_endpoint_needs_dates(self):
+        url = reverse('property-availability', args=[self.property.pk])
+        self.assertEqual(self.client.get(url).status_code, 400)
+        self.assertEqual(self.client.get(url, {'check_in': 'soon', 'check_out': 'later'}).status_code, 400)
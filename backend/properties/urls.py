@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from . import views
@@ -8,3 +9,15 @@ router.register(r'properties', views.PropertyViewSet)
 urlpatterns = [
     path('', include(router.urls)),
 ]
+
+if settings.ASYNC_VIEWS:
+    # Under ASGI the read-heavy routes are served by async views (async_views.py);
+    # they take the router's names, so reverse() resolves to them
+    from . import async_views
+
+    urlpatterns = [
+        path('properties/', async_views.property_list, name='property-list'),
+        path('properties/search/', async_views.property_search, name='property-search'),
+        path('properties/featured/', async_views.property_featured, name='property-featured'),
+        path('properties/<pk>/', async_views.property_detail, name='property-detail'),
+    ] + urlpatterns
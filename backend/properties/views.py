@@ -1,62 +1,221 @@
-from rest_framework import viewsets, filters, status
+from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.exceptions import PermissionDenied
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
 from django_filters.rest_framework import DjangoFilterBackend
+from Mwaiseni import caching
+from Mwaiseni.conditional import ConditionalGetMixin
+from Mwaiseni.instrumentation import SerializerTimingMixin
+from Mwaiseni.pagination import KeysetPagination
+from Mwaiseni.sparse_fields import SparseFieldsMixin
 from .models import Property
-from .serializers import PropertySerializer, PropertyListSerializer
-from .filters import PropertyFilter
+from users.models import RoomType
+from .serializers import (
+    PropertySerializer, PropertyListSerializer, PropertyListRowSerializer, PropertyRowSerializer,
+    BulkAvailabilitySerializer, RoomTypeAvailabilitySerializer,
+)
+from .filters import PropertyFilter, PropertyOrderingFilter
+from .availability import StaySearchError, filter_available, parse_stay
+from .search import FullTextSearchFilter
+from .facets import afacets_and_version, afacets_version, facets_and_version, facets_version
+from .bulk_inventory import BulkInventoryError, apply_rules
+from . import calendar
+from .pricing import aroom_type_rates, quote_stays, room_type_rates
 
-class PropertyViewSet(viewsets.ModelViewSet):
+FEATURED_CACHE_TTL = 60 * 10
+
+# Columns PropertyListSerializer reads, plus every key the paginator may seek on
+LIST_COLUMNS = [
+    'id', 'title', 'property_type', 'city', 'currency', 'price_per_night',
+    'bedrooms', 'bathrooms', 'average_rating', 'review_count',
+    'has_wifi', 'has_parking', 'has_pool', 'has_ac', 'instant_book', 'is_available',
+    'created_at', 'updated_at', 'host', 'host__first_name', 'host__last_name', 'host__email',
+]
+
+
+class PropertyViewSet(SerializerTimingMixin, SparseFieldsMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     """ViewSet for Property model - Booking.com style API"""
-    queryset = Property.objects.all()
+    # Every serializer touches the host, so always join it
+    queryset = Property.objects.select_related('host')
     permission_classes = [IsAuthenticatedOrReadOnly]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    pagination_class = KeysetPagination
+    filter_backends = [DjangoFilterBackend, PropertyOrderingFilter, FullTextSearchFilter]
     filterset_class = PropertyFilter
     search_fields = ['title', 'description', 'address', 'city']
-    ordering_fields = ['price_per_night', 'average_rating', 'created_at']
+    ordering_fields = ['price_per_night', 'average_rating', 'created_at', 'distance_km']
+    # Only sortable when the filters annotated them (?near= for distance_km)
+    annotation_ordering_fields = ['distance_km']
     ordering = ['-created_at']
+    # List and search pages are read as values() rows (see Mwaiseni/conditional.py)
+    row_serializer_classes = {'list': PropertyListRowSerializer, 'search': PropertyRowSerializer}
+    # (check_in, check_out, guests) when a search asks for a stay
+    stay = None
+    
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'list':
+            queryset = queryset.only(*LIST_COLUMNS)
+        return queryset
     
     def get_serializer_class(self):
         if self.action == 'list':
             return PropertyListSerializer
         return PropertySerializer
     
+    def get_search_queryset(self):
+        """Filtered queryset for the search action; raises StaySearchError"""
+        queryset = self.filter_queryset(self.get_queryset())
+        params = self.request.query_params
+        
+        # Apply additional filters from query params
+        city = params.get('city', None)
+        if city:
+            queryset = queryset.filter(city=city)
+        
+        min_price = params.get('min_price', None)
+        max_price = params.get('max_price', None)
+        if min_price:
+            queryset = queryset.filter(price_per_night__gte=min_price)
+        if max_price:
+            queryset = queryset.filter(price_per_night__lte=max_price)
+        
+        # Date-range availability: ?check_in=YYYY-MM-DD&check_out=YYYY-MM-DD&guests=N
+        stay = parse_stay(params)
+        if stay:
+            queryset = filter_available(queryset, *stay)
+            self.stay = stay
+        return queryset
+    
+    @staticmethod
+    def row_ids(rows):
+        # values() rows for a page, model instances for a conditional probe
+        return [row['id'] if isinstance(row, dict) else row.pk for row in rows]
+    
+    def stay_rates(self, rows):
+        """Room type rates for the page's stay, fetched once per page"""
+        ids = self.row_ids(rows)
+        if getattr(self, '_stay_rates_ids', None) != ids:
+            check_in, check_out, _ = self.stay
+            self._stay_rates = room_type_rates(ids, check_in, check_out)
+            self._stay_rates_ids = ids
+        return self._stay_rates
+    
+    def get_validators(self, rows, has_more=False, extra=None):
+        # Rates live on Availability, which doesn't touch Property.updated_at
+        if self.stay and self.selects('stay_quote'):
+            extra = dict(extra or {}, stay_rates=self.stay_rates(rows))
+        return super().get_validators(rows, has_more, extra)
+    
+    def get_response_for_rows(self, rows, paginated, extra=None):
+        if self.stay and self.selects('stay_quote'):
+            self.stay_quotes = quote_stays(rows, *self.stay, rates=self.stay_rates(rows))
+        return super().get_response_for_rows(rows, paginated, extra)
+    
+    async def aprepare_rows(self, rows):
+        # Async views fetch the stay rates up front; stay_rates() then reuses them
+        if self.stay and self.selects('stay_quote'):
+            check_in, check_out, _ = self.stay
+            self._stay_rates_ids = self.row_ids(rows)
+            self._stay_rates = await aroom_type_rates(self._stay_rates_ids, check_in, check_out)
+    
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['stay_quotes'] = getattr(self, 'stay_quotes', None)
+        return context
+    
     def perform_create(self, serializer):
         # Automatically set the host to the current user
         serializer.save(host=self.request.user)
     
-    @action(detail=False, methods=['get'])
-    def featured(self, request):
-        """Get featured properties (highly rated and available)"""
-        featured_properties = Property.objects.filter(
+    def get_featured_queryset(self):
+        return self.narrow_queryset(self.get_queryset()).filter(
             is_available=True,
             average_rating__gte=4.0
         ).order_by('-average_rating')[:10]
-        serializer = self.get_serializer(featured_properties, many=True)
-        return Response(serializer.data)
+    
+    @action(detail=False, methods=['get'])
+    def featured(self, request):
+        """Get featured properties (highly rated and available)"""
+        def build():
+            return list(self.get_serializer(self.get_featured_queryset(), many=True).data)
+        
+        # Invalidated by the Property/User signal handlers in signals.py
+        key = caching.versioned_key(caching.FEATURED_CACHE, *self.field_selection_key())
+        return Response(caching.single_flight(key, build, FEATURED_CACHE_TTL))
+    
+    async def afeatured(self, request):
+        async def build():
+            rows = [row async for row in self.get_featured_queryset()]
+            return list(self.get_serializer(rows, many=True).data)
+        
+        key = await caching.aversioned_key(caching.FEATURED_CACHE, *self.field_selection_key())
+        return Response(await caching.asingle_flight(key, build, FEATURED_CACHE_TTL))
     
     @action(detail=False, methods=['get'])
     def search(self, request):
         """Advanced search endpoint"""
-        queryset = self.filter_queryset(self.get_queryset())
+        try:
+            queryset = self.get_search_queryset()
+        except StaySearchError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Apply additional filters from query params
-        city = request.query_params.get('city', None)
-        if city:
-            queryset = queryset.filter(city=city)
+        # Counts per city, type, amenity and price bucket for the same filters;
+        # a revalidation only checks their version (see facets.py)
+        def facets():
+            block, version = facets_and_version(queryset)
+            return {'facets': block}, {'facets': version}
+        return self.conditional_list_response(queryset, extra=facets,
+                                              version=lambda: {'facets': facets_version(queryset)})
+    
+    async def asearch(self, request):
+        try:
+            queryset = self.get_search_queryset()
+        except StaySearchError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
-        min_price = request.query_params.get('min_price', None)
-        max_price = request.query_params.get('max_price', None)
-        if min_price:
-            queryset = queryset.filter(price_per_night__gte=min_price)
-        if max_price:
-            queryset = queryset.filter(price_per_night__lte=max_price)
+        async def facets():
+            block, version = await afacets_and_version(queryset)
+            return {'facets': block}, {'facets': version}
+        
+        async def version():
+            return {'facets': await afacets_version(queryset)}
+        return await self.aconditional_list_response(queryset, extra=facets, version=version)
+    
+    @action(detail=True, methods=['get', 'post'])
+    def availability(self, request, pk=None):
+        """GET: room types free for ?check_in=&check_out=&guests=, read from the
+        cached calendars. POST: bulk-set rooms and rates for date ranges of
+        this property's room types"""
+        if request.method == 'GET':
+            return self.room_type_availability(request)
         
-        page = self.paginate_queryset(queryset)
-        if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
+        listing = self.get_object()
+        if listing.host_id != request.user.pk and not request.user.is_staff:
+            raise PermissionDenied('Only the host can change this calendar')
+        
+        serializer = BulkAvailabilitySerializer(data=request.data, context={'property': listing})
+        serializer.is_valid(raise_exception=True)
+        try:
+            changes = apply_rules(serializer.validated_data['rules'])
+        except BulkInventoryError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(changes)
+    
+    def room_type_availability(self, request):
+        try:
+            stay = parse_stay(request.query_params)
+        except StaySearchError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if stay is None:
+            return Response({'error': 'Both check_in and check_out are required'},
+                            status=status.HTTP_400_BAD_REQUEST)
         
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        listing = self.get_object()
+        check_in, check_out, guests = stay
+        room_types = RoomType.objects.filter(property=listing).order_by('price_per_night', 'pk')
+        rows = calendar.room_type_availability(room_types, check_in, check_out, guests)
+        return Response({
+            'check_in': check_in, 'check_out': check_out, 'guests': guests,
+            'room_types': RoomTypeAvailabilitySerializer(rows, many=True).data,
+        })
@@ -0,0 +1,132 @@
+"""
+Token authentication without a database query per request.
+
+DRF's TokenAuthentication looks the key up with authtoken_token JOIN
+users_user on every request. CachedTokenAuthentication resolves it in three
+tiers: a bounded per-process LRU, then the shared cache (Redis in
+production), then that query. Entries expire after LOCAL_TTL / SHARED_TTL
+seconds and are dropped once the transaction that deletes the token
+(LogoutView) or changes its user, e.g. deactivates them, commits (see
+signals.py; User.objects.filter(...).update() goes through
+UserQuerySet.update for the same reason). The shared entry goes at once;
+LRU copies in other processes live at most LOCAL_TTL seconds longer, which
+bounds how long a revoked token keeps working.
+
+Only AUTH_USER_FIELDS of the user are cached. The rest, including
+denormalised counters such as unread_messages, is deferred and read from
+the database when a view first touches it, so it is never stale. Each
+request gets its own unpickled Token and User, so nothing a view does to
+request.user leaks into another request.
+"""
+
+import hashlib
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+LOCAL_SIZE = 4096
+LOCAL_TTL = 30
+SHARED_TTL = 60 * 5
+# What authentication and permission checks read from request.user
+AUTH_USER_FIELDS = ('id', 'email', 'first_name', 'last_name', 'user_type', 'is_active', 'is_staff', 'is_superuser')
+
+
+class LRUCache:
+    """Thread-safe mapping of at most `maxsize` entries that expire after `ttl` seconds"""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+local_tokens = LRUCache(LOCAL_SIZE, LOCAL_TTL)
+
+
+def _shared_key(key):
+    # Never put a usable token into the shared cache's key space
+    return 'auth:token:' + hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def get_token(key):
+    """Token for `key` with its user loaded, or None; unknown keys are not cached"""
+    payload = local_tokens.get(key)
+    if payload is None:
+        payload = cache.get(_shared_key(key))
+        if payload is None:
+            token = Token.objects.select_related('user').only(
+                'key', 'user', 'created', *(f'user__{name}' for name in AUTH_USER_FIELDS),
+            ).filter(key=key).first()
+            if token is None:
+                return None
+            payload = pickle.dumps(token, pickle.HIGHEST_PROTOCOL)
+            cache.set(_shared_key(key), payload, SHARED_TTL)
+        local_tokens.set(key, payload)
+    return pickle.loads(payload)
+
+
+def invalidate(keys):
+    """Forget cached lookups of these token keys"""
+    keys = list(keys)
+    for key in keys:
+        local_tokens.delete(key)
+    cache.delete_many([_shared_key(key) for key in keys])
+
+
+def invalidate_on_commit(keys):
+    """invalidate() once the current transaction commits (at once outside
+    one); forgetting earlier would let a concurrent request cache the token
+    or user as they were before the change"""
+    keys = list(keys)
+    transaction.on_commit(lambda: invalidate(keys))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication ("Authorization: Token <key>") backed by get_token()"""
+
+    def authenticate_credentials(self, key):
+        token = get_token(key)
+        if token is None:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        return (token.user, token)
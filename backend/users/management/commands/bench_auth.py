@@ -0,0 +1,69 @@
+"""
+Per-request cost of token authentication, before and after caching.
+
+    python manage.py bench_auth --users 250
+
+Authenticates requests carrying "Authorization: Token <key>" for a rotating
+set of users with DRF's TokenAuthentication (one query per request) and with
+CachedTokenAuthentication served from the in-process LRU and from the
+shared cache tier. Without REDIS_URL the shared tier is the local-memory
+cache, which keeps 300 entries by default; stay below that with --users.
+"""
+
+import itertools
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIRequestFactory
+
+from Mwaiseni.benchmarking import count_queries, format_stats, isolated_database, measure
+from users import authentication
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = 'Benchmark token authentication with and without the cached lookup'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=250)
+        parser.add_argument('--repeat', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        with isolated_database():
+            password = make_password(None)
+            users = User.objects.bulk_create(
+                User(email=f'bench-{i}@mwaiseni.test', password=password) for i in range(options['users'])
+            )
+            Token.objects.bulk_create(Token(user=user, key=Token.generate_key()) for user in users)
+            factory = APIRequestFactory()
+            requests = [factory.get('/', HTTP_AUTHORIZATION=f'Token {key}')
+                        for key in Token.objects.values_list('key', flat=True)]
+
+            def scenario(backend, before=None):
+                rotation = itertools.cycle(requests)
+
+                def authenticate():
+                    if before:
+                        before()
+                    user, _ = backend.authenticate(next(rotation))
+                    assert user.is_active
+                return authenticate
+
+            cached = authentication.CachedTokenAuthentication()
+            # Warm both tiers for every token
+            for request in requests:
+                cached.authenticate(request)
+            scenarios = [
+                ('TokenAuthentication', scenario(TokenAuthentication())),
+                ('cached, LRU hit', scenario(cached)),
+                ('cached, shared cache hit', scenario(cached, before=authentication.local_tokens.clear)),
+            ]
+
+            self.stdout.write(f"{options['users']} users, {options['repeat']} authentications per scenario\n")
+            for label, fn in scenarios:
+                with count_queries() as queries:
+                    fn()
+                stats = measure(fn, options['repeat'], warmup=len(requests))
+                self.stdout.write(format_stats(f'{label} ({len(queries)} queries)', stats))
@@ -0,0 +1,92 @@
+# Generated by Django 4.2.10 on 2026-10-18 04:36
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def _remap(apps, source, target, source_owner, target_owner):
+    """Point bookings and room types at the `target` listing with the same
+    owner and title as their `source` listing. Aborts, leaving the rows
+    untouched, when a referenced listing has no single match."""
+    Source = apps.get_model(*source)
+    Target = apps.get_model(*target)
+    referencing = [apps.get_model('users', 'Booking'), apps.get_model('users', 'RoomType')]
+
+    used = set()
+    for model in referencing:
+        used.update(model.objects.values_list('property_id', flat=True))
+    if not used:
+        return
+
+    mapping = {}
+    for listing in Source.objects.filter(pk__in=used):
+        matches = list(
+            Target.objects.filter(**{f'{target_owner}_id': getattr(listing, f'{source_owner}_id'),
+                                     'title': listing.title}).values_list('pk', flat=True)[:2]
+        )
+        if len(matches) == 1:
+            mapping[listing.pk] = matches[0]
+    unmatched = sorted(used - set(mapping))
+    if unmatched:
+        raise RuntimeError(
+            f'Cannot move bookings and room types to {target[0]}.Property: no single listing with the same '
+            f'{target_owner} and title for {source[0]}.Property ids {unmatched}. Create or rename those '
+            f'listings, or delete the rows that reference them, and migrate again.'
+        )
+
+    # Collect every row first: a new id may equal an old one not yet moved
+    moves = [
+        (model, new_id, list(model.objects.filter(property_id=old_id).values_list('pk', flat=True)))
+        for model in referencing for old_id, new_id in mapping.items()
+    ]
+    for model, new_id, pks in moves:
+        model.objects.filter(pk__in=pks).update(property_id=new_id)
+
+
+def to_listings(apps, schema_editor):
+    _remap(apps, ('users', 'Property'), ('properties', 'Property'), 'owner', 'host')
+
+
+def from_listings(apps, schema_editor):
+    _remap(apps, ('properties', 'Property'), ('users', 'Property'), 'host', 'owner')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0002_alter_property_host'),
+        ('users', '0002_booking_conversation_message_payment_payout_property_and_more'),
+    ]
+
+    operations = [
+        # Drop the constraint while the ids are rewritten
+        migrations.AlterField(
+            model_name='booking',
+            name='property',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='bookings', to='users.property'),
+        ),
+        migrations.AlterField(
+            model_name='roomtype',
+            name='property',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='room_types', to='users.property'),
+        ),
+        migrations.RunPython(to_listings, from_listings),
+        migrations.AlterField(
+            model_name='booking',
+            name='property',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bookings', to='properties.property'),
+        ),
+        migrations.AlterField(
+            model_name='roomtype',
+            name='property',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='room_types', to='properties.property'),
+        ),
+        migrations.AddIndex(
+            model_name='availability',
+            index=models.Index(condition=models.Q(('available_rooms__gt', 0)), fields=['room_type', 'date'], name='availability_free_nights'),
+        ),
+        migrations.AddIndex(
+            model_name='roomtype',
+            index=models.Index(fields=['property', 'capacity'], name='roomtype_property_capacity'),
+        ),
+    ]
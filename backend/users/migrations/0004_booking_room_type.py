@@ -0,0 +1,24 @@
+# Generated by Django 4.2.10 on 2026-10-18 04:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_roomtype_booking_listing_property'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='room_type',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='bookings', to='users.roomtype'),
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='rooms',
+            field=models.PositiveSmallIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 4.2.10 on 2026-10-18 05:15
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def backfill_unread(apps, schema_editor):
+    # messaging.unread.rebuild() as of this migration, over the historical models
+    User = apps.get_model('users', 'User')
+    Message = apps.get_model('users', 'Message')
+    ConversationUnread = apps.get_model('users', 'ConversationUnread')
+    Participant = apps.get_model('users', 'Conversation')._meta.get_field('participants').remote_field.through
+
+    unread = (
+        Message.objects.filter(conversation_id=OuterRef('conversation_id'), is_read=False)
+        .exclude(sender_id=OuterRef('user_id'))
+        .order_by().values('conversation_id').annotate(n=Count('*')).values('n')
+    )
+    pairs = Participant.objects.annotate(
+        unread=Coalesce(Subquery(unread, output_field=IntegerField()), 0),
+    ).values_list('user_id', 'conversation_id', 'unread')
+    ConversationUnread.objects.bulk_create(
+        (ConversationUnread(user_id=user_id, conversation_id=conversation_id, unread=n)
+         for user_id, conversation_id, n in pairs.iterator()),
+        batch_size=2000,
+    )
+    totals = (
+        ConversationUnread.objects.filter(user_id=OuterRef('pk'))
+        .order_by().values('user_id').annotate(total=Sum('unread')).values('total')
+    )
+    User.objects.update(unread_messages=Coalesce(Subquery(totals, output_field=IntegerField()), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_booking_room_type'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='unread_messages',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name='ConversationUnread',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('unread', models.PositiveIntegerField(default=0)),
+                ('conversation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='unread_counters', to='users.conversation')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conversation_unreads', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'conversation')},
+            },
+        ),
+        migrations.RunPython(backfill_unread, migrations.RunPython.noop),
+    ]
@@ -7,7 +7,21 @@ import uuid
 # ============================================
 # USER MANAGER
 # ============================================
-class UserManager(BaseUserManager):
+class UserQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        # update() sends no post_save: drop the cached tokens of the changed
+        # users here (see users/authentication.py)
+        from rest_framework.authtoken.models import Token
+        from . import authentication
+
+        if set(kwargs) & set(authentication.AUTH_USER_FIELDS):
+            authentication.invalidate_on_commit(
+                Token.objects.filter(user__in=self.values('pk')).values_list('key', flat=True)
+            )
+        return super().update(**kwargs)
+
+
+class UserManager(BaseUserManager.from_queryset(UserQuerySet)):
     def create_user(self, email, password=None, **extra_fields):
         if not email:
             raise ValueError('Users must have an email address')
@@ -78,6 +92,9 @@ class User(AbstractBaseUser, PermissionsMixin):
     date_joined = models.DateTimeField(default=timezone.now)
     last_login = models.DateTimeField(blank=True, null=True)
     
+    # Unread messages across all conversations, kept by messaging/unread.py
+    unread_messages = models.PositiveIntegerField(default=0, editable=False)
+    
     # Loyalty Program - Mwaiseni Exclusive
     loyalty_points = models.IntegerField(default=0)
     loyalty_tier = models.CharField(max_length=20, choices=[
@@ -161,12 +178,18 @@ class Property(models.Model):
         return self.title
 
 class RoomType(models.Model):
-    property = models.ForeignKey(Property, on_delete=models.CASCADE, related_name='room_types')
+    # Inventory hangs off the public listing model served by PropertyViewSet
+    property = models.ForeignKey('properties.Property', on_delete=models.CASCADE, related_name='room_types')
     name = models.CharField(max_length=100)
     price_per_night = models.DecimalField(max_digits=10, decimal_places=2)
     capacity = models.IntegerField()
     total_rooms = models.IntegerField(default=1)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['property', 'capacity'], name='roomtype_property_capacity'),
+        ]
+    
     def __str__(self):
         return f"{self.name} - {self.property.title}"
 
@@ -178,6 +201,11 @@ class Availability(models.Model):
     
     class Meta:
         unique_together = ['room_type', 'date']
+        indexes = [
+            # Partial index: counting free nights in a stay window never touches the table
+            models.Index(fields=['room_type', 'date'], name='availability_free_nights',
+                         condition=models.Q(available_rooms__gt=0)),
+        ]
     
     def __str__(self):
         return f"{self.room_type.name} - {self.date}"
@@ -193,7 +221,10 @@ class Booking(models.Model):
         ('completed', 'Completed'),
     ]
     
-    property = models.ForeignKey(Property, on_delete=models.CASCADE, related_name='bookings')
+    property = models.ForeignKey('properties.Property', on_delete=models.CASCADE, related_name='bookings')
+    # Inventory the booking holds; null for bookings made before room types existed
+    room_type = models.ForeignKey(RoomType, on_delete=models.SET_NULL, related_name='bookings', null=True, blank=True)
+    rooms = models.PositiveSmallIntegerField(default=1)
     guest = models.ForeignKey(User, on_delete=models.CASCADE, related_name='bookings')
     check_in = models.DateField()
     check_out = models.DateField()
@@ -253,7 +284,13 @@ class Review(models.Model):
 class Conversation(models.Model):
     participants = models.ManyToManyField(User, related_name='conversations')
     created_at = models.DateTimeField(auto_now_add=True)
+    # Time of the latest message (see messaging/signals.py); orders the inbox
     updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['-updated_at', '-id'], name='conversation_recent'),
+        ]
 
 class Message(models.Model):
     conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='messages')
@@ -262,5 +299,20 @@ class Message(models.Model):
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        indexes = [
+            # The inbox reads each conversation's newest message off this index
+            models.Index(fields=['conversation', '-id'], name='message_conversation_latest'),
+        ]
+    
     def __str__(self):
-        return f"Message from {self.sender.email} at {self.created_at}"
\ No newline at end of file
+        return f"Message from {self.sender.email} at {self.created_at}"
+
+class ConversationUnread(models.Model):
+    """Unread messages of one conversation for one participant, kept by messaging/unread.py"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='conversation_unreads')
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='unread_counters')
+    unread = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        unique_together = ['user', 'conversation']
\ No newline at end of file
@@ -5,16 +5,17 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
+from Mwaiseni.sparse_fields import SparseFieldsSerializerMixin
 
 User = get_user_model()
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     """?? Booking.com Level User Serializer"""
     
     class Meta:
         model = User
-        fields = ['id', 'username', 'email', 'first_name', 'last_name', 
+        fields = ['id', 'email', 'first_name', 'last_name', 
                   'date_joined', 'last_login', 'is_active', 'is_staff']
         read_only_fields = ['date_joined', 'last_login', 'is_active', 'is_staff']
 
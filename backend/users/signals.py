@@ -0,0 +1,27 @@
+"""
+Signal handlers for the users app.
+
+Connected in UsersConfig.ready().
+"""
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from . import authentication
+from .models import User
+
+
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(sender, instance, **kwargs):
+    # LogoutView, and the cascade when a user is deleted
+    authentication.invalidate_on_commit([instance.key])
+
+
+@receiver(post_save, sender=User)
+def forget_saved_users_token(sender, instance, update_fields=None, **kwargs):
+    # Cached tokens carry a copy of the user's AUTH_USER_FIELDS: drop them
+    # when one may have changed, deactivation included
+    if update_fields is not None and not set(update_fields) & set(authentication.AUTH_USER_FIELDS):
+        return
+    authentication.invalidate_on_commit(Token.objects.filter(user=instance).values_list('key', flat=True))
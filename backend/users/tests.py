@@ -1,3 +1,97 @@
-from django.test import TestCase
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
 
-# Create your tests here.
+from Mwaiseni.testing import QueryBudgetTestCase
+
+from . import authentication
+from .models import User
+
+
+class UserQueryBudgetTests(QueryBudgetTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(30):
+            cls.user = User.objects.create_user(email=f'guest{i}@mwaiseni.test', password=None,
+                                                first_name='Guest', last_name=str(i))
+
+    def test_list(self):
+        self.assertQueryBudget(1, reverse('user-list'))
+
+    def test_detail(self):
+        self.assertQueryBudget(1, reverse('user-detail', args=[self.user.pk]))
+
+    def test_sparse_fields(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('user-list'), {'fields': 'id,email'})
+        self.assertEqual(set(response.data['results'][0]), {'id', 'email'})
+        self.assertNotIn('"first_name"', context.captured_queries[0]['sql'])
+        self.assertEqual(self.client.get(response.data['next']).status_code, 200)
+        response = self.client.get(reverse('user-list'), {'fields': 'password'})
+        self.assertEqual(response.status_code, 400)
+
+
+class CachedTokenAuthenticationTests(QueryBudgetTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='guest@mwaiseni.test', password=None)
+
+    def setUp(self):
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.url = reverse('conversation-unread')
+
+    def test_repeat_requests_skip_the_token_query(self):
+        self.assertQueryBudget(2, self.url)
+        # Only the endpoint's own query is left
+        self.assertQueryBudget(1, self.url)
+        authentication.local_tokens.clear()
+        self.assertQueryBudget(1, self.url)
+
+    def test_logout_revokes_the_token(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('user_logout'))
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_deactivation_revokes_the_token_on_commit(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+            # Not until the transaction commits
+            self.assertIsNotNone(authentication.local_tokens.get(self.token.key))
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_queryset_update_revokes_the_token(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            User.objects.filter(pk=self.user.pk).update(unread_messages=3)
+        self.assertEqual(callbacks, [])
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_only_auth_fields_are_cached(self):
+        self.client.get(self.url)
+        User.objects.filter(pk=self.user.pk).update(unread_messages=3)
+        user = authentication.get_token(self.token.key).user
+        self.assertTrue({'unread_messages', 'password'} <= user.get_deferred_fields())
+        with self.assertNumQueries(1):
+            self.assertEqual(user.unread_messages, 3)
+
+    def test_unknown_token(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token not-a-real-token')
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_lru_is_bounded_and_expires(self):
+        lru = authentication.LRUCache(maxsize=2, ttl=60)
+        for key in 'abc':
+            lru.set(key, key.upper())
+        self.assertEqual((lru.get('a'), lru.get('c'), len(lru)), (None, 'C', 2))
+        lru.ttl = 0
+        lru.set('d', 'D')
+        self.assertIsNone(lru.get('d'))
@@ -4,12 +4,16 @@ from rest_framework.views import APIView
 from rest_framework.permissions import AllowAny
 from rest_framework.authtoken.models import Token
 from django.contrib.auth import authenticate
+from Mwaiseni.instrumentation import SerializerTimingMixin
+from Mwaiseni.pagination import KeysetPagination
+from Mwaiseni.sparse_fields import SparseFieldsMixin
 from .models import User
 from .serializers import UserSerializer
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(SerializerTimingMixin, SparseFieldsMixin, viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
+    pagination_class = KeysetPagination
 
 class UserCreateView(generics.CreateAPIView):
     queryset = User.objects.all()